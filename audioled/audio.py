@@ -1,14 +1,16 @@
 from __future__ import (absolute_import, division, print_function, unicode_literals)
 
+import os
+import threading
 import time
 import traceback
 import io
 from collections import OrderedDict
 
 import numpy as np
-import pyaudio
 from ctypes import cdll, CFUNCTYPE, c_char_p, c_int
 
+from audioled import dsp
 from audioled.effects import Effect
 from audioled.effect import AudioBuffer
 
@@ -16,6 +18,12 @@ import logging
 logger = logging.getLogger(__name__)
 alogger = logging.getLogger(__name__ + ".libasound")
 
+try:
+    import pyaudio
+except ImportError:
+    # Audio devices are unavailable, FileAudio can still be used
+    pyaudio = None
+
 # Kudos https://stackoverflow.com/questions/7088672/pyaudio-working-but-spits-out-error-messages-each-time
 # From alsa-lib Git 3fd4ab9be0db7c7430ebd258f2717a976381715d
 # $ grep -rn snd_lib_error_handler_t
@@ -52,8 +60,18 @@ except Exception as e:
     logger.error("Error setting logger for libasound: {}", e)
 
 
+def _assertPyAudio():
+    if pyaudio is None:
+        logger.error('Could not import the pyaudio library')
+        logger.error('You can install this library with `pip install pyaudio`')
+        raise OSError('PyAudio is not available, no audio devices can be opened.')
+
+
 def print_audio_devices():
     """Print information about the system's audio devices"""
+    if pyaudio is None:
+        print("PyAudio is not available, no audio devices found.")
+        return
     p = pyaudio.PyAudio()
     for i in range(p.get_device_count()):
         info = p.get_device_info_by_index(i)
@@ -66,6 +84,7 @@ def print_audio_devices():
 
 
 def numInputChannels(device_index=None):
+    _assertPyAudio()
     p = pyaudio.PyAudio()
     device = device_index
     defaults = p.get_default_host_api_info()
@@ -77,18 +96,56 @@ def numInputChannels(device_index=None):
 
 
 class GlobalAudio():
+    """Audio source shared by all effects of the process
+
+    Chunks are copied into a preallocated ring of ring_slots chunks. buffer and ring are views into the ring,
+    not copies: the latest chunk at chunk_count c may be overwritten as soon as chunk_count reaches
+    c + ring_slots - 1. Readers keeping audio for longer, e.g. across frames or threads, must copy it.
+    Worker processes receive copies with the UpdateMessage.
+    """
     device_index = None
+    # Latest chunk (channels, samples), a view into the ring
     buffer = None
     chunk_rate = None
     sample_rate = None
     global_autogain_enabled = False
     global_autogain_maxgain = 1.
     global_autogain_time = 30.
+    # Number of chunks kept in the ring buffer, see the class docstring for the lifetime of views
+    ring_slots = 4
+    ring = None
+    # Number of chunks received, chunk i is kept in ring slot i % ring_slots
+    chunk_count = 0
+    # Notified for each chunk, see wait_for_chunk
+    chunk_condition = threading.Condition()
+    # time.monotonic() of the capture of the latest chunk
+    chunk_time = None
+    # Capture time of the chunk used by analyse(), carried to the outputs to measure the latency
+    capture_time = None
+    # Seconds the beat is predicted ahead to compensate output latency
+    lookahead = 0.
+    # False for sources that only advance on step()
+    realtime = True
+    # Shared analysis, see analyse()
+    beat_tracker = dsp.BeatTracker()
+    beat = None
+    agc = dsp.MultibandAGC()
+    # Gains of the multi-band autogain (buses, bands), None if global autogain is disabled
+    band_gains = None
+    # Routing matrix (buses, device channels) including bus gains, None passes device channels through
+    routing = None
+    # Latest chunk after routing (buses, samples) and its per-bus analysis, see analyse()
+    buses = None
+    bus_rms = None
+    bus_peak = None
+    _analysed_count = 0
 
     def __init__(self, device_index=None, chunk_rate=60, num_channels=None):
         GlobalAudio.device_index = device_index
         GlobalAudio.chunk_rate = chunk_rate
         self.num_channels = 1
+        self._ring = None
+        self._ring_index = 0
         try:
             self.global_stream, GlobalAudio.sample_rate, self.num_channels = self.stream_audio(device_index, chunk_rate, num_channels)
         except Exception as e:
@@ -96,13 +153,134 @@ class GlobalAudio():
             logger.error(e)
             traceback.print_tb(e.__traceback__)
 
+    def _allocate_ring(self, num_channels, chunk_length):
+        with GlobalAudio.chunk_condition:
+            self._ring = np.zeros((self.ring_slots, num_channels, chunk_length), dtype=np.float32)
+            # chunk_count stays monotonic for wait_for_chunk, chunk i is written to slot i % ring_slots
+            self._ring_index = GlobalAudio.chunk_count % self.ring_slots
+            GlobalAudio.buffer = self._ring[self._ring_index - 1]
+            GlobalAudio.ring = self._ring
+            # Chunks of the previous ring are gone
+            GlobalAudio._analysed_count = GlobalAudio.chunk_count
+            GlobalAudio.chunk_condition.notify_all()
+
+    def _push_chunk(self, chunk, timestamp=None):
+        """Copies a chunk of shape (channels, samples) into the ring and publishes it as buffer
+
+        timestamp is the time.monotonic() of the capture of the chunk, defaults to now.
+        """
+        if self._ring is None or self._ring.shape[1:] != chunk.shape:
+            self._allocate_ring(*chunk.shape)
+        slot = self._ring[self._ring_index]
+        np.copyto(slot, chunk)
+        with GlobalAudio.chunk_condition:
+            GlobalAudio.buffer = slot
+            self._ring_index = (self._ring_index + 1) % self.ring_slots
+            GlobalAudio.chunk_count += 1
+            GlobalAudio.chunk_time = time.monotonic() if timestamp is None else timestamp
+            GlobalAudio.chunk_condition.notify_all()
+
+    @classmethod
+    def wait_for_chunk(cls, last_count, timeout=None):
+        """Waits until a chunk after last_count was published
+
+        Returns the current chunk_count, which equals last_count on timeout.
+        """
+        with cls.chunk_condition:
+            cls.chunk_condition.wait_for(lambda: GlobalAudio.chunk_count != last_count, timeout)
+            return GlobalAudio.chunk_count
+
     def _audio_callback(self, in_data, frame_count, time_info, status):
-        chunk = np.frombuffer(in_data, np.float32).astype(np.float)
+        chunk = np.frombuffer(in_data, np.float32)
+        timestamp = time.monotonic()
+        if time_info and time_info.get('input_buffer_adc_time', 0) > 0:
+            # Account for the input latency, stream time has a different clock
+            timestamp -= max(0., time_info['current_time'] - time_info['input_buffer_adc_time'])
         # layout for multiple channel is interleaved:
         # 00 01 .. 0n 10 11 .. 1n
-        GlobalAudio.buffer = np.array([chunk[i::self.num_channels] for i in range(self.num_channels)])
+        self._push_chunk(chunk.reshape(-1, self.num_channels).T, timestamp)
         return (None, pyaudio.paContinue)
 
+    def step(self):
+        """Advances the audio source by one frame
+
+        Device streams are driven by their callback, see FileAudio for sources that are not paced in real time.
+        """
+        return True
+
+    @classmethod
+    def set_routing(cls, routing, gains=None):
+        """Sets the routing matrix of shape (buses, device channels)
+
+        Each bus is a weighted sum of device channels, e.g. [[0.5, 0.5], [1, 0]] for a mono sum and the left channel.
+        gains optionally scales each bus. None disables routing.
+        """
+        if routing is None or len(routing) == 0:
+            cls.routing = None
+            return
+        routing = np.array(routing, dtype=np.float32, ndmin=2)
+        if gains is not None:
+            routing *= np.asarray(gains, dtype=np.float32).reshape(-1, 1)
+        cls.routing = routing
+
+    @classmethod
+    def route(cls, chunk):
+        """Mixes a chunk of shape (device channels, samples) into buses"""
+        routing = cls.routing
+        if routing is None:
+            return chunk
+        if routing.shape[1] != len(chunk):
+            # Missing device channels are silent, additional ones are ignored
+            matrix = np.zeros((len(routing), len(chunk)), dtype=np.float32)
+            n = min(routing.shape[1], len(chunk))
+            matrix[:, :n] = routing[:, :n]
+            routing = matrix
+        return np.matmul(routing, chunk)
+
+    @classmethod
+    def analyse(cls):
+        """Runs the shared audio analysis on all chunks received since the last call
+
+        Routes the chunks into buses, feeds the beat tracker and the multi-band autogain
+        and computes RMS and peak of each bus.
+        Called once per frame in the main process, the results are sent to the workers.
+        """
+        ring = cls.ring
+        if ring is None or cls.sample_rate is None:
+            return
+        chunk_count = cls.chunk_count
+        chunk_time = cls.chunk_time
+        # The slot written next by the callback is skipped
+        first = max(cls._analysed_count, chunk_count - (len(ring) - 1))
+        beat = False
+        if cls.global_autogain_enabled:
+            cls.agc.max_gain = cls.global_autogain_maxgain
+            cls.agc.release = cls.global_autogain_time
+        else:
+            cls.band_gains = None
+        buses = None
+        state = None
+        for i in range(first, chunk_count):
+            chunk = ring[i % len(ring)]
+            state = cls.beat_tracker.process(np.mean(chunk, axis=0), cls.sample_rate)
+            beat = beat or state.beat
+            buses = cls.route(chunk)
+            if cls.global_autogain_enabled:
+                cls.band_gains = cls.agc.process(buses, cls.sample_rate)
+        if state is not None:
+            cls.beat = state._replace(beat=beat)
+            if cls.lookahead > 0:
+                cls.beat = dsp.advance_beat(cls.beat, cls.lookahead, (chunk_count - first) * ring.shape[2] / cls.sample_rate)
+        elif cls.beat is not None:
+            cls.beat = cls.beat._replace(beat=False)
+        if buses is not None:
+            cls.capture_time = chunk_time
+            # Copy, the ring slot will be overwritten
+            cls.buses = np.array(buses)
+            cls.bus_rms = np.sqrt(np.sum(np.square(cls.buses), axis=1) / (cls.buses.shape[1] / 2))
+            cls.bus_peak = np.max(cls.buses, axis=1)
+        cls._analysed_count = chunk_count
+
     def _open_input_stream(self, chunk_length, device_index=None, channels=1, retry=0):
         """Opens a PyAudio audio input stream
 
@@ -127,6 +305,8 @@ class GlobalAudio():
 
         try:
             frameRate = int(device_info['defaultSampleRate'])
+            self.num_channels = channels
+            self._allocate_ring(channels, chunk_length)
             stream = p.open(format=pyaudio.paFloat32,
                             channels=channels,
                             rate=frameRate,
@@ -136,7 +316,6 @@ class GlobalAudio():
                             stream_callback=self._audio_callback)
             stream.start_stream()
             logger.info("Started stream on device {}, fs: {}, chunk_length: {}, channels: {}".format(device_index, frameRate, chunk_length, channels))
-            GlobalAudio.buffer = np.zeros((chunk_length, channels))
         except OSError as e:
             if retry == 5:
                 err = 'Error occurred while attempting to open audio device. '
@@ -152,7 +331,8 @@ class GlobalAudio():
     def stream_audio(self, device_index=None, chunk_rate=60, channels=None):
         if device_index == -1:
             logger.info("Audio device disabled by device_index -1.")
-            return None, None
+            return None, None, self.num_channels
+        _assertPyAudio()
         if device_index is None:
             logger.info("No device_index for audio given. Using default.")
             p = pyaudio.PyAudio()
@@ -177,6 +357,128 @@ class GlobalAudio():
         return self._open_input_stream(chunk_length, device_index=device_index, channels=channels)
 
 
+def loadAudioFile(path, sample_rate=None):
+    """Loads audio from a WAV, FLAC or .npy file
+
+    Returns the samples as float32 array of shape (channels, samples) in range [-1, 1] and the sample rate.
+    .npy files contain raw samples of shape (samples,) or (samples, channels) and need the sample rate to be given.
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext == '.npy':
+        if sample_rate is None:
+            raise ValueError("Sample rate needed for audio file {}".format(path))
+        return _toChannels(np.load(path)), int(sample_rate)
+    if ext == '.wav':
+        from scipy.io import wavfile
+        fs, data = wavfile.read(path)
+    else:
+        try:
+            import soundfile
+        except ImportError as e:
+            logger.error('Could not import the soundfile library, only WAV and .npy files are supported')
+            logger.error('You can install this library with `pip install soundfile`')
+            raise e
+        data, fs = soundfile.read(path, dtype='float32', always_2d=True)
+    return _toChannels(data), int(fs)
+
+
+def _toChannels(data):
+    data = np.asarray(data)
+    if data.dtype == np.uint8:
+        data = (data.astype(np.float32) - 128) / 128
+    elif np.issubdtype(data.dtype, np.integer):
+        data = data.astype(np.float32) / -np.iinfo(data.dtype).min
+    if data.ndim == 1:
+        data = data[:, np.newaxis]
+    return np.ascontiguousarray(data.T, dtype=np.float32)
+
+
+class FileAudio(GlobalAudio):
+    """Streams audio from a file or array instead of an audio device
+
+    Used for offline rendering and for running audio reactive filtergraphs without a sound card.
+
+    Parameters
+    ----------
+    source: str or array
+        Path to a WAV, FLAC or .npy file (see loadAudioFile) or an array of shape (channels, samples).
+    sample_rate: int, optional
+        Sample rate of arrays and .npy files.
+    realtime: bool
+        If True a background thread publishes chunks at chunk_rate.
+        If False, the next chunk is published on each call to step(), i.e. as fast as frames are rendered.
+    loop: bool
+        Restart at the beginning of the source when its end is reached.
+    """
+    def __init__(self, source, chunk_rate=60, num_channels=None, sample_rate=None, realtime=True, loop=True):
+        GlobalAudio.device_index = None
+        GlobalAudio.chunk_rate = chunk_rate
+        self._ring = None
+        self._ring_index = 0
+        if isinstance(source, str):
+            samples, sample_rate = loadAudioFile(source, sample_rate)
+            logger.info("Streaming audio from file {}".format(source))
+        else:
+            if sample_rate is None:
+                raise ValueError("Sample rate needed for audio array")
+            samples = np.atleast_2d(np.asarray(source, dtype=np.float32))
+        if num_channels is not None:
+            samples = samples[:num_channels]
+        self.samples = samples
+        self.num_channels = len(samples)
+        self.realtime = realtime
+        self.loop = loop
+        self.finished = False
+        self.chunk_length = int(sample_rate // chunk_rate)
+        self._position = 0
+        GlobalAudio.sample_rate = sample_rate
+        self._allocate_ring(self.num_channels, self.chunk_length)
+        self._stop = threading.Event()
+        self._thread = None
+        if realtime:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def _readChunk(self):
+        total = self.samples.shape[1]
+        chunk = self.samples[:, self._position:self._position + self.chunk_length]
+        self._position += self.chunk_length
+        if chunk.shape[1] < self.chunk_length:
+            if self.loop and total > 0:
+                # Wrap around
+                missing = self.chunk_length - chunk.shape[1]
+                indices = np.arange(missing) % total
+                chunk = np.concatenate([chunk, self.samples[:, indices]], axis=1)
+                self._position = missing % total
+            else:
+                chunk = np.pad(chunk, ((0, 0), (0, self.chunk_length - chunk.shape[1])))
+                self.finished = True
+        return chunk
+
+    def step(self):
+        """Publishes the next chunk unless paced in real time
+
+        Returns False once the end of a non-looping source has been reached.
+        """
+        if not self.realtime and not self.finished:
+            self._push_chunk(self._readChunk())
+        return not self.finished
+
+    def _run(self):
+        period = self.chunk_length / GlobalAudio.sample_rate
+        nextTime = time.perf_counter()
+        while not self._stop.is_set() and not self.finished:
+            self._push_chunk(self._readChunk())
+            nextTime += period
+            self._stop.wait(max(0., nextTime - time.perf_counter()))
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+
 class AudioInput(Effect):
     @staticmethod
     def getEffectDescription():
@@ -202,6 +504,7 @@ class AudioInput(Effect):
         self._outBuffer = []
         self._autogain_perc = None
         self._cur_gain = 1.0
+        self._bandGains = []
 
         logger.debug("Virtual audio input created. {} {}".format(GlobalAudio.device_index, GlobalAudio.chunk_rate))
 
@@ -276,11 +579,15 @@ class AudioInput(Effect):
             # min_value * (perc)^N = 1.0?
             # perc = root(1.0 / min_value, N) = (1./min_value)**(1/N)
             self._autogain_perc = (1.0 / min_value)**float(1 / N)
-        self._buffer = GlobalAudio.buffer
+        # Routed buses if the shared analysis ran, otherwise raw device channels
+        self._buffer = GlobalAudio.buses if GlobalAudio.buses is not None else GlobalAudio.buffer
         if len(self._outBuffer) != self.num_channels:
             self._outBuffer = []
             for i in range(0, self.num_channels):
                 self._outBuffer.append(AudioBuffer(GlobalAudio.sample_rate))
+        for buf in self._outBuffer:
+            # Network sources only know the sample rate once the first packet arrived
+            buf.sample_rate = GlobalAudio.sample_rate
 
     def process(self):
         if self._inputBuffer is None or self._outputBuffer is None:
@@ -289,21 +596,43 @@ class AudioInput(Effect):
             raise RuntimeError("No audio signal. Audio device might be not present or disabled.")
         if len(self._buffer) <= 0:
             return
-        if self._autogain:
-            
-            # determine max value -> in range 0,1
-            maxVal = np.max(self._buffer)
-            if maxVal * self._cur_gain > 1:
-                # reset cur_gain to prevent clipping
-                self._cur_gain = 1. / maxVal
-            elif self._cur_gain < self._autogain_max:
-                self._cur_gain = min(self._autogain_max, self._cur_gain * self._autogain_perc)
-            logger.debug("cur_gain: {}, gained value: {}".format(self._cur_gain, self._cur_gain * maxVal))
-        else:
-            self._cur_gain = 1
+        if self._autogain and not self.override_global_autogain and GlobalAudio.band_gains is not None:
+            self._applyBandGains()
+            return
+        self._updateGain()
         maxChannels = len(self._buffer)
+        shared = self._buffer is GlobalAudio.buses and GlobalAudio.bus_rms is not None and self._cur_gain > 0
         for i in range(0, self.num_channels):
             self._outBuffer[i].audio = self._cur_gain * self._buffer[i % maxChannels]
+            if shared:
+                # Reuse the per-bus analysis, scaled by the gain
+                self._outBuffer[i].preset(rms=self._cur_gain * GlobalAudio.bus_rms[i % maxChannels],
+                                          peak=self._cur_gain * GlobalAudio.bus_peak[i % maxChannels])
             # TODO: Calculate audio stats per channel: peak, rms, FFT buckets for remote display
             self._outputBuffer[i] = self._outBuffer[i]
             # logger.info("{}: {}".format(i, np.max(self._outputBuffer[i].audio)))
+
+    def _applyBandGains(self):
+        """Applies the shared multi-band autogain, see GlobalAudio.analyse"""
+        maxChannels = len(self._buffer)
+        gains = GlobalAudio.band_gains
+        if len(self._bandGains) != self.num_channels:
+            # Filter state is kept per output channel
+            self._bandGains = [dsp.BandGains(GlobalAudio.agc.edges, GlobalAudio.sample_rate) for i in range(self.num_channels)]
+        for i in range(0, self.num_channels):
+            self._outBuffer[i].audio = self._bandGains[i].process(self._buffer[i % maxChannels], GlobalAudio.sample_rate,
+                                                                  gains[i % maxChannels % len(gains)])
+            self._outputBuffer[i] = self._outBuffer[i]
+
+    def _updateGain(self):
+        if not self._autogain:
+            self._cur_gain = 1
+            return
+        # determine max value -> in range 0,1
+        maxVal = np.max(self._buffer)
+        if maxVal * self._cur_gain > 1:
+            # reset cur_gain to prevent clipping
+            self._cur_gain = 1. / maxVal
+        elif self._cur_gain < self._autogain_max:
+            self._cur_gain = min(self._autogain_max, self._cur_gain * self._autogain_perc)
+        logger.debug("cur_gain: {}, gained value: {}".format(self._cur_gain, self._cur_gain * maxVal))
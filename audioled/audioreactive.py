@@ -12,6 +12,7 @@ from scipy.ndimage.filters import gaussian_filter1d
 import audioled.colors as colors
 import audioled.dsp as dsp
 from audioled.effects import Effect
+from audioled.particles import Particles
 import audioled.effect as effect
 
 import logging
@@ -47,16 +48,8 @@ class Spectrum(Effect):
 
     def __initstate__(self):
         # state
-        self._norm_dist = None
-        self.fft_bins = 64
-        self._fft_dist = np.linspace(0, 1, self.fft_bins)
-        self._max_filter = np.ones(8)
-        self._min_feature_win = np.hamming(8)
-        self._fs_ds = 0.0
-        self._bass_rms = None
-        self._melody_rms = None
-        self._lastAudioChunk = None
-        self._gen = None
+        self._analyser = None
+        self._line_matrix = None
         super(Spectrum, self).__initstate__()
 
     def numInputChannels(self):
@@ -97,20 +90,12 @@ class Spectrum(Effect):
     def getModulateableParameters(self):
         return []  # Disable all modulations
 
-    def _audio_gen(self, audio_gen):
-        audio, self._fs_ds = dsp.preprocess(audio_gen, self._fs, self.fmax, self.n_overlaps)
-        return audio
-
-    def buffer_coroutine(self):
-        while True:
-            yield self._lastAudioChunk
-
     async def update(self, dt):
         await super().update(dt)
         if self._num_pixels is None:
             return
-        if self._norm_dist is None or len(self._norm_dist) != self._num_pixels:
-            self._norm_dist = np.linspace(0, 1, self._num_pixels)
+        # Linear interpolation to the pixels and smoothing of features in one matrix
+        self._line_matrix = dsp.smooth_upsample_matrix(int(self.fft_bins), self._num_pixels, 8)
 
     def process(self):
         if self._inputBuffer is None or self._outputBuffer is None:
@@ -119,7 +104,6 @@ class Spectrum(Effect):
             self._outputBuffer[0] = None
             return
         audio = self._inputBuffer[0].audio
-        self._fs = self._inputBuffer[0].sample_rate
         col_melody = self._inputBuffer[1]
         col_bass = self._inputBuffer[2]
         if col_melody is None:
@@ -129,17 +113,13 @@ class Spectrum(Effect):
             # default color: all white
             col_bass = np.ones(self._num_pixels) * np.array([[255.0], [255.0], [255.0]])
         if audio is not None:
-            if self._gen is None:
-                g = self.buffer_coroutine()
-                next(g)
-                self._lastAudioChunk = audio
-                self._gen = self._audio_gen(g)
-            self._lastAudioChunk = audio
-            y = next(self._gen)
-            bass = dsp.warped_psd(y, self.fft_bins, self._fs_ds, [32.7, 261.0], 'bark')
-            melody = dsp.warped_psd(y, self.fft_bins, self._fs_ds, [261.0, self.fmax], 'bark')
-            bass = self.process_line(bass)
-            melody = self.process_line(melody)
+            fs = self._inputBuffer[0].sample_rate
+            bins = int(self.fft_bins)
+            if self._analyser is None or not self._analyser.matches(fs, self.fmax, self.n_overlaps, bins):
+                self._analyser = dsp.SpectrumAnalyser(fs, self.fmax, self.n_overlaps, bins,
+                                                      [[32.7, 261.0], [261.0, self.fmax]], 'bark')
+            # Bass and melody from a single power spectrum
+            bass, melody = self._line_matrix.dot(self._analyser.process(audio).T).T * 255
             pixels = colors.blend(
                 1. / 255.0 * np.multiply(col_bass, bass),
                 1. / 255. * np.multiply(col_melody, melody),
@@ -147,23 +127,6 @@ class Spectrum(Effect):
             )
             self._outputBuffer[0] = pixels.clip(0, 255).astype(int)
 
-    def process_line(self, fft):
-
-        # fft = np.convolve(fft, self._max_filter, 'same')
-
-        # Some kind of normalization?
-        # fft_rms[1:] = fft_rms[:-1]
-        # fft_rms[0] = np.mean(fft)
-        # fft = np.tanh(fft / np.max(fft_rms)) * 255
-
-        # Upsample to number of pixels
-        fft = np.interp(self._norm_dist, self._fft_dist, fft)
-
-        #
-        fft = np.convolve(fft, self._min_feature_win, 'same')
-
-        return fft * 255
-
 
 class VUMeterRMS(Effect):
     """ VU Meter style effect
@@ -189,8 +152,7 @@ class VUMeterRMS(Effect):
 
     def __initstate__(self):
         super().__initstate__()
-        self._hold_values = []
-        self._bandpass = None
+        self._hold = dsp.EnvelopeFollower()
         self._default_color = None
 
     def numInputChannels(self):
@@ -259,24 +221,15 @@ class VUMeterRMS(Effect):
         if color is None:
             color = self._default_color
 
-        y = self._inputBuffer[0].audio
-        fs = self._inputBuffer[0].sample_rate
-
+        audioBuffer = self._inputBuffer[0]
         if self.lowcut_hz > 0 or self.highcut_hz < 20000:
-            # construct filter if needed
-            if self._bandpass is None:
-                self._bandpass = dsp.Bandpass(self.lowcut_hz, self.highcut_hz, fs, 3)
-            # update bandpass
-            self._bandpass.updateParams(self.lowcut_hz, self.highcut_hz, fs, 3)
-            # process audio
-            y = self._bandpass.filter(np.array(y), fs)
-
-        rms = dsp.rms(y)
+            rms = audioBuffer.bandRms(self.lowcut_hz, self.highcut_hz)
+        else:
+            rms = audioBuffer.rms()
         # calculate rms over hold_time
-        while len(self._hold_values) > self.n_overlaps:
-            self._hold_values.pop()
-        self._hold_values.insert(0, rms)
-        rms = dsp.rms(self._hold_values)
+        self._hold.setSize(dsp.hold_size(self.n_overlaps))
+        self._hold.update(rms)
+        rms = self._hold.rms()
         db = 20 * math.log10(max(rms, 1e-16))
         scal_value = (self.db_range + db) / self.db_range
         bar = np.zeros(self._num_pixels) * np.array([[0], [0], [0]])
@@ -310,8 +263,7 @@ class VUMeterPeak(Effect):
 
     def __initstate__(self):
         super().__initstate__()
-        self._hold_values = []
-        self._bandpass = None
+        self._hold = dsp.EnvelopeFollower()
         self._default_color = None
 
     def numInputChannels(self):
@@ -380,24 +332,15 @@ class VUMeterPeak(Effect):
         if color is None:
             color = self._default_color
 
-        y = self._inputBuffer[0].audio
-        fs = self._inputBuffer[0].sample_rate
-
+        audioBuffer = self._inputBuffer[0]
         if self.lowcut_hz > 0 or self.highcut_hz < 20000:
-            # construct filter if needed
-            if self._bandpass is None:
-                self._bandpass = dsp.Bandpass(self.lowcut_hz, self.highcut_hz, fs, 3)
-            # update bandpass params
-            self._bandpass.updateParams(self.lowcut_hz, self.highcut_hz, fs, 3)
-            # process audio
-            y = self._bandpass.filter(np.array(y), fs)
-
-        peak = np.max(y)
+            peak = audioBuffer.bandPeak(self.lowcut_hz, self.highcut_hz)
+        else:
+            peak = audioBuffer.peak()
         # calculate max over hold_time
-        while len(self._hold_values) > self.n_overlaps:
-            self._hold_values.pop()
-        self._hold_values.insert(0, peak)
-        peak = np.max(self._hold_values)
+        self._hold.setSize(dsp.hold_size(self.n_overlaps))
+        self._hold.update(peak)
+        peak = self._hold.max()
 
         db = (20 * (math.log10(max(peak, 1e-16))))
         scal_value = (self.db_range + db) / self.db_range
@@ -427,16 +370,12 @@ class MovingLight(Effect):
                  dim_time=2.5,
                  lowcut_hz=50.0,
                  highcut_hz=300.0,
-                 peak_scale=4.0,
-                 peak_filter=2.6,
                  highlight=0.6,
                  smoothing=0):
         self.speed = speed
         self.dim_time = dim_time
         self.lowcut_hz = lowcut_hz
         self.highcut_hz = highcut_hz
-        self.peak_scale = peak_scale
-        self.peak_filter = peak_filter
         self.highlight = highlight
         self.smoothing = smoothing
         self.__initstate__()
@@ -445,10 +384,9 @@ class MovingLight(Effect):
         super(MovingLight, self).__initstate__()
         # state
         self._pixel_state = None
-        self._bandpass = None
         self._last_t = 0.0
         self._last_move_t = 0.0
-        self._hold_values = []
+        self._hold = dsp.EnvelopeFollower()
 
     def numInputChannels(self):
         return 2
@@ -466,8 +404,6 @@ class MovingLight(Effect):
                 ("dim_time", [1.0, 0.001, 10.0, 0.001]),
                 ("lowcut_hz", [50.0, 0.0, 8000.0, 1.0]),
                 ("highcut_hz", [100.0, 0.0, 8000.0, 1.0]),
-                ("peak_filter", [1.0, 0.0, 10.0, .01]),
-                ("peak_scale", [1.0, 0.0, 5.0, .01]),
                 ("highlight", [0.0, 0.0, 1.0, 0.01]),
                 ("smoothing", [0, 0, 1, 0.01]),
             ])
@@ -482,9 +418,6 @@ class MovingLight(Effect):
                 "dim_time": "Amount of time for the afterglow of the moving peak.",
                 "lowcut_hz": "Lowcut frequency of the audio input.",
                 "highcut_hz": "Highcut frequency of the audio input.",
-                "peak_filter":
-                "Filters the audio peaks. Increase this value to transform only high audio peaks into visual peaks.",
-                "peak_scale": "Scales the visual peak after the filter.",
                 "highlight": "Amount of white light added to the audio peak.",
                 "smoothing": "Smoothing of the moving peak.",
             }
@@ -502,19 +435,11 @@ class MovingLight(Effect):
         if not self._inputBufferValid(0, buffer_type=effect.AudioBuffer.__name__):
             self._outputBuffer[0] = None
             return
-        audio = self._inputBuffer[0].audio
-        fs = self._inputBuffer[0].sample_rate
+        audioBuffer = self._inputBuffer[0]
         color = self._inputBuffer[1]
         if color is None:
             # default color: all white
             color = np.ones(self._num_pixels) * np.array([[255.0], [255.0], [255.0]])
-        # construct filter if needed
-        if self._bandpass is None:
-            self._bandpass = dsp.Bandpass(self.lowcut_hz, self.highcut_hz, fs, 3)
-        # update bandpass
-        self._bandpass.updateParams(self.lowcut_hz, self.highcut_hz, fs, 3)
-        # apply bandpass to audio
-        y = self._bandpass.filter(np.array(audio), fs)
         # move in speed
         dt_move = self._t - self._last_move_t
         # calculate number of pixels to shift
@@ -534,18 +459,11 @@ class MovingLight(Effect):
         self._pixel_state *= (1.0 - dt / self.dim_time)
         self._pixel_state = gaussian_filter1d(self._pixel_state, sigma=0.5, axis=1)
         self._pixel_state = gaussian_filter1d(self._pixel_state, sigma=0.5, axis=1)
-        # calculate current peak
-        peak = np.max(y) * 1.0
-        while len(self._hold_values) > 20 * self.smoothing:
-            self._hold_values.pop()
-        self._hold_values.insert(0, peak)
-        peak = np.max(self._hold_values)
-        # apply peak filter and scale
-        try:
-            peak = peak**self.peak_filter
-        except Exception:
-            peak = peak
-        peak = peak * self.peak_scale
+        # calculate current peak of bandpassed audio
+        peak = audioBuffer.bandPeak(self.lowcut_hz, self.highcut_hz) * 1.0
+        self._hold.setSize(dsp.hold_size(20 * self.smoothing))
+        self._hold.update(peak)
+        peak = self._hold.max()
         # new pixel at origin with peak
         r, g, b = color[0, 0], color[1, 0], color[2, 0]
         self._pixel_state[0][0:shift_pixels] = r * peak + self.highlight * peak * 255.0
@@ -572,21 +490,16 @@ class Bonfire(Effect):
                  spread=100,
                  lowcut_hz=50.0,
                  highcut_hz=200.0,
-                 peak_scale=1.0,
-                 peak_filter=1.0,
                  smoothing=0):
         self.spread = spread
         self.lowcut_hz = lowcut_hz
         self.highcut_hz = highcut_hz
-        self.peak_scale = peak_scale
-        self.peak_filter = peak_filter
         self.smoothing = smoothing
         self._default_color = None
         self.__initstate__()
 
     def __initstate__(self):
-        self._bandpass = None
-        self._hold_values = []
+        self._hold = dsp.EnvelopeFollower()
         super(Bonfire, self).__initstate__()
 
     def numInputChannels(self):
@@ -604,8 +517,6 @@ class Bonfire(Effect):
                 ("spread", [10, 0, 100, 1]),
                 ("lowcut_hz", [50.0, 0.0, 8000.0, 1.0]),
                 ("highcut_hz", [100.0, 0.0, 8000.0, 1.0]),
-                ("peak_filter", [1.0, 0.0, 10.0, .01]),
-                ("peak_scale", [1.0, 0.0, 5.0, .01]),
                 ("smoothing", [0, 0, 1, 0.01]),
             ])
         }
@@ -618,9 +529,6 @@ class Bonfire(Effect):
                 "spread": "Amount of pixels the splitted colors are moved.",
                 "lowcut_hz": "Lowcut frequency of the audio input.",
                 "highcut_hz": "Highcut frequency of the audio input.",
-                "peak_filter":
-                "Filters the audio peaks. Increase this value to transform only high audio peaks into visual peaks.",
-                "peak_scale": "Scales the visual peak after the filter.",
                 "smoothing": "Smoothing of the moving peak.",
             }
         }
@@ -638,27 +546,11 @@ class Bonfire(Effect):
             # default color: all white
             pixelbuffer = np.ones(self._num_pixels) * np.array([[255.0], [255.0], [255.0]])
 
-        audio = self._inputBuffer[0].audio
-        fs = self._inputBuffer[0].sample_rate
-
-        # construct filter if needed
-        if self._bandpass is None:
-            self._bandpass = dsp.Bandpass(self.lowcut_hz, self.highcut_hz, fs, 3)
-        # update bandpass
-        self._bandpass.updateParams(self.lowcut_hz, self.highcut_hz, fs, 3)
-        # apply bandpass to audio
-        y = self._bandpass.filter(np.array(audio), fs)
-        peak = np.max(y) * 1.0
-        while len(self._hold_values) > 20 * self.smoothing:
-            self._hold_values.pop()
-        self._hold_values.insert(0, peak)
-        peak = np.max(self._hold_values)
-        # apply peak filter and scale
-        try:
-            peak = peak**self.peak_filter
-        except Exception:
-            peak = peak
-        peak = peak * self.peak_scale
+        # peak of bandpassed audio
+        peak = self._inputBuffer[0].bandPeak(self.lowcut_hz, self.highcut_hz) * 1.0
+        self._hold.setSize(dsp.hold_size(20 * self.smoothing))
+        self._hold.update(peak)
+        peak = self._hold.max()
 
         pixelbuffer[0] = sp.ndimage.interpolation.shift(pixelbuffer[0], -self.spread * peak, mode='wrap', prefilter=True)
         pixelbuffer[2] = sp.ndimage.interpolation.shift(pixelbuffer[2], self.spread * peak, mode='wrap', prefilter=True)
@@ -675,8 +567,6 @@ class FallingStars(Effect):
     def __init__(self,
                  lowcut_hz=50.0,
                  highcut_hz=300.0,
-                 peak_filter=1.0,
-                 peak_scale=1.0,
                  dim_speed=100,
                  thickness=1,
                  probability=0.1,
@@ -687,19 +577,13 @@ class FallingStars(Effect):
         self.probability = probability
         self.lowcut_hz = lowcut_hz
         self.highcut_hz = highcut_hz
-        self.peak_filter = peak_filter
-        self.peak_scale = peak_scale
         self.min_brightness = min_brightness
         self.max_spawns = max_spawns
         self.__initstate__()
 
     def __initstate__(self):
         # state
-        self._t0Array = []
-        self._spawnArray = []
-        self._peakArray = []
-        self._starCounter = 0
-        self._bandpass = None
+        self._stars = Particles(100)
         super(FallingStars, self).__initstate__()
 
     @staticmethod
@@ -710,8 +594,6 @@ class FallingStars(Effect):
                 # default, min, max, stepsize
                 ("lowcut_hz", [50.0, 0.0, 8000.0, 1.0]),
                 ("highcut_hz", [100.0, 0.0, 8000.0, 1.0]),
-                ("peak_filter", [1.0, 0.0, 10.0, .01]),
-                ("peak_scale", [1.0, 0.0, 10.0, .01]),
                 ("dim_speed", [100, 1, 1000, 1]),
                 ("thickness", [1, 1, 300, 1]),
                 ("probability", [0.1, 0.0, 1.0, 0.01]),
@@ -727,9 +609,6 @@ class FallingStars(Effect):
             "parameters": {
                 "lowcut_hz": "Lowcut frequency of the audio input.",
                 "highcut_hz": "Highcut frequency of the audio input.",
-                "peak_filter":
-                "Filters the audio peaks. Increase this value to transform only high audio peaks into visual peaks.",
-                "peak_scale": "Scales the visual peak after the filter.",
                 "dim_speed": "Time to fade out one star.",
                 "thickness": "Thickness of one star in pixels.",
                 "probability": "Probability of spawning a new star even if there's no audio peak.",
@@ -745,36 +624,15 @@ class FallingStars(Effect):
     def numOutputChannels(self):
         return 1
 
-    def spawnStar(self, peak):
-        self._starCounter += 1
-        self._t0Array.append(self._t)
-        self._spawnArray.append(random.randint(0, self._num_pixels - self.thickness))
-        self._peakArray.append(peak)
-        if self._starCounter > 100:
-            self._starCounter -= 1
-            self._t0Array.pop(0)
-            self._spawnArray.pop(0)
-            self._peakArray.pop(0)
-
-    def allStars(self, t, dim_speed, thickness, t0, spawnSpot, peak):
-        controlArray = []
-        for i in range(0, self._starCounter):
-            oneStarArray = np.zeros(self._num_pixels)
-            for j in range(0, thickness):
-                if i < len(spawnSpot):
-                    index = spawnSpot[i] + j
-                    if index < self._num_pixels:
-                        tmp = math.exp(-(100 / dim_speed) * (self._t - t0[i])) * max(self.min_brightness, peak[i])
-                        oneStarArray[index] = tmp
-            controlArray.append(oneStarArray)
-        return controlArray
+    def spawnStars(self, prob, peak):
+        spawns = sum(1 for _ in range(int(self.max_spawns)) if random.random() <= prob)
+        maxSpot = max(self._num_pixels - int(self.thickness), 0)
+        self._stars.spawn(self._t, [random.randint(0, maxSpot) for _ in range(spawns)], peak)
 
     def starControl(self, prob, intensity):
-        for i in range(int(self.max_spawns)):
-            if random.random() <= prob:
-                self.spawnStar(intensity)
-        outputArray = self.allStars(self._t, self.dim_speed, self.thickness, self._t0Array, self._spawnArray, self._peakArray)
-        return np.sum(outputArray, axis=0)
+        self.spawnStars(prob, intensity)
+        peak = np.maximum(self.min_brightness, self._stars.peak[:len(self._stars)])
+        return self._stars.render(self._num_pixels, self._stars.decay(self._t, self.dim_speed) * peak, self.thickness)
 
     async def update(self, dt):
         await super().update(dt)
@@ -799,33 +657,12 @@ class FallingStars(Effect):
         else:
             color = np.ones(self._num_pixels) * np.array([[255.0], [255.0], [255.0]])
 
-        audio = self._inputBuffer[0].audio
-        fs = self._inputBuffer[0].sample_rate
-
-        # construct filter if needed
-        if self._bandpass is None:
-            self._bandpass = dsp.Bandpass(self.lowcut_hz, self.highcut_hz, fs, 3)
-        # update bandpass
-        self._bandpass.updateParams(self.lowcut_hz, self.highcut_hz, fs, 3)
-        # apply bandpass to audio
-        y = self._bandpass.filter(np.array(audio), fs)
-
-        # adjust probability according to peak of audio
-        peak = np.max(y) * 1.0
-        maxpeak = 1
-        try:
-            peak = peak**self.peak_filter
-            maxpeak = maxpeak**self.peak_filter
-        except Exception:
-            peak = peak
-            maxpeak = peak
-        prob = min(jvalue(0, maxpeak, self.probability) + peak, 1.0)
+        # adjust probability according to peak of bandpassed audio
+        peak = self._inputBuffer[0].bandPeak(self.lowcut_hz, self.highcut_hz) * 1.0
+        prob = min(jvalue(0, 1, self.probability) + peak, 1.0)
         # logger.debug("spawn start {}".format(prob))
         if self._outputBuffer is not None:
-            self._output = np.multiply(
-                color,
-                self.starControl(prob, peak)
-                * np.array([[self.peak_scale * 1.0], [self.peak_scale * 1.0], [self.peak_scale * 1.0]]))
+            self._output = np.multiply(color, self.starControl(prob, peak))
         self._outputBuffer[0] = self._output.clip(0.0, 255.0)
 
 
@@ -845,7 +682,6 @@ class Oscilloscope(Effect):
 
     def __initstate__(self):
         super().__initstate__()
-        self._bandpass = None
         self._audioBuffer = None
         self._last_process_dt = 0.0
 
@@ -919,17 +755,10 @@ class Oscilloscope(Effect):
             color = np.ones(cols) * np.array([[255], [255], [255]])
 
         # Init audio
-        audio = self._inputBuffer[0].audio * self.gain
         fs = self._inputBuffer[0].sample_rate
 
-        # construct filter if needed
-        if self._bandpass is None:
-            self._bandpass = dsp.Bandpass(self.lowcut_hz, self.highcut_hz, fs, 3)
-        # update bandpass
-        self._bandpass.updateParams(self.lowcut_hz, self.highcut_hz, fs, 3)
-
-        # apply bandpass to audio
-        y = self._bandpass.filter(np.array(audio), fs)
+        # apply bandpass and gain to audio
+        y = self._inputBuffer[0].bandpass(self.lowcut_hz, self.highcut_hz) * self.gain
 
         # adjust number of samples to respect window_fq_hz.
         # if we have 440 samples @ 44000 Hz -> 440/44000 = 0.01 s of data -> 100 Hz
@@ -997,7 +826,7 @@ class Blink(Effect):
 
     def __initstate__(self):
         super().__initstate__()
-        self._hold_values = []
+        self._hold = dsp.EnvelopeFollower()
         self._default_color = None
 
     def numInputChannels(self):
@@ -1035,13 +864,11 @@ class Blink(Effect):
             return
         if not self._inputBufferValid(0, buffer_type=effect.AudioBuffer.__name__):
             return
-        y = self._inputBuffer[0].audio
-        rms = dsp.rms(y)
+        rms = self._inputBuffer[0].rms()
         # calculate rms over hold_time
-        while len(self._hold_values) > 20 * self.smoothing:
-            self._hold_values.pop()
-        self._hold_values.insert(0, rms)
-        rms = dsp.rms(self._hold_values)
+        self._hold.setSize(dsp.hold_size(20 * self.smoothing))
+        self._hold.update(rms)
+        rms = self._hold.rms()
         db = 20 * math.log10(max(rms, 1e-16))
         scal_value = (self.db_range + db) / self.db_range
         self._outputBuffer[0] = self._inputBuffer[1] * (1 - self.amount) + self._inputBuffer[1] * scal_value * self.amount
@@ -1074,8 +901,7 @@ class Shift(Effect):
 
     def __initstate__(self):
         super().__initstate__()
-        self._bandpass = None
-        self._hold_values = []
+        self._hold = dsp.EnvelopeFollower()
         self._shift_pixels = 0
         self._last_t = self._t
 
@@ -1127,25 +953,13 @@ class Shift(Effect):
             self._outputBuffer[0] = None
             return
 
-        # Init audio
-        audio = self._inputBuffer[0].audio
-        fs = self._inputBuffer[0].sample_rate
-
-        # construct filter if needed
-        if self._bandpass is None:
-            self._bandpass = dsp.Bandpass(self.lowcut_hz, self.highcut_hz, fs, 3)
-        # update bandpass
-        self._bandpass.updateParams(self.lowcut_hz, self.highcut_hz, fs, 3)
-        # apply bandpass to audio
-        y = self._bandpass.filter(np.array(audio), fs)
-
         x = self._inputBuffer[1]
-        rms = dsp.rms(y)
+        # rms of bandpassed audio
+        rms = self._inputBuffer[0].bandRms(self.lowcut_hz, self.highcut_hz)
         # calculate rms over hold_time
-        while len(self._hold_values) > 20 * self.smoothing:
-            self._hold_values.pop()
-        self._hold_values.insert(0, rms)
-        rms = dsp.rms(self._hold_values)
+        self._hold.setSize(dsp.hold_size(20 * self.smoothing))
+        self._hold.update(rms)
+        rms = self._hold.rms()
         db = 20 * math.log10(max(rms, 1e-16))
         db = max(db, -self.db_range)
 
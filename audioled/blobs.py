@@ -0,0 +1,91 @@
+from __future__ import (absolute_import, division, print_function, unicode_literals)
+
+import math
+
+import numpy as np
+
+blob_shapes = ['cos', 'triangle', 'gaussian']
+
+
+def _cos(u):
+    return np.where(np.abs(u) < 1, np.cos(0.5 * np.pi * u), 0.)
+
+
+def _triangle(u):
+    return np.maximum(1. - np.abs(u), 0.)
+
+
+def _gaussian(u):
+    return np.where(np.abs(u) <= 3, np.exp(-0.5 * u * u), 0.)
+
+
+# Shape function and support in units of the width
+_shapes = {'cos': (_cos, 1.), 'triangle': (_triangle, 1.), 'gaussian': (_gaussian, 3.)}
+
+
+def render(num_pixels, positions, widths, amplitudes=1., shape='cos', wrap=False):
+    """Sums blobs of light at fractional pixel positions
+
+    Only the pixels covered by the blobs are evaluated and added with a single scatter-add.
+
+    Parameters
+    ----------
+    num_pixels: int
+        Number of pixels
+    positions: array
+        Center of each blob in pixels
+    widths: array or float
+        Half width of each blob in pixels ('cos' and 'triangle' are zero at this distance),
+        standard deviation for 'gaussian'. Must be greater than zero.
+    amplitudes: array or float
+        Value of each blob at its center, may be negative
+    shape: str
+        One of blob_shapes
+    wrap: bool
+        Blobs leaving the strip enter on the other side, otherwise they are cut off.
+    """
+    if shape not in _shapes:
+        raise ValueError("Unknown blob shape {}, choose from {}".format(shape, blob_shapes))
+    function, support = _shapes[shape]
+    positions = np.atleast_1d(np.asarray(positions, dtype=float))
+    widths = np.broadcast_to(np.asarray(widths, dtype=float), positions.shape)
+    amplitudes = np.broadcast_to(np.asarray(amplitudes, dtype=float), positions.shape)
+    if len(positions) == 0:
+        return np.zeros(num_pixels)
+    reach = widths * support
+    # Number of pixels covered by the widest blob
+    size = int(math.ceil(2 * np.max(reach))) + 1
+    index = np.ceil(positions - reach).astype(int)[:, np.newaxis] + np.arange(size)
+    values = function((index - positions[:, np.newaxis]) / widths[:, np.newaxis]) * amplitudes[:, np.newaxis]
+    index = index.ravel()
+    values = values.ravel()
+    if wrap:
+        index = index % num_pixels
+    else:
+        valid = (index >= 0) & (index < num_pixels)
+        index = index[valid]
+        values = values[valid]
+    return np.bincount(index, weights=values, minlength=num_pixels)[:num_pixels]
+
+
+def shift(rows, shifts):
+    """Shifts each row by a fractional number of pixels, wrapping around at the ends
+
+    Values between pixels are linearly interpolated.
+
+    Parameters
+    ----------
+    rows: array (rows, num_pixels)
+        Pixel rows, e.g. an RGB pixel array or one profile per moving object
+    shifts: array or float
+        Shift of each row in pixels, positive values move towards the end of the strip
+    """
+    rows = np.asarray(rows, dtype=float)
+    num_pixels = rows.shape[-1]
+    shifts = np.broadcast_to(np.asarray(shifts, dtype=float), rows.shape[:1])
+    source = np.arange(num_pixels) - shifts[:, np.newaxis]
+    left = np.floor(source)
+    frac = source - left
+    left = left.astype(int) % num_pixels
+    right = (left + 1) % num_pixels
+    return np.take_along_axis(rows, left, axis=1) * (1. - frac) + np.take_along_axis(rows, right, axis=1) * frac
@@ -4,7 +4,11 @@ from __future__ import unicode_literals
 from __future__ import absolute_import
 from collections import OrderedDict
 from typing import List
+import json
+import os
+import sys
 import time
+import ctypes
 import numpy as np
 import multiprocessing
 from audioled.effect import Effect
@@ -23,6 +27,8 @@ _GAMMA_TABLE = [
     220, 222, 224, 226, 228, 230, 232, 233, 235, 237, 239, 241, 243, 245, 247, 249, 251, 253, 255
 ]
 _GAMMA_TABLE = np.array(_GAMMA_TABLE)
+# Exponent of the curve in _GAMMA_TABLE
+_GAMMA = 2.0
 
 
 class LEDController:
@@ -38,13 +44,41 @@ class LEDController:
         device = LEDController()
         device.show(pixels)
     """
-    def __init__(self, num_pixels, num_rows=1, brightness=1.0):
+    def __init__(self, num_pixels, num_rows=1, brightness=1.0, gamma=False, white_balance=None, dither=False):
         self.num_pixels = num_pixels
         self.num_rows = num_rows
         self.brightness = brightness
+        self.gamma = gamma
+        self.white_balance = white_balance
+        self.dither = dither
+        self._lut = None
+        self._curve = None
+        self._corrected = None
+        self._dither_error = None
+        self._dither_target = None
 
     def setBrightness(self, value):
         self.brightness = value
+        self._invalidateLUT()
+
+    def setGamma(self, gamma):
+        """Enables gamma correction"""
+        self.gamma = gamma
+        self._invalidateLUT()
+
+    def setWhiteBalance(self, white_balance):
+        """Sets per-channel white balance as [r, g, b] in range 0 to 1, None to disable"""
+        self.white_balance = white_balance
+        self._invalidateLUT()
+
+    def setDither(self, dither):
+        """Enables temporal dithering of the color corrected output"""
+        self.dither = dither
+        self._dither_error = None
+
+    def _invalidateLUT(self):
+        self._lut = None
+        self._curve = None
 
     def getBrightness(self):
         try:
@@ -53,6 +87,17 @@ class LEDController:
             self.brightness = 1.0
             return min(1.0, self.brightness)
 
+    def setLatency(self, value):
+        """Sets the time in seconds between show() and the light being visible, e.g. transmission time"""
+        self.latency = value
+
+    def getLatency(self):
+        try:
+            return self.latency
+        except AttributeError:
+            self.latency = 0.
+            return self.latency
+
     def getNumPixels(self):
         return self.num_pixels
 
@@ -68,6 +113,74 @@ class LEDController:
     def shutdown(self):
         logger.debug("Shutting down device")
 
+    def getColorCurve(self):
+        """Returns the (3, 256) float32 color correction curve
+
+        The curve combines brightness, gamma curve and white balance and is only
+        rebuilt if one of them changes.
+        """
+        if getattr(self, '_curve', None) is None:
+            white_balance = getattr(self, 'white_balance', None)
+            if white_balance is None:
+                white_balance = [1.0, 1.0, 1.0]
+            scale = self.getBrightness() * np.array(white_balance, dtype=float).reshape(3, 1)
+            values = np.clip(np.arange(256) * scale, 0, 255)
+            if getattr(self, 'gamma', False):
+                values = 255. * (values / 255.)**_GAMMA
+            self._curve = values.astype(np.float32)
+        return self._curve
+
+    def getColorLUT(self):
+        """Returns the (3, 256) uint8 lookup table for color correction"""
+        if getattr(self, '_lut', None) is None:
+            self._lut = np.rint(self.getColorCurve()).astype(np.uint8)
+        return self._lut
+
+    def colorCorrect(self, pixels):
+        """Applies brightness, gamma and white balance to the given pixels
+
+        Returns a (3, n_pixels) uint8 array, which is reused for the next call.
+        """
+        if pixels is None:
+            pixels = np.zeros((3, self.num_pixels), dtype=np.uint8)
+        if pixels.dtype != np.uint8:
+            pixels = np.clip(pixels, 0, 255).astype(np.uint8)
+        corrected = getattr(self, '_corrected', None)
+        if corrected is None or corrected.shape != pixels.shape:
+            corrected = self._corrected = np.empty(pixels.shape, dtype=np.uint8)
+        if getattr(self, 'dither', False):
+            return self._dither(pixels, corrected)
+        lut = self.getColorLUT()
+        if getattr(self, 'white_balance', None) is None:
+            # All channels share the same curve
+            np.take(lut[0], pixels, out=corrected, mode='clip')
+        else:
+            for c in range(3):
+                np.take(lut[c], pixels[c], out=corrected[c], mode='clip')
+        return corrected
+
+    def _dither(self, pixels, corrected):
+        """Temporal dithering of the color correction curve
+
+        The quantization error of every pixel is carried over to the next frame,
+        so that values between two 8 bit steps average out over time.
+        """
+        curve = self.getColorCurve()
+        error = getattr(self, '_dither_error', None)
+        if error is None or error.shape != pixels.shape:
+            error = self._dither_error = np.zeros(pixels.shape, dtype=np.float32)
+            self._dither_target = np.empty(pixels.shape, dtype=np.float32)
+        target = self._dither_target
+        for c in range(3):
+            np.take(curve[c], pixels[c], out=target[c], mode='clip')
+        target += error
+        np.floor(target, out=error)
+        np.clip(error, 0, 255, out=error)
+        corrected[:] = error
+        # Remaining error for the next frame
+        np.subtract(target, error, out=error)
+        return corrected
+
     def show(self, pixels):
         """Set LED pixels to the values given in the array
 
@@ -113,8 +226,8 @@ class LEDController:
 
 
 class ESP8266(LEDController):
-    def __init__(self, num_pixels, num_rows=1, ip='192.168.0.150', port=7777):
-        super().__init__(num_pixels, num_rows)
+    def __init__(self, num_pixels, num_rows=1, ip='192.168.0.150', port=7777, gamma=False, white_balance=None):
+        super().__init__(num_pixels, num_rows, gamma=gamma, white_balance=white_balance)
         """Initialize object for communicating with as ESP8266
 
         Parameters
@@ -146,21 +259,23 @@ class ESP8266(LEDController):
             g (0 to 255): Green value of LED
             b (0 to 255): Blue value of LED
         """
-        if pixels is None:
-            pixels = np.zeros((3, self.num_pixels))
-        message = (pixels * self.getBrightness()).T.clip(0, 255).astype(np.uint8).ravel().tostring()
+        message = self.colorCorrect(pixels).T.tobytes()
         self._sock.sendto(message, (self._ip, self._port))
 
 
 class FadeCandy(LEDController):
-    def __init__(self, num_pixels, num_rows=1, server='localhost:7890'):
-        super().__init__(num_pixels, num_rows)
+    def __init__(self, num_pixels, num_rows=1, server='localhost:7890', gamma=False, white_balance=None, dither=True):
+        super().__init__(num_pixels, num_rows, gamma=gamma, white_balance=white_balance, dither=dither)
         """Initializes object for communicating with a FadeCandy device
 
         Parameters
         ----------
         server: str, optional
             FadeCandy server used to communicate with the FadeCandy device.
+        gamma: bool, optional
+            Gamma correction on the host. Off by default, since fcserver applies its own.
+        dither: bool, optional
+            Temporal dithering of the 8 bit output, e.g. for smooth fades at low brightness.
         """
         import audioled.opc
         self.client = audioled.opc.Client(server)
@@ -171,54 +286,59 @@ class FadeCandy(LEDController):
             logger.error('Ensure that fcserver is running and try again.')
 
     def show(self, pixels):
-        if pixels is None:
-            pixels = np.zeros((3, self.num_pixels))
-        self.client.put_pixels((pixels * self.getBrightness()).T.clip(0, 255).astype(int).tolist())
+        self.client.put_pixels(self.colorCorrect(pixels).T.tolist())
 
 
 class BlinkStick(LEDController):
-    def __init__(self, num_pixels, num_rows=1):
-        super().__init__(num_pixels, num_rows)
-        """Initializes a BlinkStick controller"""
-        try:
-            from blinkstick import blinkstick
-        except ImportError as e:
-            logger.error('Unable to import the blinkstick library')
-            logger.error('You can install this library with `pip install blinkstick`')
-            raise e
-        self.stick = blinkstick.find_first()
+    def __init__(self, num_pixels, num_rows=1, stick=None, gamma=True, white_balance=None):
+        super().__init__(num_pixels, num_rows, gamma=gamma, white_balance=white_balance)
+        """Initializes a BlinkStick controller
+
+        Parameters
+        ----------
+        stick: object, optional
+            Object providing set_led_data(channel, data), e.g. a mock for benchmarking.
+            Defaults to the first BlinkStick found.
+        """
+        if stick is None:
+            try:
+                from blinkstick import blinkstick
+            except ImportError as e:
+                logger.error('Unable to import the blinkstick library')
+                logger.error('You can install this library with `pip install blinkstick`')
+                raise e
+            stick = blinkstick.find_first()
+        self.stick = stick
+        self._grb = None
 
     def show(self, pixels):
         """Writes new LED values to the Blinkstick.
 
         This function updates the LED strip with new values.
         """
-        if pixels is None:
-            pixels = np.zeros((3, self.num_pixels))
-        # Truncate values and cast to integer
+        pixels = self.colorCorrect(pixels)
         n_pixels = pixels.shape[1]
-        pixels = (pixels * self.getBrightness()).clip(0, 255).astype(int)
-        pixels = _GAMMA_TABLE[pixels]
-        # Read the rgb values
-        r = pixels[0][:].astype(int)
-        g = pixels[1][:].astype(int)
-        b = pixels[2][:].astype(int)
-
-        # Create array in which we will store the led states
-        newstrip = [None] * (n_pixels * 3)
-
-        for i in range(n_pixels):
-            # Blinkstick uses GRB format
-            newstrip[i * 3] = g[i]
-            newstrip[i * 3 + 1] = r[i]
-            newstrip[i * 3 + 2] = b[i]
+        if self._grb is None or self._grb.shape[0] != n_pixels:
+            self._grb = np.zeros((n_pixels, 3), dtype=np.uint8)
+        # Blinkstick uses GRB format: interleave as g0 r0 b0 g1 r1 b1 ...
+        self._grb[:] = pixels[[1, 0, 2]].T
         # Send the data to the blinkstick
-        self.stick.set_led_data(0, newstrip)
+        self.stick.set_led_data(0, self._grb.reshape(-1))
 
 
 class RaspberryPi(LEDController):
-    def __init__(self, num_pixels, num_rows=1, pin=18, invert_logic=False, freq=800000, dma=10):
-        super().__init__(num_pixels, num_rows)
+    def __init__(self,
+                 num_pixels,
+                 num_rows=1,
+                 pin=18,
+                 invert_logic=False,
+                 freq=800000,
+                 dma=10,
+                 strip_class=None,
+                 gamma=True,
+                 white_balance=None,
+                 dither=True):
+        super().__init__(num_pixels, num_rows, gamma=gamma, white_balance=white_balance, dither=dither)
         """Creates a Raspberry Pi output device
 
         Parameters
@@ -237,6 +357,11 @@ class RaspberryPi(LEDController):
         dma: int, optional
             DMA (direct memory access) channel used to drive PWM signals.
             If you aren't sure, try 5.
+        strip_class: class, optional
+            Replacement for rpi_ws281x.PixelStrip, e.g. EmulatedPixelStrip.
+            Not persisted, unpickled devices always use rpi_ws281x.
+        dither: bool, optional
+            Temporal dithering of the 8 bit output, e.g. for smooth fades at low brightness.
         """
         logger.debug('Creating RaspberryPi LED device')
         self.pin = pin
@@ -244,27 +369,63 @@ class RaspberryPi(LEDController):
         self.dma = dma
         self.invert = invert_logic
         self.brightness = 255
+        self._strip_class = strip_class
         self.__initstate__()
 
     def __initstate__(self):
+        self._strip = None
+        self._leds = None
+        self._rgb = None
+        self._lut = None
+        self._curve = None
+        self._corrected = None
+        self._dither_error = None
         try:
-            import rpi_ws281x
-            logger.debug('Initializing RaspberryPI LED device')
-            self._strip = rpi_ws281x.PixelStrip(num=self.num_pixels,
-                                                pin=self.pin,
-                                                freq_hz=self.freq_hz,
-                                                dma=self.dma,
-                                                invert=self.invert,
-                                                brightness=self.brightness)
-            self._strip.begin()
-        except ImportError:
-            url = 'learn.adafruit.com/neopixels-on-raspberry-pi/software'
-            logger.error('Could not import the neopixel library')
-            logger.error('For installation instructions, see {}'.format(url))
-            logger.error('If running on RaspberryPi, please install.')
-            logger.error('------------------------------------------')
-            logger.error('Otherwise rely on dependency injection')
-            logger.error('Disconnecting Device.')
+            strip_class = self._strip_class
+        except AttributeError:
+            strip_class = None
+        if strip_class is None:
+            try:
+                import rpi_ws281x
+                strip_class = rpi_ws281x.PixelStrip
+            except ImportError:
+                url = 'learn.adafruit.com/neopixels-on-raspberry-pi/software'
+                logger.error('Could not import the neopixel library')
+                logger.error('For installation instructions, see {}'.format(url))
+                logger.error('If running on RaspberryPi, please install.')
+                logger.error('------------------------------------------')
+                logger.error('Otherwise rely on dependency injection')
+                logger.error('Disconnecting Device.')
+                return
+        logger.debug('Initializing RaspberryPI LED device')
+        self._strip = strip_class(num=self.num_pixels,
+                                  pin=self.pin,
+                                  freq_hz=self.freq_hz,
+                                  dma=self.dma,
+                                  invert=self.invert,
+                                  brightness=self.brightness)
+        self._strip.begin()
+        self._leds = self._createLedBuffer()
+
+    def _createLedBuffer(self):
+        """Returns a writable uint32 array backed by the LED buffer of the strip
+
+        Returns None if the buffer cannot be accessed, in this case pixels are set one by one.
+        """
+        leds = getattr(self._strip, 'leds', None)
+        if isinstance(leds, np.ndarray):
+            # Emulated strip
+            return leds
+        try:
+            from rpi_ws281x import ws
+            # The SWIG pointer converts to the address of the channel's ws2811_led_t array
+            address = int(ws.ws2811_channel_t_leds_get(self._strip._channel))
+            if address == 0:
+                raise RuntimeError("LED buffer not allocated")
+            return np.ctypeslib.as_array((ctypes.c_uint32 * self.num_pixels).from_address(address))
+        except Exception as e:
+            logger.warning("Cannot access LED buffer of ws281x library, falling back to setPixelColor: {}".format(e))
+            return None
 
     def __cleanState__(self, stateDict):
         """
@@ -288,7 +449,8 @@ class RaspberryPi(LEDController):
         self.__initstate__()
 
     def shutdown(self):
-        self._strip._cleanup()
+        if self._strip is not None:
+            self._strip._cleanup()
         return super().shutdown()
 
     def show(self, pixels):
@@ -297,29 +459,70 @@ class RaspberryPi(LEDController):
         Raspberry Pi uses the rpi_ws281x to control the LED strip directly.
         This function updates the LED strip with new values.
         """
-        if pixels is None:
-            pixels = np.zeros((3, self.num_pixels))
-
-        # Truncate values and cast to integer
-        n_pixels = pixels.shape[1]
-        pixels = (pixels * self.getBrightness()).clip(0, 255).astype(int)
-        # Optional gamma correction
-        pixels = _GAMMA_TABLE[pixels]
+        pixels = self.colorCorrect(pixels)
+        n_pixels = min(pixels.shape[1], self.num_pixels)
         # Encode 24-bit LED values in 32 bit integers
-        r = np.left_shift(pixels[0][:].astype(int), 16)
-        g = np.left_shift(pixels[1][:].astype(int), 8)
-        b = pixels[2][:].astype(int)
-        rgb = np.bitwise_or(np.bitwise_or(g, r), b)
-        # Update the pixels
-
-        for i in range(n_pixels):
-            self._strip.setPixelColor(i, int(rgb[i]))
+        if self._leds is not None:
+            # Write directly into the LED buffer of the library
+            rgb = self._leds[:n_pixels]
+        else:
+            if self._rgb is None or len(self._rgb) != n_pixels:
+                self._rgb = np.zeros(n_pixels, dtype=np.uint32)
+            rgb = self._rgb
+        if sys.byteorder == 'little':
+            # 0x00RRGGBB is stored as bytes B, G, R, 0
+            rgb.view(np.uint8).reshape(-1, 4)[:, 0:3] = pixels[2::-1, :n_pixels].T
+        else:
+            rgb[:] = pixels[0, :n_pixels]
+            rgb <<= 8
+            rgb |= pixels[1, :n_pixels]
+            rgb <<= 8
+            rgb |= pixels[2, :n_pixels]
+        if self._leds is None:
+            for i, color in enumerate(rgb.tolist()):
+                self._strip.setPixelColor(i, color)
         self._strip.show()
 
 
+class EmulatedPixelStrip(object):
+    """Pure-Python stand-in for rpi_ws281x.PixelStrip
+
+    Can be passed as strip_class to RaspberryPi for tests and benchmarks.
+    The packed 0x00RRGGBB values are stored in the numpy array leds.
+    """
+    def __init__(self, num, pin, freq_hz=800000, dma=10, invert=False, brightness=255, channel=0):
+        self.leds = np.zeros(num, dtype=np.uint32)
+        self.brightness = brightness
+        self.num_shows = 0
+
+    def begin(self):
+        pass
+
+    def show(self):
+        self.num_shows += 1
+
+    def setPixelColor(self, n, color):
+        self.leds[n] = color
+
+    def getPixelColor(self, n):
+        return int(self.leds[n])
+
+    def numPixels(self):
+        return len(self.leds)
+
+    def setBrightness(self, brightness):
+        self.brightness = brightness
+
+    def getBrightness(self):
+        return self.brightness
+
+    def _cleanup(self):
+        pass
+
+
 class DotStar(LEDController):
-    def __init__(self, num_pixels, num_rows=1, brightness=31):
-        super().__init__(num_pixels, num_rows)
+    def __init__(self, num_pixels, num_rows=1, brightness=31, gamma=False, white_balance=None):
+        super().__init__(num_pixels, num_rows, gamma=gamma, white_balance=white_balance)
         """Creates an APA102-based output device
 
         Parameters
@@ -347,7 +550,7 @@ class DotStar(LEDController):
         if pixels is None:
             pixels = np.zeros((3, self.num_pixels))
         bgr = [2, 1, 0]
-        self.led_data[0:, 1:4] = (pixels * self.getBrightness())[bgr].T.clip(0, 255)
+        self.led_data[0:, 1:4] = self.colorCorrect(pixels)[bgr].T
         self._strip.show()
 
 
@@ -494,46 +697,80 @@ class PanelWrapper(LEDController):
     def show(self, pixels):
         mapped_pixels = pixels
         if self.pixel_mapping is not None:
-            mapped_pixels = pixels[self.pixel_mapping[:, :, 0], self.pixel_mapping[:, :, 1]]
+            buffer = getattr(self, '_buffer', None)
+            shape = (pixels.shape[0], len(self.pixel_mapping))
+            if buffer is None or buffer.shape != shape or buffer.dtype != pixels.dtype:
+                buffer = self._buffer = np.empty(shape, dtype=pixels.dtype)
+            mapped_pixels = np.take(pixels, self.pixel_mapping, axis=1, out=buffer)
         self.device.show(mapped_pixels)
-    
+
     def setPixelMapping(self, mappingJson):
         if mappingJson:
             self.pixel_mapping = self._createPixelMapping(mappingJson)
-    
+
     def setDevice(self, device):
         self.device = device
 
+    @classmethod
+    def fromFile(cls, device, mappingFile):
+        """Creates a PanelWrapper from a mapping JSON file
+
+        The pixel mapping is cached as .npy file next to the JSON file.
+        """
+        wrapper = cls(device, None)
+        wrapper.pixel_mapping = loadPixelMapping(mappingFile)
+        return wrapper
+
     def _createPixelMapping(self, mappingJson):
-        def toIdx(row, col, num_cols):
-            return row * num_cols + col
-
-        num_rows = mappingJson['num_rows']
-        num_cols = mappingJson['num_cols']
-        mapping = np.zeros((3, num_rows * num_cols, 2), dtype=np.int64)
-
-        for substrip in mappingJson['substrips']:
-            start_index = substrip['start_index']
-            row = substrip['row']
-            col = substrip['col']
-            dir = substrip['dir']
-            num_pixels = substrip['num_pixels']
-            cur_row = row
-            cur_col = col
-            for i in range(num_pixels):
-                index = start_index + i
-                mapping[0, index, :] = [0, toIdx(cur_row, cur_col, num_cols)]
-                mapping[1, index, :] = [1, toIdx(cur_row, cur_col, num_cols)]
-                mapping[2, index, :] = [2, toIdx(cur_row, cur_col, num_cols)]
-                if dir == 'L':
-                    cur_col = cur_col - 1
-                elif dir == 'R':
-                    cur_col = cur_col + 1
-                elif dir == 'U':
-                    cur_row = cur_row - 1
-                else:
-                    cur_row = cur_row + 1
+        return createPixelMapping(mappingJson)
+
+
+def createPixelMapping(mappingJson):
+    """Creates the pixel mapping for a panel from its mapping JSON
+
+    Returns a flat int32 array of length num_rows * num_cols. The entry at index i
+    is the index of the panel pixel (row * num_cols + col) that is shown on LED i.
+    """
+    num_rows = mappingJson['num_rows']
+    num_cols = mappingJson['num_cols']
+    mapping = np.zeros(num_rows * num_cols, dtype=np.int32)
+    substrips = mappingJson['substrips']
+    if not substrips:
         return mapping
+    direction = {'L': (0, -1), 'R': (0, 1), 'U': (-1, 0)}
+    counts = np.array([s['num_pixels'] for s in substrips], dtype=np.int64)
+    steps = np.array([direction.get(s['dir'], (1, 0)) for s in substrips], dtype=np.int64)
+    # Offset of each LED within its substrip
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    index = np.repeat([s['start_index'] for s in substrips], counts) + offsets
+    rows = np.repeat([s['row'] for s in substrips], counts) + np.repeat(steps[:, 0], counts) * offsets
+    cols = np.repeat([s['col'] for s in substrips], counts) + np.repeat(steps[:, 1], counts) * offsets
+    mapping[index] = rows * num_cols + cols
+    return mapping
+
+
+def loadPixelMapping(mappingFile):
+    """Loads the pixel mapping for the given mapping JSON file
+
+    The mapping is cached in a .npy file next to the JSON file and rebuilt
+    if the JSON file is newer than the cache.
+    """
+    cacheFile = os.path.splitext(mappingFile)[0] + '.npy'
+    try:
+        if os.path.getmtime(cacheFile) >= os.path.getmtime(mappingFile):
+            mapping = np.load(cacheFile)
+            if mapping.dtype == np.int32 and mapping.ndim == 1:
+                return mapping
+    except (OSError, ValueError):
+        pass
+    with open(mappingFile, "r", encoding='utf-8') as f:
+        mapping = createPixelMapping(json.loads(f.read()))
+    try:
+        np.save(cacheFile, mapping)
+    except OSError as e:
+        logger.warning("Cannot write pixel mapping cache {}: {}".format(cacheFile, e))
+    return mapping
+
 
 class MultiOutputWrapper(object):
     def __init__(self, devices: List[LEDController]):
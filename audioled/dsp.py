@@ -1,10 +1,59 @@
 from __future__ import (absolute_import, division, print_function, unicode_literals)
 
+import functools
 import itertools
 import math
+import threading
+import weakref
+from collections import OrderedDict, deque, namedtuple
 
 import numpy as np
-from scipy.signal import butter, lfilter_zi, lfilter
+from scipy.signal import butter, lfilter_zi, lfilter, sosfilt, sosfilt_zi
+from scipy.sparse import csr_matrix
+from scipy.sparse import vstack as sparse_vstack
+
+
+class RingBuffer():
+    """Fixed size ring buffer with contiguous read views
+
+    Every item is stored twice in an array of double length, so the last `size` items
+    are always available as a single contiguous view. Writing a block costs O(block),
+    reading does not copy.
+    """
+    def __init__(self, size, shape=(), dtype=float, fill=0.):
+        self.size = size
+        self._data = np.empty((2 * size, ) + tuple(shape), dtype=dtype)
+        self._data[:] = fill
+        self._index = 0
+
+    def append(self, value):
+        """Appends a single item"""
+        self._data[self._index] = value
+        self._data[self._index + self.size] = value
+        self._index = (self._index + 1) % self.size
+
+    def extend(self, values):
+        """Appends a block of items, only the last `size` items are kept"""
+        values = values[-self.size:]
+        start = self._index
+        end = start + len(values)
+        if end <= self.size:
+            self._data[start:end] = values
+            self._data[start + self.size:end + self.size] = values
+        else:
+            split = self.size - start
+            self._data[start:self.size] = values[:split]
+            self._data[start + self.size:] = values[:split]
+            self._data[:end - self.size] = values[split:]
+            self._data[self.size:end] = values[split:]
+        self._index = end % self.size
+
+    def view(self):
+        """Returns the items from oldest to newest
+
+        The view is only valid until the next write and must not be modified.
+        """
+        return self._data[self._index:self._index + self.size]
 
 
 def rollwin(signal, n_overlaps):
@@ -13,22 +62,19 @@ def rollwin(signal, n_overlaps):
     """
     frame = next(signal)
     N = len(frame)
-    window = np.zeros(N * max(n_overlaps, 1))
-    window[-N:] = frame  # last N points
+    window = RingBuffer(N * max(n_overlaps, 1))
+    window.extend(frame)  # last N points
     for data in signal:
-        S = len(data)
-        window[:-S] = window[S:]
-        window[-S:] = data[:S]
-        yield window
+        window.extend(data)
+        yield window.view()
 
 
 def normalize_scale(signal, past_n):
-    buff = np.ones(past_n)
+    buff = RingBuffer(past_n, fill=1.)
     for data in signal:
-        buff[1:] = buff[:-1]
-        buff[0] = data
-        maxval = np.max(buff)
-        minval = np.min(buff)
+        buff.append(data)
+        maxval = np.max(buff.view())
+        minval = np.min(buff.view())
         if maxval != minval:
             yield (data - minval) / (maxval - minval)
         else:
@@ -38,24 +84,22 @@ def normalize_scale(signal, past_n):
 def fir(taps, signal):
     """Generator that applies FIR filter taps to the iterable signal"""
     init = np.array(list(itertools.islice(signal, len(taps) - 1)))
-    buff = np.tile(np.expand_dims(init[0], axis=-1), len(taps)).T
+    buff = RingBuffer(len(taps), shape=np.shape(init[0]), fill=init[0])
+    # Buffer is ordered from oldest to newest chunk
+    taps = np.asarray(taps)[::-1]
     # Consume the first N = (len(taps) - 1) values for initialization
-    for chunk in init:
-        buff = np.roll(buff, 1, axis=0)
-        buff[0] = chunk
+    buff.extend(init)
     # Yield the dot product of the buffer and taps (filtered result)
     for chunk in itertools.islice(signal, len(taps) - 1, None):
-        buff = np.roll(buff, 1, axis=0)
-        buff[0] = chunk
-        yield buff.T.dot(taps)
+        buff.append(chunk)
+        yield buff.view().T.dot(taps)
 
 
 def normalize_rms(signal, past_n):
-    buff = np.zeros(past_n)
+    buff = RingBuffer(past_n)
     for chunk in signal:
-        buff[1:] = buff[:-1]
-        buff[0] = np.sqrt(np.mean(np.square(chunk)))
-        yield chunk / np.max(buff)
+        buff.append(np.sqrt(np.mean(np.square(chunk))))
+        yield chunk / np.max(buff.view())
 
 
 def downsample(signal, fs, fmax):
@@ -125,7 +169,7 @@ def pad_zeros(signal):
     peek = next(signal)
     signal = itertools.chain([peek], signal)
     N = len(peek)
-    N_zeros = int(2**np.ceil(np.log2(N))) - N
+    N_zeros = fft_size(N) - N
     zeros = np.zeros(N_zeros)
     return (np.r_[chunk, zeros] for chunk in signal)
 
@@ -135,24 +179,111 @@ def preemphasis(signal, coeff=0.97):
     return np.append(signal[0], signal[1:] - coeff * signal[:-1])
 
 
-def memoize(function):
-    """Provides a decorator for memoizing functions"""
-    from functools import wraps
-    memo = {}
+CacheInfo = namedtuple('CacheInfo', ['hits', 'misses', 'maxsize', 'currsize'])
+
+# All memoized functions by module and qualified name, see cache_info()
+# Entries vanish with their function, e.g. functions memoized in tests
+_memoized = weakref.WeakValueDictionary()
+
 
-    @wraps(function)
+def memoize(function=None, maxsize=128):
+    """Provides a decorator for memoizing functions
+
+    Results are kept in a least recently used cache of at most maxsize entries.
+    Can be used as @memoize or @memoize(maxsize=...).
+    """
+    if function is None:
+        return functools.partial(memoize, maxsize=maxsize)
+    memo = OrderedDict()
+    stats = [0, 0]  # hits, misses
+    # Memoized functions are shared between threads, the function itself is called without holding the lock
+    lock = threading.Lock()
+
+    @functools.wraps(function)
     def wrapper(*args):
-        if args in memo:
-            return memo[args]
-        else:
-            rv = function(*args)
+        with lock:
+            if args in memo:
+                stats[0] += 1
+                memo.move_to_end(args)
+                return memo[args]
+            stats[1] += 1
+        rv = function(*args)
+        with lock:
             memo[args] = rv
-            return rv
-
+            if len(memo) > maxsize:
+                memo.popitem(last=False)
+        return rv
+
+    def info():
+        with lock:
+            return CacheInfo(stats[0], stats[1], maxsize, len(memo))
+
+    def clear():
+        with lock:
+            memo.clear()
+            stats[0] = stats[1] = 0
+
+    wrapper.cache_info = info
+    wrapper.cache_clear = clear
+    _memoized['{}.{}'.format(function.__module__, function.__qualname__)] = wrapper
     return wrapper
 
 
-@memoize
+def cache_info():
+    """Returns the CacheInfo of all memoized functions by module and qualified name"""
+    return OrderedDict((name, function.cache_info()) for name, function in list(_memoized.items()))
+
+
+@memoize(maxsize=32)
+def fft_size(n):
+    """Returns the next power of two greater or equal to n"""
+    return int(2**np.ceil(np.log2(n)))
+
+
+@memoize(maxsize=32)
+def hanning(n):
+    """Returns a cached, read-only hanning window of length n"""
+    window = np.hanning(n)
+    # Shared by all callers, an in-place change would corrupt every later FFT
+    window.flags.writeable = False
+    return window
+
+
+fft_backends = ['numpy', 'scipy']
+# FFT implementation used by rfft, see set_fft_backend
+_fft_backend = 'numpy'
+_fft_workers = None
+
+
+def set_fft_backend(backend='numpy', workers=None):
+    """Selects the FFT implementation
+
+    Parameters
+    ----------
+    backend: str
+        'numpy' or 'scipy' (scipy.fft)
+    workers: int, optional
+        Number of threads used by scipy.fft, defaults to a single thread
+    """
+    global _fft_backend, _fft_workers
+    if backend not in fft_backends:
+        raise ValueError("Unknown FFT backend {}, choose from {}".format(backend, fft_backends))
+    _fft_backend = backend
+    _fft_workers = workers
+
+
+def rfft(x, overwrite_x=False):
+    """Real FFT using the selected backend
+
+    With overwrite_x the scipy backend may use x as scratch space.
+    """
+    if _fft_backend == 'scipy':
+        import scipy.fft
+        return scipy.fft.rfft(x, overwrite_x=overwrite_x, workers=_fft_workers)
+    return np.fft.rfft(x)
+
+
+@memoize(maxsize=16)
 def filter_bank(n_filters, n_fft, fs, fmin_hz, fmax_hz, scale):
     """Returns an overlapping triangular filterbank"""
     if scale == 'mel':
@@ -180,23 +311,24 @@ def filter_bank(n_filters, n_fft, fs, fmin_hz, fmax_hz, scale):
     return filters, f_hz[1:-1]
 
 
+@memoize(maxsize=16)
+def sparse_filter_bank(n_filters, n_fft, fs, fmin_hz, fmax_hz, scale):
+    """Returns the triangular filterbank as sparse matrix (CSR)"""
+    filters, _ = filter_bank(n_filters, n_fft, fs, fmin_hz, fmax_hz, scale)
+    return csr_matrix(filters)
+
+
 def warped_psd(y, bins, fs, frange, scale):
     """Returns the power spectrum mapped to a perceptual scale"""
     N = len(y)
     # Transform to frequency domain
-    pow_spectrum = np.abs(np.fft.rfft(y))**2 * (2 / N)
+    pow_spectrum = np.abs(rfft(y))**2 * (2 / N)
     # Construct triangular filter bank
-    output, f = filter_bank(bins, N, fs, frange[0], frange[1], scale)
+    filters = sparse_filter_bank(bins, N, fs, frange[0], frange[1], scale)
     # Apply filter bank to power spectrum
-    # Remark: Numpy matrix multiplication uses all available CPU cores for a rather small matrix multiplication
-    # output_np = np.dot(pow_spectrum, output.T)
-
-    # Own MM:
-    pow_spectrum = pow_spectrum.reshape(1, -1)
-    output = np.sum(pow_spectrum[:, :, None]*output.T[None, :, :], axis=1)
-    output = output.reshape(-1)
-    # print(np.allclose(output, output_np))
-    return output
+    # Remark: Numpy matrix multiplication uses all available CPU cores for a rather small matrix multiplication,
+    # the sparse product is single-threaded and only touches the non-zero filter weights
+    return filters.dot(pow_spectrum)
 
 
 def preprocess(audio, fs, fmax, n_overlaps):
@@ -205,47 +337,225 @@ def preprocess(audio, fs, fmax, n_overlaps):
     # Create rolling window of last audio chunks
     audio = rollwin(audio, n_overlaps)
     # Construct hanning window to smooth audio at the edges
-    hanning_window = np.hanning(len(next(audio)))
-    # Apply hanning window
-    audio = (x * hanning_window for x in audio)
+    hanning_window = hanning(len(next(audio)))
     # Don't know what this should do but breaks processing if no audio input present...
     # audio = (x for x in audio if np.sqrt(np.mean(np.square(x))) > 1e-5)
-    audio = pad_zeros(audio)
+    # Apply hanning window and pad with zeros
+    audio = _window_and_pad(audio, hanning_window)
     return audio, fs
 
 
+def _window_and_pad(signal, window):
+    """Applies the window to each chunk and pads it with zeros to the FFT size
+
+    Yields the same buffer for every chunk.
+    """
+    N = len(window)
+    buff = np.zeros(fft_size(N))
+    for x in signal:
+        np.multiply(x, window, out=buff[:N])
+        yield buff
+
+
+@memoize(maxsize=16)
+def stacked_filter_bank(n_filters, n_fft, fs, franges, scale):
+    """Returns the filterbanks of all frequency ranges stacked into one sparse matrix (CSR)
+
+    Row i * n_filters + j is filter j of franges[i].
+    """
+    return sparse_vstack([sparse_filter_bank(n_filters, n_fft, fs, fmin, fmax, scale) for fmin, fmax in franges], format='csr')
+
+
+class SpectrumAnalyser():
+    """Warped power spectrum of the last audio chunks for several frequency ranges
+
+    Same result as preprocess followed by warped_psd for each range, but without generators:
+    The window, the FFT buffer and the filterbanks are preallocated and the power spectrum
+    is only computed once per chunk for all ranges.
+
+    Parameters
+    ----------
+    fs: int
+        Sampling rate of the audio chunks
+    fmax: float
+        Highest frequency of interest, the audio is downsampled if fs > 2 * fmax
+    n_overlaps: int
+        Number of chunks in the analysis window
+    bins: int
+        Number of filters per frequency range
+    franges: list
+        Frequency ranges [fmin, fmax] in Hz
+    """
+    def __init__(self, fs, fmax, n_overlaps, bins, franges, scale='bark'):
+        if fs < 2 * fmax:
+            raise ValueError('Sampling frequency fs must be at least 2 * fmax')
+        self.fs = fs
+        self.fmax = fmax
+        self.n_overlaps = n_overlaps
+        self.bins = bins
+        self.franges = tuple(tuple(r) for r in franges)
+        self.scale = scale
+        self._step = int(fs / (2 * fmax))
+        # Sampling rate after downsampling
+        self.fs_ds = fs if self._step == 1 else int(fs // self._step)
+        self._chunk_length = None
+
+    def matches(self, fs, fmax, n_overlaps, bins):
+        """True if the analyser was created for these parameters"""
+        return (self.fs, self.fmax, self.n_overlaps, self.bins) == (fs, fmax, n_overlaps, bins)
+
+    def _allocate(self, chunk_length):
+        self._chunk_length = chunk_length
+        N = len(range(0, chunk_length, self._step)) * max(self.n_overlaps, 1)
+        self._window = RingBuffer(N)
+        self._hanning = hanning(N)
+        self._buffer = np.zeros(fft_size(N))
+        self._filters = stacked_filter_bank(self.bins, len(self._buffer), self.fs_ds, self.franges, self.scale)
+
+    def process(self, chunk):
+        """Adds a chunk of audio, returns the warped power spectrum of shape (len(franges), bins)"""
+        if len(chunk) != self._chunk_length:
+            self._allocate(len(chunk))
+        self._window.extend(chunk[::self._step])
+        N = self._window.size
+        np.multiply(self._window.view(), self._hanning, out=self._buffer[:N])
+        pow_spectrum = np.abs(rfft(self._buffer))**2 * (2 / len(self._buffer))
+        return self._filters.dot(pow_spectrum).reshape(len(self.franges), self.bins)
+
+
+@memoize(maxsize=16)
+def smooth_upsample_matrix(n_in, n_out, n_smooth):
+    """Returns the (n_out, n_in) matrix of linear interpolation to n_out points followed by smoothing
+
+    Equivalent to np.convolve(np.interp(linspace(0, 1, n_out), linspace(0, 1, n_in), x), np.hamming(n_smooth), 'same').
+    Must not be modified.
+    """
+    x_out = np.linspace(0, 1, n_out)
+    x_in = np.linspace(0, 1, n_in)
+    window = np.hamming(n_smooth)
+    columns = [np.convolve(np.interp(x_out, x_in, unit), window, 'same') for unit in np.eye(n_in)]
+    return np.array(columns).T
+
+
 def rms(normalized_sample_points):
-    N = len(normalized_sample_points)
-    sum_squares = sum(s**2 for s in normalized_sample_points)
+    samples = np.asarray(normalized_sample_points, dtype=float)
+    N = len(samples)
+    sum_squares = np.dot(samples, samples)
     # TODO: Why N/2???
     return math.sqrt(sum_squares / (N / 2))
 
 
-def design_filter(lowcut, highcut, fs, order=3):
+class EnvelopeFollower():
+    """RMS and maximum of the last `size` values, updated in O(1)
+
+    Keeps a running sum of squares and a monotonic deque for the maximum.
+    rms() uses the same normalization as dsp.rms.
+    """
+    def __init__(self, size=1):
+        self.size = max(int(size), 1)
+        self._values = deque()
+        self._maxima = deque()  # (index, value), values decreasing
+        self._index = 0
+        self._sum_squares = 0.
+
+    def setSize(self, size):
+        """Changes the number of values, keeping the newest ones"""
+        size = max(int(size), 1)
+        if size == self.size:
+            return
+        values = list(self._values)[-size:]
+        self.__init__(size)
+        for value in values:
+            self.update(value)
+
+    def update(self, value):
+        if len(self._values) == self.size:
+            old = self._values.popleft()
+            self._sum_squares -= old * old
+        self._values.append(value)
+        self._sum_squares += value * value
+        while self._maxima and self._maxima[-1][1] <= value:
+            self._maxima.pop()
+        self._maxima.append((self._index, value))
+        while self._maxima[0][0] <= self._index - self.size:
+            self._maxima.popleft()
+        self._index += 1
+        if self._index % self.size == 0:
+            # Avoid drift of the running sum
+            self._sum_squares = sum(v * v for v in self._values)
+
+    def rms(self):
+        if not self._values:
+            return 0.
+        return math.sqrt(max(self._sum_squares, 0.) / (len(self._values) / 2))
+
+    def max(self):
+        return self._maxima[0][1] if self._maxima else 0.
+
+
+def hold_size(hold):
+    """Number of values kept for a hold limit of the effects (at most `hold` old values plus the current one)"""
+    return int(math.floor(max(hold, 0))) + 1
+
+
+def _normalized_band(lowcut, highcut, fs):
     nyq = 0.5 * fs
     lowcut = max(lowcut, 10)
     highcut = min(highcut, 22000)
-    low = lowcut / nyq
-    high = highcut / nyq
-    b, a = butter(order, [low, high], btype='band')
+    return lowcut / nyq, highcut / nyq
+
+
+@memoize(maxsize=256)
+def design_filter(lowcut, highcut, fs, order=3):
+    """Returns transfer function coefficients and initial state of a butterworth band-pass
+
+    Designs are cached, the returned arrays must not be modified.
+    """
+    b, a = butter(order, _normalized_band(lowcut, highcut, fs), btype='band')
     return b, a, lfilter_zi(b, a)
 
 
+@memoize(maxsize=256)
+def design_sos_filter(lowcut, highcut, fs, order=3):
+    """Returns second-order sections and initial state of a butterworth band-pass
+
+    Designs are cached, the returned arrays must not be modified.
+    """
+    sos = butter(order, _normalized_band(lowcut, highcut, fs), btype='band', output='sos')
+    return sos, sosfilt_zi(sos)
+
+
 class Bandpass():
-    def __init__(self, lowcut, highcut, fs, order=3):
+    """Butterworth band-pass filter with persistent state
+
+    Parameters
+    ----------
+    output: str, optional
+        Filter representation, 'sos' (second-order sections, default) or 'ba' (transfer function).
+        Second-order sections stay stable for narrow low bands and higher orders.
+    """
+    def __init__(self, lowcut, highcut, fs, order=3, output='sos'):
+        if output not in ('sos', 'ba'):
+            raise ValueError("Unknown filter output {}".format(output))
         self._fs = fs
         self._filter_a = None
         self._filter_b = None
+        self._filter_sos = None
         self._filter_zi = None
         self._lowcut = lowcut
         self._highcut = highcut
         self._order = order
+        self._output = output
         self._initFilter()
 
     def filter(self, audio, fs):
         if fs != self._fs:
+            self._fs = fs
             self._initFilter()
-        y, self._filter_zi = lfilter(b=self._filter_b, a=self._filter_a, x=audio, zi=self._filter_zi)
+        if self._output == 'sos':
+            y, self._filter_zi = sosfilt(self._filter_sos, audio, zi=self._filter_zi)
+        else:
+            y, self._filter_zi = lfilter(b=self._filter_b, a=self._filter_a, x=audio, zi=self._filter_zi)
         return y
 
     def updateParams(self, lowcut, highcut, fs, order):
@@ -257,4 +567,249 @@ class Bandpass():
             self._initFilter()
 
     def _initFilter(self):
-        self._filter_b, self._filter_a, self._filter_zi = design_filter(self._lowcut, self._highcut, self._fs, self._order)
+        if self._output == 'sos':
+            self._filter_sos, zi = design_sos_filter(self._lowcut, self._highcut, self._fs, self._order)
+            self._filter_zi = zi.copy()
+        else:
+            self._filter_b, self._filter_a, self._filter_zi = design_filter(self._lowcut, self._highcut, self._fs, self._order)
+
+
+class BandpassBank():
+    """Set of band-pass filters applied to the same audio signal
+
+    Each band is a butterworth filter in second-order sections with its own persistent state.
+    Bands are identified by (lowcut, highcut, order), so requesting the same band twice
+    shares the filter.
+    """
+    def __init__(self, fs):
+        self.fs = fs
+        self._bands = OrderedDict()
+
+    def hasBand(self, lowcut, highcut, order=3):
+        return (lowcut, highcut, order) in self._bands
+
+    def addBand(self, lowcut, highcut, order=3):
+        key = (lowcut, highcut, order)
+        if key not in self._bands:
+            sos, zi = design_sos_filter(lowcut, highcut, self.fs, order)
+            self._bands[key] = [sos, zi.copy()]
+        return key
+
+    def resetBand(self, lowcut, highcut, order=3):
+        """Adds the band or restores the initial state of its filter"""
+        self.removeBand(lowcut, highcut, order)
+        return self.addBand(lowcut, highcut, order)
+
+    def removeBand(self, lowcut, highcut, order=3):
+        self._bands.pop((lowcut, highcut, order), None)
+
+    def bands(self):
+        return list(self._bands.keys())
+
+    def filter(self, audio, fs, bands=None):
+        """Filters the audio with the given bands (default: all bands)
+
+        Returns an array of shape (len(bands), len(audio)).
+        """
+        if fs != self.fs:
+            self.fs = fs
+            for key in self._bands:
+                sos, zi = design_sos_filter(key[0], key[1], fs, key[2])
+                self._bands[key] = [sos, zi.copy()]
+        if bands is None:
+            bands = self.bands()
+        output = np.empty((len(bands), len(audio)))
+        for i, key in enumerate(bands):
+            band = self._bands[key]
+            output[i], band[1] = sosfilt(band[0], audio, zi=band[1])
+        return output
+
+
+BeatState = namedtuple('BeatState', ['onset', 'bpm', 'phase', 'beat'])
+BeatState.__doc__ = """Result of the BeatTracker
+
+onset: onset strength of the last chunk, normalized to 0..1
+bpm: estimated tempo in beats per minute
+phase: position within the current beat, 0..1 (0 is on the beat)
+beat: True if a beat occurred in the last chunk
+"""
+
+
+def advance_beat(state, seconds, chunk_duration):
+    """Predicts the BeatState `seconds` ahead by running the phase with the tempo
+
+    beat is True if the predicted phase crossed a beat within the last chunk_duration seconds.
+    """
+    if state is None or not state.bpm or seconds <= 0:
+        return state
+    beatsPerSecond = state.bpm / 60.
+    phase = (state.phase + seconds * beatsPerSecond) % 1.
+    return state._replace(phase=phase, beat=phase < chunk_duration * beatsPerSecond)
+
+
+class BeatTracker():
+    """Onset detection and tempo estimation on consecutive audio chunks
+
+    Onsets are detected by spectral flux of the log-compressed magnitude spectrum.
+    The tempo is the strongest period of the autocorrelation of the onset envelope
+    within [min_bpm, max_bpm]. A beat phase runs with the tempo and is pulled towards
+    the average phase of strong onsets.
+    """
+    def __init__(self, history=6.0, min_bpm=60., max_bpm=180., tempo_interval=0.5):
+        self.history = history
+        self.min_bpm = min_bpm
+        self.max_bpm = max_bpm
+        self.tempo_interval = tempo_interval
+        self.reset()
+
+    def reset(self):
+        self._chunk_length = None
+        self._chunk_rate = None
+        self._last_spectrum = None
+        self._envelope = None
+        self._max_flux = 1e-9
+        self._chunks_since_tempo = 0
+        self.bpm = 120.
+        self.phase = 0.
+        self.onset = 0.
+        self._onset_phase = 0j
+
+    def _init(self, chunk_length, fs):
+        self._chunk_length = chunk_length
+        self._chunk_rate = fs / chunk_length
+        self._last_spectrum = None
+        self._envelope = RingBuffer(max(int(self.history * self._chunk_rate), 2))
+        self._chunks_since_tempo = 0
+
+    def process(self, audio, fs):
+        """Processes the next chunk of mono audio and returns the BeatState"""
+        if self._chunk_length != len(audio) or self._chunk_rate != fs / len(audio):
+            self._init(len(audio), fs)
+        spectrum = np.log1p(100. * np.abs(rfft(audio * hanning(len(audio)))))
+        if self._last_spectrum is None:
+            self._last_spectrum = spectrum
+        flux = np.sum(np.maximum(spectrum - self._last_spectrum, 0.))
+        self._last_spectrum = spectrum
+        self._envelope.append(flux)
+        # Normalize onset strength by a slowly decaying maximum
+        self._max_flux = max(flux, self._max_flux * (1. - 1. / (self.history * self._chunk_rate)))
+        self.onset = flux / self._max_flux
+        # Update tempo estimate
+        self._chunks_since_tempo += 1
+        if self._chunks_since_tempo >= self.tempo_interval * self._chunk_rate:
+            self._chunks_since_tempo = 0
+            self.bpm = self._estimateTempo()
+        # Advance beat phase and pull towards strong onsets
+        self.phase += self.bpm / 60. / self._chunk_rate
+        beat = self.phase >= 1.
+        self.phase = math.fmod(self.phase, 1.)
+        if self.onset > 0.5:
+            # Circular mean of the phase of strong onsets, corrected towards 0
+            self._onset_phase = 0.7 * self._onset_phase + self.onset * np.exp(2j * np.pi * self.phase)
+            correction = 0.3 * np.angle(self._onset_phase) / (2 * np.pi)
+            self._onset_phase *= np.exp(-2j * np.pi * correction)
+            self.phase = math.fmod(self.phase - correction + 1., 1.)
+        return BeatState(self.onset, self.bpm, self.phase, beat)
+
+    def _estimateTempo(self):
+        envelope = self._envelope.view()
+        envelope = envelope - np.mean(envelope)
+        n = len(envelope)
+        spectrum = np.fft.rfft(envelope, 2 * n)
+        autocorrelation = np.fft.irfft(spectrum * np.conj(spectrum))[:n]
+        min_lag = max(int(math.floor(60. / self.max_bpm * self._chunk_rate)), 1)
+        max_lag = min(int(math.ceil(60. / self.min_bpm * self._chunk_rate)), n - 1)
+        if max_lag <= min_lag or autocorrelation[0] <= 0:
+            return self.bpm
+        lag = min_lag + int(np.argmax(autocorrelation[min_lag:max_lag + 1]))
+        return 60. * self._chunk_rate / lag
+
+
+@memoize(maxsize=16)
+def _band_matrix(n, fs, edges):
+    """Returns the (bands, bins) matrix summing the rfft bins of each band"""
+    f = np.fft.rfftfreq(n, 1. / fs)
+    return np.array([(f >= low) & (f < high) for low, high in zip(edges[:-1], edges[1:])], dtype=float)
+
+
+class BandGains():
+    """Applies a gain to each frequency band of a signal
+
+    The signal is split with a BandpassBank and the bands are summed with their gains.
+    Filtering is done in the time domain with persistent state, so consecutive chunks
+    join without discontinuities.
+
+    Parameters
+    ----------
+    edges: list
+        Frequency edges of the bands in Hz, bands above the nyquist frequency are dropped
+    fs: int
+        Sample rate
+    """
+    def __init__(self, edges, fs, order=3):
+        self.edges = tuple(edges)
+        self.order = order
+        self._initBands(fs)
+
+    def _initBands(self, fs):
+        self.fs = fs
+        self._bank = BandpassBank(fs)
+        self._bands = []
+        highest = 0.45 * fs
+        for i, (low, high) in enumerate(zip(self.edges[:-1], self.edges[1:])):
+            if low < highest:
+                self._bands.append((i, self._bank.addBand(low, min(high, highest), self.order)))
+
+    def process(self, audio, fs, gains):
+        """Filters the next chunk and returns the sum of the bands scaled by gains (one per band)"""
+        if fs != self.fs:
+            self._initBands(fs)
+        gains = np.asarray(gains)[[i for i, _ in self._bands]]
+        return gains.dot(self._bank.filter(audio, fs, [key for _, key in self._bands]))
+
+
+class MultibandAGC():
+    """Automatic gain control per channel and frequency band
+
+    Tracks the RMS level of each band of each channel with an attack/release envelope and
+    returns the gains bringing each band to the target level.
+
+    Parameters
+    ----------
+    edges: list, optional
+        Frequency edges of the bands in Hz
+    attack: float, optional
+        Time constant in seconds for rising levels
+    release: float, optional
+        Time constant in seconds for falling levels
+    max_gain: float, optional
+        Maximum gain of a band
+    target: float, optional
+        Target RMS level of each band
+    """
+    default_edges = [20., 250., 2000., 20000.]
+
+    def __init__(self, edges=None, attack=0.05, release=10., max_gain=10., target=0.25):
+        self.edges = tuple(edges if edges is not None else self.default_edges)
+        self.attack = attack
+        self.release = release
+        self.max_gain = max_gain
+        self.target = target
+        self._envelope = None
+
+    def numBands(self):
+        return len(self.edges) - 1
+
+    def process(self, audio, fs):
+        """Processes the next chunk of shape (channels, samples) and returns the gains of shape (channels, bands)"""
+        audio = np.atleast_2d(audio)
+        n = audio.shape[-1]
+        power = np.abs(np.fft.rfft(audio, axis=-1))**2
+        levels = np.sqrt(2. * power.dot(_band_matrix(n, fs, self.edges).T)) / n
+        if self._envelope is None or self._envelope.shape != levels.shape:
+            self._envelope = levels
+        else:
+            dt = n / fs
+            coeff = np.where(levels > self._envelope, math.exp(-dt / self.attack), math.exp(-dt / self.release))
+            self._envelope = coeff * self._envelope + (1. - coeff) * levels
+        return np.clip(self.target / np.maximum(self._envelope, 1e-9), 0., self.max_gain)
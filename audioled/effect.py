@@ -1,4 +1,6 @@
 import inspect
+import numpy as np
+from audioled import dsp
 import logging
 logger = logging.getLogger(__name__)
 
@@ -9,10 +11,97 @@ class PixelBuffer(object):
 
 
 class AudioBuffer(object):
+    """Audio samples of a single channel
+
+    Analysis results (RMS, peak, spectrum, band-passed signal) are computed on first
+    request and memoised until new audio is assigned, so effects reading the same
+    buffer share the work.
+    Returned arrays are shared between effects and must not be modified.
+    """
+    # Band filters not requested for this number of frames are discarded
+    band_filter_timeout = 100
+
     def __init__(self, sample_rate):
         super().__init__()
-        self.audio = None
+        self._audio = None
         self.sample_rate = sample_rate
+        self._frame = 0
+        self._analysis = {}
+        self._bandpassBank = None
+        self._bandsLastUsed = {}
+
+    @property
+    def audio(self):
+        return self._audio
+
+    @audio.setter
+    def audio(self, value):
+        self._audio = value
+        self._frame += 1
+        self._analysis = {}
+        for key in [k for k, frame in self._bandsLastUsed.items() if self._frame - frame > self.band_filter_timeout]:
+            del self._bandsLastUsed[key]
+            self._bandpassBank.removeBand(*key)
+
+    def preset(self, **analysis):
+        """Provides analysis results of the current audio computed elsewhere, e.g. rms and peak"""
+        self._analysis.update(analysis)
+
+    def _memoise(self, key, function):
+        try:
+            return self._analysis[key]
+        except KeyError:
+            value = self._analysis[key] = function()
+            return value
+
+    def rms(self):
+        return self._memoise('rms', lambda: dsp.rms(self._audio))
+
+    def peak(self):
+        return self._memoise('peak', lambda: np.max(self._audio))
+
+    def fft(self):
+        return self._memoise('fft', lambda: _readOnly(np.fft.rfft(self._audio)))
+
+    def powerSpectrum(self):
+        return self._memoise('powerSpectrum', lambda: _readOnly(np.abs(self.fft())**2 * (2 / len(self._audio))))
+
+    def bandpass(self, lowcut, highcut, order=3):
+        """Returns the audio filtered by a band-pass
+
+        Filter state is kept with the buffer, so all effects using the same band share one filter.
+        """
+        return self._memoise(('bandpass', lowcut, highcut, order), lambda: self._filterBand(lowcut, highcut, order))
+
+    def bandPeak(self, lowcut, highcut, order=3):
+        return self._memoise(('bandPeak', lowcut, highcut, order), lambda: np.max(self.bandpass(lowcut, highcut, order)))
+
+    def bandRms(self, lowcut, highcut, order=3):
+        return self._memoise(('bandRms', lowcut, highcut, order), lambda: dsp.rms(self.bandpass(lowcut, highcut, order)))
+
+    def _filterBand(self, lowcut, highcut, order):
+        if self._bandpassBank is None:
+            self._bandpassBank = dsp.BandpassBank(self.sample_rate)
+        audio = np.asarray(self._audio)
+        if 'bands' not in self._analysis:
+            # Filter all bands used in the last frame at once
+            bands = [k for k, frame in self._bandsLastUsed.items() if frame == self._frame - 1]
+            for key, y in zip(bands, self._bandpassBank.filter(audio, self.sample_rate, bands)):
+                self._analysis[('bandpass', ) + key] = _readOnly(y)
+            self._analysis['bands'] = bands
+        key = (lowcut, highcut, order)
+        self._bandsLastUsed[key] = self._frame
+        y = self._analysis.get(('bandpass', ) + key)
+        if y is None:
+            # Not filtered in the last frame, the state of a band that skipped frames does not fit this audio
+            self._bandpassBank.resetBand(*key)
+            y = _readOnly(self._bandpassBank.filter(audio, self.sample_rate, [key])[0])
+        return y
+
+
+def _readOnly(array):
+    array.flags.writeable = False
+    return array
 
 
 class Effect(object):
@@ -150,8 +239,9 @@ class Effect(object):
     def setParameterOffset(self, paramId, paramDefinition, offset):
         state = self.__dict__.copy()
         # Get min and max range of parameter from parameterDefinition
-        paramDef = paramDefinition['parameters'][paramId]
-        if len(paramDef) != 4:
+        paramDef = paramDefinition['parameters'].get(paramId)
+        # Modulations of saved projects may target parameters that were removed
+        if paramDef is None or len(paramDef) != 4:
             return
         minP = paramDef[1]
         maxP = paramDef[2]
@@ -6,6 +6,7 @@ import numpy as np
 import scipy as sp
 import math
 
+import audioled.blobs as blobs
 import audioled.colors as colors
 from audioled.effect import Effect
 
@@ -641,7 +642,7 @@ class Swing(Effect):
         pixels = self._inputBuffer[0]
         config = self.displacement * math.sin(self._t * self.swingspeed)
 
-        self._outputBuffer[0] = sp.ndimage.interpolation.shift(pixels, [0, config], mode='wrap', prefilter=True)
+        self._outputBuffer[0] = blobs.shift(pixels, config)
 
 
 class Flipping(Effect):
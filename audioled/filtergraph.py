@@ -10,6 +10,7 @@ from audioled import modulation
 from audioled import devices
 from audioled import effect
 from audioled import colors
+from audioled import dsp
 
 logger = logging.getLogger(__name__)
 
@@ -359,6 +360,12 @@ class FilterGraph(Updateable):
             logger.info("{0:30s}: min {1:1.8f}, max {2:1.8f}, avg {3:1.8f}".format(
                 str(key.effect)[0:30], val._min, val._max, val._avg))
 
+    def printCacheInfo(self):
+        logger.info("DSP caches:")
+        for key, val in dsp.cache_info().items():
+            logger.info("{0:40s}: hits {1}, misses {2}, size {3}/{4}".format(key[-40:], val.hits, val.misses, val.currsize,
+                                                                             val.maxsize))
+
     def addEffectNode(self, effectToAdd: effect.Effect):
         """Adds a filter node to the graph
 
@@ -9,7 +9,9 @@ import numpy as np
 import scipy as sp
 from scipy import signal as signal
 
+import audioled.blobs as blobs
 from audioled.effect import Effect
+from audioled.particles import Particles
 
 from PIL import Image, ImageOps
 
@@ -195,7 +197,7 @@ class SwimmingPool(Effect):
         _WaveArraySpecHeight = np.random.rand(num_waves)
         for i in range(0, num_waves):
             _WaveArray.append(self._createWave(_wavespread[i], _WaveArraySpecHeight[i], _WaveArraySpecSpeed[i]))
-        return _WaveArray, _WaveArraySpecSpeed
+        return np.array(_WaveArray), _WaveArraySpecSpeed
 
     def numInputChannels(self):
         return 1
@@ -246,22 +248,16 @@ class SwimmingPool(Effect):
         else:
             color = self._inputBuffer[0]
 
-        all_waves = np.zeros(self._num_pixels)
-        for i in range(0, int(self.num_waves)):
-            fact = 1.0
-            if i == 0:
-                fact = (self._rotate_counter / 30)
-            if i == self.num_waves - 1:
-                fact = (1.0 - self._rotate_counter / 30)
-            if i < len(self._Wave) and i < len(self._WaveSpecSpeed):
-                
-                step = sp.ndimage.interpolation.shift(
-                    self._Wave[i],
-                    self._t * self._WaveSpecSpeed[i],
-                    mode='wrap',
-                    prefilter=True) * self.scale * fact
-                # step = np.roll(self._Wave[i], int(self._t * self._WaveSpecSpeed[i]), axis=0) * self.scale * fact
-                all_waves += step
+        num_waves = min(int(self.num_waves), len(self._Wave), len(self._WaveSpecSpeed))
+        # Fade in the newest and fade out the oldest wave
+        fact = np.ones(num_waves)
+        if num_waves > 0:
+            fact[0] = self._rotate_counter / 30
+        if int(self.num_waves) - 1 < num_waves:
+            fact[int(self.num_waves) - 1] = 1.0 - self._rotate_counter / 30
+        # Move all waves at once
+        waves = blobs.shift(self._Wave[:num_waves], self._t * self._WaveSpecSpeed[:num_waves])
+        all_waves = fact.dot(waves) * self.scale
 
         self._outputBuffer[0] = np.multiply(color, all_waves).clip(0, 255.0)
 
@@ -588,9 +584,7 @@ class FallingStars(Effect):
 
     def __initstate__(self):
         # state
-        self._t0Array = []
-        self._spawnArray = []
-        self._starCounter = 0
+        self._stars = Particles(100)
         self._spawnflag = True
         self._lastSpawn = 0
         super(FallingStars, self).__initstate__()
@@ -629,33 +623,14 @@ class FallingStars(Effect):
     def numOutputChannels(self):
         return 1
 
-    def spawnStar(self):
-        self._starCounter += 1
-        self._t0Array.append(self._t)
-        self._spawnArray.append(random.randint(0, self._num_pixels - self.thickness))
-        if self._starCounter > 100:
-            self._starCounter -= 1
-            self._t0Array.pop(0)
-            self._spawnArray.pop(0)
-
-    def allStars(self, t, dim_speed, thickness, t0, spawnSpot):
-        controlArray = []
-        for i in range(0, self._starCounter):
-            oneStarArray = np.zeros(self._num_pixels)
-            for j in range(0, thickness):
-                if i < len(spawnSpot):
-                    index = spawnSpot[i] + j
-                    if index < self._num_pixels:
-                        oneStarArray[index] = math.exp(-(100 / dim_speed) * (self._t - t0[i]))
-            controlArray.append(oneStarArray)
-        return controlArray
+    def spawnStars(self, prob):
+        spawns = sum(1 for _ in range(int(self.max_spawns)) if random.random() <= prob)
+        maxSpot = max(self._num_pixels - int(self.thickness), 0)
+        self._stars.spawn(self._t, [random.randint(0, maxSpot) for _ in range(spawns)])
 
     def starControl(self, prob):
-        for _ in range(int(self.max_spawns)):
-            if random.random() <= prob:
-                self.spawnStar()
-        outputArray = self.allStars(self._t, self.dim_speed, self.thickness, self._t0Array, self._spawnArray)
-        return np.sum(outputArray, axis=0)
+        self.spawnStars(prob)
+        return self._stars.render(self._num_pixels, self._stars.decay(self._t, self.dim_speed), self.thickness)
 
     async def update(self, dt):
         await super().update(dt)
@@ -740,26 +715,11 @@ class Pendulum(Effect):
         }
         return help
 
-    def createBlob(self, spread_rel, location_rel):
-        blobArray = np.zeros(self._num_pixels)
-        spread = max(int(spread_rel * self._num_pixels), 1)
-        location = int(location_rel * self._num_pixels)
-        for i in range(-spread, spread + 1):
-            if (location + i) >= 0 and (location + i) < self._num_pixels:
-                blobArray[location + i] = math.cos((math.pi / spread) * i)
-        return blobArray.clip(0.0, 255.0)
-
-    def moveBlob(self, blobArray, displacement_rel, swingspeed):
-        displacement = displacement_rel * self._num_pixels
-        outputArray = sp.ndimage.interpolation.shift(blobArray,
-                                                     displacement * math.sin(self._t * swingspeed),
-                                                     mode='wrap',
-                                                     prefilter=True)
-        return outputArray
-
     def controlBlobs(self):
-        output = self.moveBlob(self.createBlob(self.spread, self.location), self.displacement, self.swingspeed)
-        return output
+        spread = max(int(self.spread * self._num_pixels), 1)
+        displacement = self.displacement * self._num_pixels * math.sin(self._t * self.swingspeed)
+        location = int(self.location * self._num_pixels) + displacement
+        return blobs.render(self._num_pixels, location, spread / 2, wrap=True)
 
     def numInputChannels(self):
         return 1
@@ -832,23 +792,14 @@ class RandomPendulums(Effect):
         }
         return help
 
-    def createBlob(self, spread_rel, location_rel):
-        blobArray = np.zeros(self._num_pixels)
-        spread = max(int(spread_rel * self._num_pixels), 1)
-        location = int(location_rel * self._num_pixels)
-        for i in range(-spread, spread + 1):
-            if (location + i) >= 0 and (location + i) < self._num_pixels:
-                blobArray[location + i] = math.cos((math.pi / spread) * i)
-        return blobArray.clip(0.0, 255.0)
-
-    def moveBlob(self, blobArray, displacement_rel, offset_rel, swingspeed):
-        config = displacement_rel * self._num_pixels * math.sin((self._t * swingspeed) + offset_rel * self._num_pixels)
-        outputArray = sp.ndimage.interpolation.shift(blobArray, config, mode='wrap', prefilter=True)
-        return outputArray.clip(0.0, 255.0)
-
-    def controlBlobs(self, spread_rel, location_rel, displacement_rel, offset_rel, swingspeed):
-        output = self.moveBlob(self.createBlob(spread_rel, location_rel), displacement_rel, offset_rel, swingspeed)
-        return output
+    def controlBlobs(self):
+        spread = np.maximum((self._spread * self._num_pixels).astype(int), 1)
+        phase = self._t * self._swingspeed + self._offset * self._num_pixels
+        displacement = self._displacement * self._num_pixels * np.sin(phase)
+        location = (self._location * self._num_pixels).astype(int) + displacement
+        lightconfig = np.where(self._lightflip, -1.0, 1.0) * np.cos(2 * self._t + self._offset)
+        brightness = self.dim * np.where(self._heightactivator, lightconfig, 1.0)
+        return blobs.render(self._num_pixels, location, spread / 2, brightness, wrap=True)
 
     def numInputChannels(self):
         return 1
@@ -861,22 +812,15 @@ class RandomPendulums(Effect):
         if self._num_pixels is None:
             return
         if len(self._spread) == 0 or len(self._spread) != self.num_pendulums:
-            self._spread = []
-            self._location = []
-            self._displacement = []
-            self._heightactivator = []
-            self._lightflip = []
-            self._offset = []
-            self._swingspeed = []
+            pendulums = []
             for _ in range(self.num_pendulums):
                 rSpread = int(random.randint(2, 10) / 300 * self._num_pixels)
-                self._spread.append(rSpread / 300)
-                self._location.append(random.randint(0, self._num_pixels - rSpread - 1) / 300)
-                self._displacement.append(random.randint(5, 50) / 300)
-                self._heightactivator.append(random.choice([True, False]))
-                self._lightflip.append(random.choice([True, False]))
-                self._offset.append(random.uniform(0, 6.5) / 300)
-                self._swingspeed.append(random.uniform(0, 1))
+                pendulums.append((rSpread / 300, random.randint(0, self._num_pixels - rSpread - 1) / 300,
+                                  random.randint(5, 50) / 300, random.choice([True, False]), random.choice([True, False]),
+                                  random.uniform(0, 6.5) / 300, random.uniform(0, 1)))
+            # One array per property to move all pendulums at once
+            (self._spread, self._location, self._displacement, self._heightactivator, self._lightflip, self._offset,
+             self._swingspeed) = (np.array(p) for p in zip(*pendulums))
 
     def process(self):
         if self._inputBuffer is None or self._outputBuffer is None:
@@ -887,21 +831,7 @@ class RandomPendulums(Effect):
             # default: all white
             color = np.ones(self._num_pixels) * np.array([[255.0], [255.0], [255.0]])
 
-        self._output = np.zeros(self._num_pixels) * np.array([[0.0], [0.0], [0.0]])
-        for i in range(self.num_pendulums):
-            if self._heightactivator[i] is True:
-                if self._lightflip[i] is True:
-                    lightconfig = -1.0
-                else:
-                    lightconfig = 1.0
-                configArray = lightconfig * self.dim * math.cos(2 * self._t + self._offset[i]) * np.array([[1.0], [1.0], [1.0]
-                                                                                                           ])
-            else:
-                configArray = np.array([[1.0 * self.dim], [1.0 * self.dim], [1.0 * self.dim]])
-            self._output += np.multiply(
-                color,
-                self.controlBlobs(self._spread[i], self._location[i], self._displacement[i], self._offset[i],
-                                  self._swingspeed[i]) * configArray)
+        self._output = np.multiply(color, self.controlBlobs())
         self._outputBuffer[0] = self._output.clip(0.0, 255.0)
 
 
@@ -947,16 +877,10 @@ class StaticBlob(Effect):
         return help
 
     def createBlob(self, spread_rel, location_rel):
-        blobArray = np.zeros(self._num_pixels)
-
         # convert relative to absolute values
         spread = max(int(spread_rel * self._num_pixels), 1)
         location = int(location_rel * self._num_pixels)
-        for i in range(-spread, spread + 1):
-            # make sure we are in bounds of array
-            if (location + i) >= 0 and (location + i) < self._num_pixels:
-                blobArray[location + i] = math.cos((math.pi / spread) * i)
-        return blobArray.clip(0.0, 255.0)
+        return blobs.render(self._num_pixels, location, spread / 2)
 
     def numInputChannels(self):
         return 1
@@ -322,3 +322,63 @@ class SineLFO(ModulationSource):
 
     def getValue(self):
         return self.depth * math.sin(self._t * self.freqHz)
+
+
+class AudioBeat(ModulationSource):
+    """Modulation from the global beat tracker
+
+    The beat tracker runs once per audio frame on the global audio input, see audio.GlobalAudio.analyse.
+    """
+    beatOutputs = ['pulse', 'phase', 'onset']
+
+    def __init__(self, depth=1.0, output='pulse'):
+        self.depth = depth
+        self.output = output
+
+    @staticmethod
+    def getParameterDefinition():
+        definition = {
+            "parameters":
+            OrderedDict([
+                # default, min, max, stepsize
+                ("depth", [1.0, .0, 1.0, .001]),
+                ("output", AudioBeat.beatOutputs),
+            ])
+        }
+        return definition
+
+    @staticmethod
+    def getParameterHelp():
+        help = {
+            "parameters": {
+                "depth": "Depth of the modulation.",
+                "output": "pulse: Decaying pulse on every beat.\n"
+                "phase: Position within the current beat, rising from 0 to 1.\n"
+                "onset: Onset strength of the audio.",
+            }
+        }
+        return help
+
+    @staticmethod
+    def getEffectDescription():
+        return "Modulation synchronized to the beat of the global audio input."
+
+    def getParameter(self):
+        definition = super().getParameter()
+        definition['parameters']['output'] = [self.output] + [x for x in self.beatOutputs if x != self.output]
+        return definition
+
+    def getValue(self, param=None):
+        # Lazy import, audio depends on the audio backend
+        import audioled.audio
+        beat = audioled.audio.GlobalAudio.beat
+        if beat is None:
+            return 0.
+        output = param if param in self.beatOutputs else self.output
+        if output == 'phase':
+            value = beat.phase
+        elif output == 'onset':
+            value = min(beat.onset, 1.)
+        else:
+            value = max(0., 1. - 4. * beat.phase)
+        return self.depth * value
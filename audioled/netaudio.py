@@ -0,0 +1,313 @@
+"""Audio over UDP
+
+A sender streams raw PCM chunks, NetworkAudio receives them and feeds GlobalAudio like a local audio device.
+
+Packet layout (network byte order header, little endian samples):
+
+    sequence number    uint32
+    sample rate        uint32
+    channels           uint16
+    sample format      uint16  (FORMAT_FLOAT32 or FORMAT_INT16)
+    frames             uint32
+    capture delay      uint32  (microseconds from capture to sending)
+    interleaved samples
+
+The capture delay lets the receiver date chunks back to their capture without synchronised clocks.
+"""
+from __future__ import (absolute_import, division, print_function, unicode_literals)
+
+import argparse
+import socket
+import struct
+import threading
+import time
+
+import numpy as np
+
+from audioled.audio import GlobalAudio, loadAudioFile
+
+import logging
+logger = logging.getLogger(__name__)
+
+DEFAULT_PORT = 5005
+FORMAT_FLOAT32 = 0
+FORMAT_INT16 = 1
+HEADER = struct.Struct('!IIHHII')
+# Maximum UDP payload, keep chunks small to avoid IP fragmentation
+MAX_PACKET_SIZE = 65507
+# Shortest socket timeout in seconds while waiting for packets
+MIN_TIMEOUT = 1e-3
+
+_dtypes = {FORMAT_FLOAT32: np.dtype('<f4'), FORMAT_INT16: np.dtype('<i2')}
+
+
+def encodePacket(sequence, sample_rate, chunk, sample_format=FORMAT_FLOAT32, delay=0.):
+    """Encodes a chunk of shape (channels, frames) in range [-1, 1] captured delay seconds ago"""
+    channels, frames = chunk.shape
+    if sample_format == FORMAT_INT16:
+        samples = np.clip(chunk.T * 32767, -32768, 32767).astype(_dtypes[FORMAT_INT16])
+    else:
+        samples = chunk.T.astype(_dtypes[FORMAT_FLOAT32])
+    delay = min(max(int(round(delay * 1e6)), 0), 0xFFFFFFFF)
+    return HEADER.pack(sequence & 0xFFFFFFFF, sample_rate, channels, sample_format, frames, delay) + samples.tobytes()
+
+
+def decodePacket(data):
+    """Decodes a packet, returns (sequence, sample_rate, chunk of shape (channels, frames) as float32, delay in seconds)
+
+    Raises ValueError for malformed packets.
+    """
+    if len(data) < HEADER.size:
+        raise ValueError("Packet too short")
+    sequence, sample_rate, channels, sample_format, frames, delay = HEADER.unpack_from(data)
+    if sample_format not in _dtypes:
+        raise ValueError("Unknown sample format {}".format(sample_format))
+    dtype = _dtypes[sample_format]
+    if channels == 0 or len(data) - HEADER.size != channels * frames * dtype.itemsize:
+        raise ValueError("Packet size does not match header")
+    samples = np.frombuffer(data, dtype=dtype, offset=HEADER.size).reshape(frames, channels).T
+    if sample_format == FORMAT_INT16:
+        chunk = samples.astype(np.float32) / 32768
+    else:
+        chunk = samples.astype(np.float32)
+    return sequence, sample_rate, chunk, delay * 1e-6
+
+
+class JitterBuffer(object):
+    """Reorders packets by sequence number and delays playout by `depth` packets
+
+    Lost packets are replaced by silence, late packets are dropped.
+    If more than `max_depth` packets are buffered, the oldest are skipped to bound the latency.
+    """
+    def __init__(self, depth=2, max_depth=8):
+        self.depth = depth
+        self.max_depth = max(max_depth, depth)
+        self.reset()
+
+    def reset(self):
+        self._packets = {}
+        self._next = None
+        self._started = False
+        self.lost = 0
+        self.late = 0
+        self.skipped = 0
+
+    def __len__(self):
+        return len(self._packets)
+
+    def put(self, sequence, chunk):
+        if self._next is None:
+            self._next = sequence
+        elif _seqDiff(sequence, self._next) < 0:
+            if self._started:
+                self.late += 1
+                return
+            # Reordered while buffering
+            self._next = sequence
+        self._packets[sequence] = chunk
+        # Bound latency
+        while len(self._packets) > self.max_depth:
+            newest = max(self._packets, key=lambda s: _seqDiff(s, self._next))
+            oldest = (newest - self.max_depth + 1) & 0xFFFFFFFF
+            self.skipped += _seqDiff(oldest, self._next)
+            for s in list(self._packets):
+                if _seqDiff(s, oldest) < 0:
+                    del self._packets[s]
+            self._next = oldest
+
+    def get(self):
+        """Returns the next chunk, None while buffering or when the packet was lost"""
+        if not self._started:
+            if len(self._packets) < self.depth:
+                return None
+            self._started = True
+        if not self._packets:
+            # Underrun, buffer again
+            self._started = False
+            return None
+        chunk = self._packets.pop(self._next, None)
+        if chunk is None:
+            self.lost += 1
+        self._next = (self._next + 1) & 0xFFFFFFFF
+        return chunk
+
+
+def _seqDiff(a, b):
+    """Signed difference a - b of 32 bit sequence numbers"""
+    return ((a - b + 0x80000000) & 0xFFFFFFFF) - 0x80000000
+
+
+class NetworkAudio(GlobalAudio):
+    """Receives audio from a NetworkAudioSender and feeds it to GlobalAudio
+
+    Chunks are published in the rate they were sent, delayed by the jitter buffer.
+    Lost packets are published as silence.
+    Chunks are timestamped with their capture time from the receive time and the capture delay of the sender,
+    so the latency compensation of the outputs includes the remote capture and the jitter buffer.
+    """
+    def __init__(self, port=DEFAULT_PORT, host='0.0.0.0', num_channels=None, jitter=2, max_latency=8):
+        GlobalAudio.device_index = None
+        self._ring = None
+        self._ring_index = 0
+        self.num_channels = num_channels
+        self.jitter = JitterBuffer(jitter, max_latency)
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._socket.bind((host, port))
+        self.port = self._socket.getsockname()[1]
+        self._stop = threading.Event()
+        self._format = None
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        logger.info("Receiving audio on UDP port {}".format(self.port))
+
+    def _run(self):
+        nextTime = None
+        while not self._stop.is_set():
+            if not self._receivePacket(nextTime):
+                return
+            if self._format is not None:
+                nextTime = self._playout(nextTime)
+
+    def _receivePacket(self, nextTime):
+        """Receives a packet until the next chunk is due, returns False once stopped"""
+        # A timeout of 0 would switch the socket to non-blocking mode
+        timeout = 0.5 if nextTime is None else max(MIN_TIMEOUT, nextTime - time.perf_counter())
+        try:
+            self._socket.settimeout(timeout)
+            self._receive(self._socket.recv(MAX_PACKET_SIZE))
+        except socket.timeout:
+            pass
+        except ValueError as e:
+            logger.debug("Dropping packet: {}".format(e))
+        except OSError as e:
+            if self._stop.is_set():
+                return False
+            # Keep receiving, e.g. after ICMP errors or interrupted calls
+            logger.warning("Error receiving audio: {}".format(e))
+            self._stop.wait(MIN_TIMEOUT)
+        return True
+
+    def _playout(self, nextTime):
+        """Publishes the next chunk of the jitter buffer when due, returns the time of the following chunk"""
+        sample_rate, channels, frames = self._format
+        period = frames / sample_rate
+        now = time.perf_counter()
+        if nextTime is None:
+            nextTime = now
+        if now < nextTime:
+            return nextTime
+        packet = self.jitter.get()
+        if packet is None:
+            # Buffering or lost packet
+            chunk, timestamp = np.zeros((channels, frames), dtype=np.float32), None
+        else:
+            chunk, timestamp = packet
+        self._push_chunk(chunk[:self.num_channels] if self.num_channels else chunk, timestamp)
+        nextTime += period
+        if nextTime < now - period:
+            # Fell behind, e.g. after buffering
+            nextTime = now + period
+        return nextTime
+
+    def _receive(self, data):
+        sequence, sample_rate, chunk, delay = decodePacket(data)
+        # Network transit time is unknown and not included
+        timestamp = time.monotonic() - delay
+        fmt = (sample_rate, chunk.shape[0], chunk.shape[1])
+        if fmt != self._format:
+            logger.info("Network audio stream: fs: {}, channels: {}, chunk_length: {}".format(*fmt))
+            self._format = fmt
+            self.jitter.reset()
+            GlobalAudio.sample_rate = sample_rate
+            GlobalAudio.chunk_rate = sample_rate / chunk.shape[1]
+        self.jitter.put(sequence, (chunk, timestamp))
+
+    def stop(self):
+        self._stop.set()
+        self._socket.close()
+        self._thread.join()
+
+
+class NetworkAudioSender(object):
+    """Sends chunks of audio to a NetworkAudio receiver"""
+    def __init__(self, host='127.0.0.1', port=DEFAULT_PORT, sample_format=FORMAT_FLOAT32):
+        self.address = (host, port)
+        self.sample_format = sample_format
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._sequence = 0
+
+    def send(self, chunk, sample_rate, timestamp=None):
+        """Sends a chunk of shape (channels, frames)
+
+        timestamp is the time.monotonic() of the capture of the chunk, defaults to now.
+        Packets carry the delay since the capture, clocks of sender and receiver need not be synchronised.
+        """
+        delay = 0. if timestamp is None else time.monotonic() - timestamp
+        self._socket.sendto(encodePacket(self._sequence, sample_rate, chunk, self.sample_format, delay), self.address)
+        self._sequence = (self._sequence + 1) & 0xFFFFFFFF
+
+    def sendFile(self, path, chunk_rate=60, sample_rate=None, loop=True):
+        """Streams an audio file in real time"""
+        samples, sample_rate = loadAudioFile(path, sample_rate)
+        chunk_length = int(sample_rate // chunk_rate)
+        period = chunk_length / sample_rate
+        nextTime = time.perf_counter()
+        position = 0
+        while True:
+            if position + chunk_length > samples.shape[1]:
+                if not loop:
+                    return
+                position = 0
+            self.send(samples[:, position:position + chunk_length], sample_rate)
+            position += chunk_length
+            nextTime += period
+            time.sleep(max(0., nextTime - time.perf_counter()))
+
+    def sendDevice(self, device_index=None, chunk_rate=60, num_channels=None):
+        """Streams a local audio device, blocks until interrupted"""
+        DeviceSender(self, device_index, chunk_rate, num_channels)
+        while True:
+            time.sleep(1)
+
+    def close(self):
+        self._socket.close()
+
+
+class DeviceSender(GlobalAudio):
+    """Local audio device whose chunks are sent by a NetworkAudioSender instead of being published"""
+    def __init__(self, sender, device_index=None, chunk_rate=60, num_channels=None):
+        self.sender = sender
+        super().__init__(device_index, chunk_rate, num_channels)
+
+    def _push_chunk(self, chunk, timestamp=None):
+        if GlobalAudio.sample_rate is not None:
+            self.sender.send(chunk, GlobalAudio.sample_rate, timestamp)
+
+
+def createParser():
+    parser = argparse.ArgumentParser(description='Send audio to a MOLECOLE server over UDP')
+    parser.add_argument('--host', dest='host', default='127.0.0.1', help='Receiver address (default: 127.0.0.1)')
+    parser.add_argument('--port', dest='port', type=int, default=DEFAULT_PORT, help='Receiver port')
+    parser.add_argument('--audio_file', dest='audio_file', default=None, help='Send a WAV, FLAC or .npy file')
+    parser.add_argument('--audio_sample_rate', dest='audio_sample_rate', type=int, default=None, help='Sample rate of .npy')
+    parser.add_argument('-A', '--audio_device_index', dest='audio_device_index', type=int, default=None, help='Audio device')
+    parser.add_argument('--num_channels', dest='num_channels', type=int, default=None, help='Number of channels to send')
+    parser.add_argument('--chunk_rate', dest='chunk_rate', type=int, default=60, help='Packets per second (default: 60)')
+    parser.add_argument('--int16', dest='int16', action='store_true', default=False, help='Send 16 bit samples')
+    return parser
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    args = createParser().parse_args()
+    sender = NetworkAudioSender(args.host, args.port, FORMAT_INT16 if args.int16 else FORMAT_FLOAT32)
+    try:
+        if args.audio_file is not None:
+            sender.sendFile(args.audio_file, args.chunk_rate, args.audio_sample_rate)
+        else:
+            sender.sendDevice(args.audio_device_index, args.chunk_rate, args.num_channels)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sender.close()
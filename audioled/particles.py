@@ -0,0 +1,54 @@
+from __future__ import (absolute_import, division, print_function, unicode_literals)
+
+import numpy as np
+
+
+class Particles():
+    """Fixed capacity particle system stored as struct of arrays
+
+    Every particle has a spawn time, a pixel position and a peak value.
+    When the capacity is reached the oldest particles are replaced.
+    """
+    def __init__(self, capacity=100):
+        self.capacity = capacity
+        self.t0 = np.zeros(capacity)
+        self.position = np.zeros(capacity, dtype=int)
+        self.peak = np.zeros(capacity)
+        self._count = 0
+        self._next = 0
+
+    def __len__(self):
+        return self._count
+
+    def clear(self):
+        self._count = 0
+        self._next = 0
+
+    def spawn(self, t0, positions, peak=1.):
+        """Spawns one particle at each of the positions"""
+        positions = np.asarray(positions, dtype=int)[-self.capacity:]
+        n = len(positions)
+        if n == 0:
+            return
+        idx = (self._next + np.arange(n)) % self.capacity
+        self.t0[idx] = t0
+        self.position[idx] = positions
+        self.peak[idx] = peak
+        self._next = (self._next + n) % self.capacity
+        self._count = min(self._count + n, self.capacity)
+
+    def decay(self, t, dim_speed):
+        """Returns the exponential decay exp(-(100 / dim_speed) * age) of all particles"""
+        return np.exp(-(100 / dim_speed) * (t - self.t0[:self._count]))
+
+    def render(self, num_pixels, values, thickness=1):
+        """Adds the values of all particles to the pixels they cover
+
+        Each particle covers `thickness` pixels starting at its position.
+        Overlapping particles are summed, pixels outside the strip are dropped.
+        """
+        thickness = max(int(thickness), 1)
+        index = (self.position[:self._count, np.newaxis] + np.arange(thickness)).ravel()
+        weights = np.repeat(values, thickness)
+        valid = (index >= 0) & (index < num_pixels)
+        return np.bincount(index[valid], weights=weights[valid], minlength=num_pixels)[:num_pixels]
@@ -1,4 +1,5 @@
 import asyncio
+import collections
 
 from audioled.filtergraph import (FilterGraph, Updateable)
 from typing import List, Dict
@@ -10,6 +11,7 @@ import multiprocessing as mp
 import traceback
 import ctypes
 import logging
+import queue
 import threading
 import signal
 
@@ -93,13 +95,33 @@ class PublishQueue(object):
 
 
 class UpdateMessage:
-    def __init__(self, dt, audioBuffer, chunkRate, globalAutogainEnabled, globalAutogainMaxGain, globalAutogainTime):
+    def __init__(self,
+                 dt,
+                 audioBuffer,
+                 chunkRate,
+                 globalAutogainEnabled,
+                 globalAutogainMaxGain,
+                 globalAutogainTime,
+                 beat=None,
+                 bandGains=None,
+                 buses=None,
+                 busRms=None,
+                 busPeak=None,
+                 captureTime=None,
+                 sampleRate=None):
         self.dt = dt
         self.audioBuffer = audioBuffer
         self.chunkRate = chunkRate
         self.globalAutogainEnabled = globalAutogainEnabled
         self.globalAutogainMaxGain = globalAutogainMaxGain
         self.globalAutogainTime = globalAutogainTime
+        self.beat = beat
+        self.bandGains = bandGains
+        self.buses = buses
+        self.busRms = busRms
+        self.busPeak = busPeak
+        self.captureTime = captureTime
+        self.sampleRate = sampleRate
 
 
 class BrightnessMessage:
@@ -108,8 +130,10 @@ class BrightnessMessage:
 
 
 class ShowMessage:
-    def __init(self):
-        pass
+    def __init__(self, captureTime=None, showTime=None):
+        # time.monotonic() of the audio capture and the earliest time to show the frame
+        self.captureTime = captureTime
+        self.showTime = showTime
 
 
 class ReplaceFiltergraphMessage:
@@ -191,9 +215,16 @@ def worker_process_updateMessage(filtergraph: FilterGraph, outputDevice: audiole
     # TODO: Hack to propagate audio?
     audioled.audio.GlobalAudio.buffer = audioBuffer
     audioled.audio.GlobalAudio.chunk_rate = message.chunkRate
+    audioled.audio.GlobalAudio.sample_rate = message.sampleRate
     audioled.audio.GlobalAudio.global_autogain_enabled = message.globalAutogainEnabled
     audioled.audio.GlobalAudio.global_autogain_maxgain = message.globalAutogainMaxGain
     audioled.audio.GlobalAudio.global_autogain_time = message.globalAutogainTime
+    audioled.audio.GlobalAudio.beat = message.beat
+    audioled.audio.GlobalAudio.band_gains = message.bandGains
+    audioled.audio.GlobalAudio.buses = message.buses
+    audioled.audio.GlobalAudio.bus_rms = message.busRms
+    audioled.audio.GlobalAudio.bus_peak = message.busPeak
+    audioled.audio.GlobalAudio.capture_time = message.captureTime
 
     # Update Filtergraph
     filtergraph.update(dt, event_loop)
@@ -277,6 +308,12 @@ def worker_process_connectionMessage(filtergraph: FilterGraph, outputDevice: aud
         filtergraph.removeConnection(message.conUid)
 
 
+def worker_process_checkIsProcessing(filtergraph: FilterGraph):
+    logger.info("process {} responding".format(os.getpid()))
+    if filtergraph.recordTimings:
+        filtergraph.printCacheInfo()
+
+
 def worker(q: PublishQueue, filtergraph: FilterGraph, outputDevice: audioled.devices.LEDController, deviceId: int,
            slotId: int):
     """Worker process for specific filtergraph for outputDevice
@@ -320,7 +357,7 @@ def worker(q: PublishQueue, filtergraph: FilterGraph, outputDevice: audioled.dev
                         logger.debug("Device mask match for device {}".format(deviceId))
                         filtergraph.updateModulationSourceValue(message.controller, message.newValue)
                 elif isinstance(message, str) and message == "check_is_processing":
-                    logger.info("process {} responding".format(os.getpid()))
+                    worker_process_checkIsProcessing(filtergraph)
                 else:
                     logger.warning("Message not supported: {}".format(message))
             except audioled.filtergraph.NodeException:
@@ -345,20 +382,88 @@ def worker(q: PublishQueue, filtergraph: FilterGraph, outputDevice: audioled.dev
         logger.info("filtergraph process interrupted")
 
 
-def output(q, outputDevice: audioled.devices.LEDController, virtualDevice: audioled.devices.VirtualOutput):
+class FrameDelay(object):
+    """Holds copies of frames until they are due
+
+    Frames are kept in order of arrival as (dueTime, captureTime, frame), at most maxlen frames.
+    """
+    def __init__(self, maxlen=256):
+        self._frames = collections.deque(maxlen=maxlen)
+
+    def __len__(self):
+        return len(self._frames)
+
+    def put(self, dueTime, captureTime, frame):
+        self._frames.append((dueTime, captureTime, frame))
+
+    def timeout(self):
+        """Seconds until the next frame is due, None without frames"""
+        if not self._frames:
+            return None
+        return max(0., self._frames[0][0] - time.monotonic())
+
+    def popDue(self):
+        """Returns (captureTime, frame) of the newest due frame or None, older due frames are skipped"""
+        due = None
+        now = time.monotonic()
+        while self._frames and self._frames[0][0] <= now:
+            due = self._frames.popleft()
+        return None if due is None else due[1:]
+
+
+def _receiveOutputMessage(message, outputDevice, virtualDevice, delayed):
+    if isinstance(message, ShowMessage):
+        # Copy now, the shared array is overwritten by the next update while the frame is delayed
+        frame = np.ctypeslib.as_array(virtualDevice._shared_array.get_obj()).reshape(3, -1).copy()
+        if message.showTime is None:
+            dueTime = time.monotonic()
+        else:
+            dueTime = message.showTime - outputDevice.getLatency()
+        delayed.put(dueTime, message.captureTime, frame)
+    elif isinstance(message, BrightnessMessage):
+        bm = message  # type: BrightnessMessage
+        outputDevice.setBrightness(bm.value)
+
+
+def _showDueFrame(outputDevice, delayed, latency):
+    due = delayed.popDue()
+    if due is None:
+        return
+    captureTime, frame = due
+    outputDevice.show(frame)
+    if latency is not None and captureTime is not None:
+        measured = time.monotonic() - captureTime + outputDevice.getLatency()
+        latency.value = measured if latency.value <= 0 else 0.9 * latency.value + 0.1 * measured
+
+
+def output(q, outputDevice: audioled.devices.LEDController, virtualDevice: audioled.devices.VirtualOutput, latency=None):
+    """Output process for outputDevice
+
+    Shows frames at ShowMessage.showTime minus the device latency. Frames are copied when the ShowMessage
+    arrives and delayed inside the output process, the show queue is not blocked by the delay.
+    The latency between audio capture and light output is smoothed into the shared value latency.
+    """
     try:
         # Ignore sigint, needs to be handled inside parent and process must be joined
         signal.signal(signal.SIGINT, signal.SIG_IGN)
         threading.current_thread().name = 'OutputThread'
         logger.info("output process {} start".format(os.getpid()))
-        for message in iter(q.get, None):
-            if isinstance(message, ShowMessage):
-                npArray = np.ctypeslib.as_array(virtualDevice._shared_array.get_obj()).reshape(3, -1)
-                outputDevice.show(npArray.reshape(3, -1, order='C'))
-            elif isinstance(message, BrightnessMessage):
-                bm = message  # type: BrightnessMessage
-                outputDevice.setBrightness(bm.value)
-            q.task_done()
+        delayed = FrameDelay()
+        while True:
+            try:
+                message = q.get(timeout=delayed.timeout())
+            except queue.Empty:
+                message = False
+            if message is None:
+                break
+            if message is not False:
+                _receiveOutputMessage(message, outputDevice, virtualDevice, delayed)
+                q.task_done()
+            _showDueFrame(outputDevice, delayed, latency)
+        # Show the frames still delayed
+        while len(delayed):
+            time.sleep(delayed.timeout())
+            _showDueFrame(outputDevice, delayed, latency)
         outputDevice.shutdown()
         logger.error("output process {} exit".format(os.getpid()))
     except Exception as e:
@@ -369,6 +474,9 @@ def output(q, outputDevice: audioled.devices.LEDController, virtualDevice: audio
 
 
 class Project(Updateable):
+    # Seconds between audio capture and light output all devices are delayed to, 0 shows frames immediately
+    target_latency = 0.
+
     def __init__(self, name='Empty project', description='', device=None):
         self.slots = [None for i in range(127)]
         self.activeSceneId = 0
@@ -415,6 +523,7 @@ class Project(Updateable):
         self._filterGraphForDeviceIndex = {}
         self._filtergraphProcesses = {}
         self._outputProcesses = {}
+        self._latencies = {}
         self._publishQueue = PublishQueue()
         self._showQueue = PublishQueue()
         self._lock = mp.Lock()
@@ -493,7 +602,7 @@ class Project(Updateable):
                     # logger.debug("Updating preview device")
                     self._updatePreviewDevice(dt, event_loop)
                     self._last_t = self._cur_t
-                # Wait for previous show command done
+                # Wait until the previous frame is copied by the output processes, its delay runs there
                 if self._showQueue is not None:
                     self._showQueue.join(1)
                 # Wait for all updates
@@ -646,6 +755,7 @@ class Project(Updateable):
             finally:
                 self._filtergraphProcesses = {}
                 self._outputProcesses = {}
+                self._latencies = {}
                 self._publishQueue = None
                 self._showQueue = None
                 self._processingEnabled = True
@@ -677,6 +787,7 @@ class Project(Updateable):
                 p.join()
             logger.debug("Output processes joined")
             self._outputProcesses = {}
+            self._latencies = {}
             logger.debug('All processes joined')
         finally:
             logger.debug("stopped processing - releasing lock")
@@ -684,6 +795,10 @@ class Project(Updateable):
             self._processingEnabled = True
         self._isActive = False
 
+    def getLatencies(self):
+        """Returns the measured latency between audio capture and light output in seconds per output device"""
+        return {str(device): latency.value for device, latency in self._latencies.items() if latency.value > 0}
+
     def previewSlot(self, slotId):
         """
         Returns non-threadsafe access to filtergraph for slot with eventing enabled
@@ -726,6 +841,13 @@ class Project(Updateable):
         fg._onConnectionRemoved = self._handleConnectionRemoved
         return fg
 
+    def setContentRoot(self, path):
+        """Sets the directory assets of the project are loaded from, e.g. gifs"""
+        self._contentRoot = path
+        for slot in self.slots:
+            if slot is not None:
+                slot.setContentRoot(path)
+
     def getSlot(self, slotId):
         if self.slots[slotId] is None:
             logger.info("Initializing slot {}".format(slotId))
@@ -734,6 +856,13 @@ class Project(Updateable):
         fg.setContentRoot(self._contentRoot)
         return fg
 
+    def getSceneFiltergraph(self, sceneId, dIdx=0):
+        """Returns the filtergraph shown on device dIdx in scene sceneId"""
+        slotId = self._getSlotForDevice(dIdx, sceneId)
+        if slotId is None:
+            raise KeyError("No slot for device {} in scene {}".format(dIdx, sceneId))
+        return self.getSlot(slotId)
+
     def getSceneMatrix(self):
         # SlotMatrix contains dict mapping deviceId to slot for scene
         # e.g. "0": {"1": 12} mapping slot 12 to device 0 of scene 1
@@ -933,7 +1062,8 @@ class Project(Updateable):
             outSuccessful = False
             while not outSuccessful:
                 q = self._showQueue.register()
-                p = mp.Process(target=output, args=(q, outputDevice, virtualDevice))
+                latency = mp.Value(ctypes.c_double, 0.)
+                p = mp.Process(target=output, args=(q, outputDevice, virtualDevice, latency))
                 p.start()
                 # Make sure process starts
                 q.put(BrightnessMessage(self.getBrightnessActiveScene()))
@@ -950,6 +1080,7 @@ class Project(Updateable):
                     q.put("first")
                 sleepfact = 2. * sleepfact
             self._outputProcesses[outputDevice] = p
+            self._latencies[outputDevice] = latency
             logger.info("Started output process for device {}".format(outputDevice))
 
     def _sendBrightnessCommand(self, value):
@@ -1060,21 +1191,36 @@ class Project(Updateable):
         if self._publishQueue is None:
             logger.info("No publish queue. Possibly exiting")
             return
+        # Shared analysis is done once here, workers get the results
+        audioled.audio.GlobalAudio.analyse()
+        # Workers read the buses once the analysis ran, the raw chunk is not pickled in addition
+        audioBuffer = audioled.audio.GlobalAudio.buffer if audioled.audio.GlobalAudio.buses is None else None
         self._publishQueue.publish(
             UpdateMessage(
                 dt,
-                audioled.audio.GlobalAudio.buffer,
+                audioBuffer,
                 audioled.audio.GlobalAudio.chunk_rate,
                 audioled.audio.GlobalAudio.global_autogain_enabled,
                 audioled.audio.GlobalAudio.global_autogain_maxgain,
                 audioled.audio.GlobalAudio.global_autogain_time,
+                audioled.audio.GlobalAudio.beat,
+                audioled.audio.GlobalAudio.band_gains,
+                audioled.audio.GlobalAudio.buses,
+                audioled.audio.GlobalAudio.bus_rms,
+                audioled.audio.GlobalAudio.bus_peak,
+                audioled.audio.GlobalAudio.capture_time,
+                audioled.audio.GlobalAudio.sample_rate,
             ))
 
     def _sendShowCommand(self):
         if self._showQueue is None:
             logger.info("No show queue. Possibly exiting")
             return
-        self._showQueue.publish(ShowMessage())
+        captureTime = audioled.audio.GlobalAudio.capture_time
+        showTime = None
+        if captureTime is not None and self.target_latency > 0:
+            showTime = captureTime + self.target_latency
+        self._showQueue.publish(ShowMessage(captureTime, showTime))
 
     def _sendReplaceFiltergraphCommand(self, dIdx, slotId, filtergraph):
         if self._publishQueue is not None:
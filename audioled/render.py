@@ -0,0 +1,90 @@
+from __future__ import (absolute_import, division, print_function, unicode_literals)
+
+import asyncio
+import math
+import os
+from timeit import default_timer as timer
+
+import jsonpickle
+import numpy as np
+
+from audioled import audio
+from audioled.filtergraph import FilterGraph
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+def loadFiltergraph(path, sceneId=0, deviceIndex=0):
+    """Loads a filtergraph from a project or filtergraph JSON file
+
+    For projects the filtergraph shown on deviceIndex in scene sceneId is used.
+    Returns the filtergraph and the brightness of the scene.
+    """
+    with open(path, "r", encoding='utf-8') as f:
+        content = jsonpickle.decode(f.read())
+    contentRoot = os.path.dirname(os.path.abspath(path))
+    if isinstance(content, FilterGraph):
+        content.setContentRoot(contentRoot)
+        return content, 1.
+    content.setContentRoot(contentRoot)
+    fg = content.getSceneFiltergraph(sceneId, deviceIndex)
+    return fg, content.getSceneMetadata(sceneId).get('brightness', 1.)
+
+
+def numFrames(audioSource):
+    """Number of frames needed to render the whole audio source"""
+    return int(math.ceil(audioSource.samples.shape[1] / audioSource.chunk_length))
+
+
+def render(filtergraph, out, dt, audioSource=None, brightness=1., event_loop=None):
+    """Renders len(out) frames of the filtergraph into out
+
+    Parameters
+    ----------
+    filtergraph: FilterGraph
+        Filtergraph with num_pixels already propagated.
+    out: array (frames, 3, num_pixels)
+        uint8 array receiving the frames, e.g. a memory-mapped .npy file.
+    dt: float
+        Fixed time step between frames.
+    audioSource: audio.FileAudio, optional
+        Non real-time audio source, stepped once per frame.
+
+    Returns the time spent rendering in seconds.
+    """
+    if event_loop is None:
+        event_loop = asyncio.new_event_loop()
+    start = timer()
+    for i in range(len(out)):
+        if audioSource is not None:
+            audioSource.step()
+            audio.GlobalAudio.analyse()
+        filtergraph.update(dt, event_loop)
+        filtergraph.process()
+        output = filtergraph.getLEDOutput()
+        if output is None or output._outputBuffer[0] is None:
+            out[i] = 0
+            continue
+        pixels = output._outputBuffer[0]
+        if brightness != 1.:
+            pixels = pixels * brightness
+        np.clip(pixels, 0, 255, out=out[i], casting='unsafe')
+    return timer() - start
+
+
+def writeGif(frames, path, fps, num_rows=1, scale=4, step=1):
+    """Writes frames (frames, 3, num_pixels) as animated GIF preview
+
+    Each frame is shown as num_rows rows of pixels, scaled up by scale.
+    Only every step-th frame is written.
+    """
+    from PIL import Image
+    images = []
+    for frame in frames[::step]:
+        rgb = np.asarray(frame, dtype=np.uint8).reshape(3, num_rows, -1).transpose(1, 2, 0)
+        rgb = np.repeat(np.repeat(rgb, scale, axis=0), scale, axis=1)
+        images.append(Image.fromarray(np.ascontiguousarray(rgb), 'RGB'))
+    if not images:
+        return
+    images[0].save(path, save_all=True, append_images=images[1:], duration=int(1000 * step / fps), loop=0)
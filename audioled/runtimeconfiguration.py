@@ -1,5 +1,5 @@
 import argparse
-from audioled import serverconfiguration
+from audioled import dsp, scheduler, serverconfiguration
 
 
 def commonRuntimeArgumentParser():
@@ -40,6 +40,35 @@ def commonRuntimeArgumentParser():
                         type=int,
                         default=None,
                         help='Audio device index to use')
+    parser.add_argument('--audio_file',
+                        dest='audio_file',
+                        default=None,
+                        help='Stream audio from a WAV, FLAC or .npy file instead of an audio device')
+    parser.add_argument('--audio_file_fast',
+                        dest='audio_file_fast',
+                        action='store_true',
+                        default=None,
+                        help='Read the audio file as fast as frames are rendered instead of in real time')
+    parser.add_argument('--audio_sample_rate',
+                        dest='audio_sample_rate',
+                        type=int,
+                        default=None,
+                        help='Sample rate of .npy audio files')
+    parser.add_argument('--audio_udp_port',
+                        dest='audio_udp_port',
+                        type=int,
+                        default=None,
+                        help='Receive audio over UDP on this port instead of an audio device, see audioled.netaudio')
+    parser.add_argument('--fft_backend',
+                        dest='fft_backend',
+                        default='numpy',
+                        choices=dsp.fft_backends,
+                        help='FFT implementation to use (default: numpy), compare with benchmark.py fft')
+    parser.add_argument('--fft_workers',
+                        dest='fft_workers',
+                        type=int,
+                        default=None,
+                        help='Number of threads for the scipy FFT backend (default: 1)')
 
     return parser
 
@@ -91,6 +120,16 @@ def addServerRuntimeArguments(parser: argparse.ArgumentParser):
                         action='store_true',
                         default=False,
                         help='Print process timing')
+    parser.add_argument('--frame_timing',
+                        dest='frame_timing',
+                        default='audio',
+                        choices=scheduler.frame_timings,
+                        help='Render a frame per audio chunk or with a fixed rate (default: audio)')
+    parser.add_argument('--frame_rate',
+                        dest='frame_rate',
+                        type=float,
+                        default=60.,
+                        help='Frames per second for clock timing and without audio (default: 60)')
     parser.add_argument(
         '--strand',
         dest='strand',
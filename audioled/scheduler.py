@@ -0,0 +1,85 @@
+from __future__ import (absolute_import, division, print_function, unicode_literals)
+
+import threading
+import traceback
+from timeit import default_timer as timer
+
+from audioled.audio import GlobalAudio
+
+import logging
+logger = logging.getLogger(__name__)
+
+frame_timings = ['audio', 'clock']
+
+
+class FrameScheduler(threading.Thread):
+    """Calls frame() once per audio chunk or at a fixed rate
+
+    Parameters
+    ----------
+    frame: callable
+        Renders one frame.
+    rate: float
+        Frames per second in 'clock' mode. In 'audio' mode frames follow the audio chunks,
+        the rate is only used as fallback while no audio arrives.
+    mode: str
+        'audio' renders each frame as soon as a new chunk was published by GlobalAudio,
+        'clock' renders with a fixed rate, correcting for drift of the frame start times.
+    """
+    def __init__(self, frame, rate=60., mode='audio'):
+        super().__init__(name='FrameScheduler', daemon=True)
+        if mode not in frame_timings:
+            raise ValueError("Unknown frame timing {}".format(mode))
+        self.frame = frame
+        self.rate = rate
+        self.mode = mode
+        # Number of frames rendered
+        self.frames = 0
+        # Number of audio chunks or clock ticks without a frame
+        self.dropped = 0
+        self._stopEvent = threading.Event()
+
+    def run(self):
+        logger.info("Starting frame scheduler, timing: {}, rate: {}".format(self.mode, self.rate))
+        if self.mode == 'audio':
+            self._runAudio()
+        else:
+            self._runClock()
+
+    def _runClock(self):
+        period = 1. / self.rate
+        nextTime = timer()
+        while not self._stopEvent.is_set():
+            self._frame()
+            nextTime += period
+            now = timer()
+            if now - nextTime > period:
+                # Too slow, skip the missed frames instead of catching up
+                missed = int((now - nextTime) // period)
+                self.dropped += missed
+                nextTime += missed * period
+            self._stopEvent.wait(max(0., nextTime - now))
+
+    def _runAudio(self):
+        count = GlobalAudio.chunk_count
+        while not self._stopEvent.is_set():
+            newCount = GlobalAudio.wait_for_chunk(count, timeout=1.5 / self.rate)
+            if newCount > count:
+                self.dropped += newCount - count - 1
+            count = newCount
+            if self._stopEvent.is_set():
+                return
+            self._frame()
+
+    def _frame(self):
+        try:
+            self.frame()
+        except Exception as e:
+            logger.error("Error rendering frame: {}".format(e))
+            traceback.print_tb(e.__traceback__)
+        self.frames += 1
+
+    def stop(self):
+        self._stopEvent.set()
+        with GlobalAudio.chunk_condition:
+            GlobalAudio.chunk_condition.notify_all()
@@ -19,8 +19,20 @@ CONFIG_NUM_ROWS = 'num_rows'
 CONFIG_DEVICE = 'device'
 CONFIG_DEVICE_CANDY_SERVER = 'device.candy.server'
 CONFIG_DEVICE_RASPBERRYPI_GPIO = 'device.raspberrypi.gpio'
+CONFIG_DEVICE_GAMMA = 'device.gamma'
+CONFIG_DEVICE_WHITE_BALANCE = 'device.white_balance'
+CONFIG_DEVICE_DITHER = 'device.dither'
+CONFIG_DEVICE_LATENCY = 'device.latency'
 CONFIG_AUDIO_DEVICE_INDEX = 'audio.device_index'
 CONFIG_AUDIO_MAX_CHANNELS = 'audio.max_channels'
+CONFIG_AUDIO_FILE = 'audio.file'
+CONFIG_AUDIO_FILE_REALTIME = 'audio.file.realtime'
+CONFIG_AUDIO_FILE_SAMPLE_RATE = 'audio.file.sample_rate'
+CONFIG_AUDIO_UDP_PORT = 'audio.udp.port'
+CONFIG_AUDIO_ROUTING = 'audio.routing'
+CONFIG_LATENCY_TARGET = 'latency.target'
+CONFIG_LATENCY_LOOKAHEAD = 'latency.lookahead'
+CONFIG_AUDIO_UDP_JITTER = 'audio.udp.jitter'
 CONFIG_AUDIO_AUTOADJUST_ENABLED = 'audio.autoadjust.enabled'
 CONFIG_AUDIO_AUTOADJUST_MAXGAIN = 'audio.autoadjust.max_gain'
 CONFIG_AUDIO_AUTOADJUST_TIME = 'audio.autoadjust.time'
@@ -68,6 +80,18 @@ class ServerConfiguration:
         self._config[CONFIG_ADVERTISE_BLUETOOTH_NAME] = "MOLECOLE Control"
         # Audio
         self._config[CONFIG_AUDIO_MAX_CHANNELS] = 2
+        self._config[CONFIG_AUDIO_FILE] = ''
+        self._config[CONFIG_AUDIO_FILE_REALTIME] = True
+        # Only needed for .npy files
+        self._config[CONFIG_AUDIO_FILE_SAMPLE_RATE] = 44100
+        # Network audio, disabled with port 0
+        self._config[CONFIG_AUDIO_UDP_PORT] = 0
+        self._config[CONFIG_AUDIO_UDP_JITTER] = 2
+        # Routing matrix (buses x device channels), empty for no routing
+        self._config[CONFIG_AUDIO_ROUTING] = []
+        # Latency compensation in seconds
+        self._config[CONFIG_LATENCY_TARGET] = 0.
+        self._config[CONFIG_LATENCY_LOOKAHEAD] = 0.
         self._config[CONFIG_AUDIO_AUTOADJUST_ENABLED] = False
         self._config[CONFIG_AUDIO_AUTOADJUST_MAXGAIN] = 1.
         self._config[CONFIG_AUDIO_AUTOADJUST_TIME] = 30.
@@ -93,6 +117,12 @@ class ServerConfiguration:
             CONFIG_UPDATER_AUTOCHECK_PATH: "",
             CONFIG_UPDATER_URL: "",
             CONFIG_AUDIO_MAX_CHANNELS: [2, 1, 24, 1],
+            CONFIG_AUDIO_FILE: "",
+            CONFIG_AUDIO_FILE_REALTIME: True,
+            CONFIG_AUDIO_UDP_PORT: [0, 0, 65535, 1],
+            CONFIG_AUDIO_UDP_JITTER: [2, 1, 16, 1],
+            CONFIG_LATENCY_TARGET: [0.0, 0.0, 1.0, 0.001],
+            CONFIG_LATENCY_LOOKAHEAD: [0.0, 0.0, 0.5, 0.001],
             CONFIG_AUDIO_AUTOADJUST_ENABLED: False,
             CONFIG_AUDIO_AUTOADJUST_MAXGAIN: [1.0, 0.01, 50.0, 0.01],
             CONFIG_AUDIO_AUTOADJUST_TIME: [30.0, 1.0, 100.0, 0.1],
@@ -140,16 +170,33 @@ class ServerConfiguration:
             logger.info("Renewing device")
             self._reusableDevice = None
             self.getActiveProjectOrDefault().setDevice(self._createOrReuseOutputDevice())
+        self._warnRestartRequired(key)
+        self._applyRuntimeValue(key, value)
+
+    def _warnRestartRequired(self, key):
         if key == CONFIG_AUDIO_MAX_CHANNELS:
             logger.warning("Number of audio channels changed. Restart required!")
+        if key in [CONFIG_AUDIO_FILE, CONFIG_AUDIO_FILE_REALTIME, CONFIG_AUDIO_FILE_SAMPLE_RATE]:
+            logger.warning("Audio file source changed. Restart required!")
+        if key in [CONFIG_AUDIO_UDP_PORT, CONFIG_AUDIO_UDP_JITTER]:
+            logger.warning("Network audio source changed. Restart required!")
         if key == CONFIG_ADVERTISE_BLUETOOTH:
             logger.warning("Advertise bluetooth yes/no was changed. Restart required!")
+
+    def _applyRuntimeValue(self, key, value):
+        """Applies configuration values that take effect without restart"""
         if key == CONFIG_AUDIO_AUTOADJUST_ENABLED:
             audio.GlobalAudio.global_autogain_enabled = bool(value)
         if key == CONFIG_AUDIO_AUTOADJUST_MAXGAIN:
             audio.GlobalAudio.global_autogain_maxgain = float(value)
         if key == CONFIG_AUDIO_AUTOADJUST_TIME:
             audio.GlobalAudio.global_autogain_time = float(value)
+        if key == CONFIG_AUDIO_ROUTING:
+            audio.GlobalAudio.set_routing(value)
+        if key == CONFIG_LATENCY_TARGET:
+            project.Project.target_latency = float(value)
+        if key == CONFIG_LATENCY_LOOKAHEAD:
+            audio.GlobalAudio.lookahead = float(value)
         
     def getConfiguration(self, key):
         if key in self._config:
@@ -336,7 +383,17 @@ class ServerConfiguration:
                 self.setConfigurationValue(CONFIG_ACTIVE_DEVICE_CONFIGURATION, deviceConfigName)
             return self.createOutputDeviceFromConfig(deviceConfig, deviceConfigs)
 
-    def createSingleDevice(self, deviceName, numPixels, numRows, candyServer=None, panelMapping=None, raspberryGpio=None):
+    def createSingleDevice(self,
+                           deviceName,
+                           numPixels,
+                           numRows,
+                           candyServer=None,
+                           panelMapping=None,
+                           raspberryGpio=None,
+                           gamma=None,
+                           whiteBalance=None,
+                           dither=None,
+                           latency=None):
         # Single device legacy implementation, TODO: Deprecate or adjust
         logger.info("Creating device: {}".format(deviceName))
         if deviceName == devices.RaspberryPi.__name__:
@@ -349,14 +406,20 @@ class ServerConfiguration:
         else:
             logger.info("Unknown device: {}".format(deviceName))
             return None
+        if gamma is not None:
+            device.setGamma(bool(gamma))
+        if whiteBalance is not None:
+            device.setWhiteBalance(whiteBalance)
+        if dither is not None:
+            device.setDither(bool(dither))
+        if latency is not None:
+            device.setLatency(float(latency))
 
         if panelMapping and panelMapping:
             mappingFile = panelMapping
             if os.path.exists(mappingFile):
-                with open(mappingFile, "r", encoding='utf-8') as f:
-                    mapping = json.loads(f.read())
-                    device = devices.PanelWrapper(device, mapping)
-                    logger.info("Active pixel mapping on real device: {}".format(mappingFile))
+                device = devices.PanelWrapper.fromFile(device, mappingFile)
+                logger.info("Active pixel mapping on real device: {}".format(mappingFile))
             else:
                 raise FileNotFoundError("Mapping file {} does not exist.".format(mappingFile))
         return device
@@ -371,10 +434,8 @@ class ServerConfiguration:
         if panelMapping and panelMapping:
             mappingFile = panelMapping
             if os.path.exists(mappingFile):
-                with open(mappingFile, "r", encoding='utf-8') as f:
-                    mapping = json.loads(f.read())
-                    device = devices.PanelWrapper(device, mapping)
-                    logger.info("Active pixel mapping on virtual device: {}".format(mappingFile))
+                device = devices.PanelWrapper.fromFile(device, mappingFile)
+                logger.info("Active pixel mapping on virtual device: {}".format(mappingFile))
             else:
                 raise FileNotFoundError("Mapping file {} does not exist.".format(mappingFile))
         return device
@@ -442,6 +503,10 @@ class ServerConfiguration:
             panelMapping = None
             if 'device.panel.mapping' in entry:
                 panelMapping = entry['device.panel.mapping']
+            gamma = entry.get(CONFIG_DEVICE_GAMMA)
+            whiteBalance = entry.get(CONFIG_DEVICE_WHITE_BALANCE)
+            dither = entry.get(CONFIG_DEVICE_DITHER)
+            latency = entry.get(CONFIG_DEVICE_LATENCY)
             if deviceName == 'VirtualOutput':
                 # Construct output device
                 referencedConf = entry['device.virtual.reference']
@@ -470,7 +535,16 @@ class ServerConfiguration:
                                                   start_index=start_index,
                                                   panelMapping=panelMapping)
             else:
-                device = self.createSingleDevice(deviceName, pixels, rows, candyServer=candyServer, panelMapping=panelMapping, raspberryGpio=raspberryGpio)
+                device = self.createSingleDevice(deviceName,
+                                                 pixels,
+                                                 rows,
+                                                 candyServer=candyServer,
+                                                 panelMapping=panelMapping,
+                                                 raspberryGpio=raspberryGpio,
+                                                 gamma=gamma,
+                                                 whiteBalance=whiteBalance,
+                                                 dither=dither,
+                                                 latency=latency)
             outputDevices.append(device)
         return MultiOutputWrapper(outputDevices)
 
@@ -558,9 +632,22 @@ class ServerConfiguration:
                         raise RuntimeError(
                             "{} entry {} has device.virtual.reference to self. Circular reference is not allowed".format(
                                 configEntryName, key))
+        if configEntryName == CONFIG_AUDIO_ROUTING:
+            self._assertRoutingValid(configEntryName, config)
         # No error in _isConfigChangeValid()
         return True
 
+    def _assertRoutingValid(self, configEntryName, config):
+        """ Raises RuntimeError if the audio routing matrix is not valid
+        """
+        # Example: [[0.5, 0.5], [1, 0]] for a mono sum and the left channel
+        if not isinstance(config, list) or not all(isinstance(row, list) for row in config):
+            raise RuntimeError("{} must be a list of rows".format(configEntryName))
+        if len(set(len(row) for row in config)) > 1:
+            raise RuntimeError("{} rows must have the same length".format(configEntryName))
+        if not all(isinstance(v, (int, float)) for row in config for v in row):
+            raise RuntimeError("{} must consist of numbers".format(configEntryName))
+
     def store(self):
         pass
 
@@ -0,0 +1,128 @@
+"""Micro benchmarks for the DSP building blocks
+
+Run on the target machine to choose the cheapest implementation, e.g.
+
+    python benchmark.py fft --sizes 512 1024 2048
+    python benchmark.py spectrum --num_pixels 300
+"""
+import argparse
+import os
+from timeit import default_timer as timer
+
+import numpy as np
+
+from audioled import dsp
+
+
+def timeIt(function, repeat):
+    """Returns the average time per call in seconds"""
+    function()  # warm up caches and plans
+    start = timer()
+    for _ in range(repeat):
+        function()
+    return (timer() - start) / repeat
+
+
+def benchmarkFFT(args):
+    workers = args.workers if args.workers else sorted({1, os.cpu_count() or 1})
+    backends = [('numpy', None, False)]
+    for w in workers:
+        backends.append(('scipy', w, False))
+        backends.append(('scipy', w, True))
+    print("{0:>8s}  {1:>8s}  {2:>8s}  {3:>11s}  {4:>12s}".format('size', 'backend', 'workers', 'overwrite_x', 'time [us]'))
+    for size in args.sizes:
+        x = np.random.uniform(-1, 1, size)
+        for backend, w, overwrite_x in backends:
+            dsp.set_fft_backend(backend, w)
+            if overwrite_x:
+                buffer = np.empty_like(x)
+
+                def run():
+                    np.copyto(buffer, x)
+                    dsp.rfft(buffer, overwrite_x=True)
+            else:
+
+                def run():
+                    dsp.rfft(x)
+
+            t = timeIt(run, args.repeat) * 1e6
+            print("{0:8d}  {1:>8s}  {2:>8s}  {3:>11s}  {4:12.2f}".format(size, backend, str(w or '-'), str(overwrite_x), t))
+    dsp.set_fft_backend()
+
+
+def benchmarkSpectrum(args):
+    """Per frame cost of the Spectrum effect analysis: generator pipeline vs. SpectrumAnalyser"""
+    fs = args.sample_rate
+    chunk_length = fs // args.chunk_rate
+    chunks = [np.random.uniform(-1, 1, chunk_length) for _ in range(16)]
+    franges = [[32.7, 261.0], [261.0, args.fmax]]
+    norm_dist = np.linspace(0, 1, args.num_pixels)
+    fft_dist = np.linspace(0, 1, args.bins)
+    min_feature_win = np.hamming(8)
+    state = {'chunk': chunks[0], 'i': 0}
+
+    def nextChunk():
+        state['i'] = (state['i'] + 1) % len(chunks)
+        state['chunk'] = chunks[state['i']]
+
+    def source():
+        while True:
+            yield state['chunk']
+
+    audio, fs_ds = dsp.preprocess(source(), fs, args.fmax, args.n_overlaps)
+
+    def runGenerators():
+        nextChunk()
+        y = next(audio)
+        lines = []
+        for frange in franges:
+            fft = dsp.warped_psd(y, args.bins, fs_ds, frange, 'bark')
+            fft = np.interp(norm_dist, fft_dist, fft)
+            lines.append(np.convolve(fft, min_feature_win, 'same') * 255)
+        return lines
+
+    analyser = dsp.SpectrumAnalyser(fs, args.fmax, args.n_overlaps, args.bins, franges)
+    lineMatrix = dsp.smooth_upsample_matrix(args.bins, args.num_pixels, 8)
+
+    def runAnalyser():
+        nextChunk()
+        return lineMatrix.dot(analyser.process(state['chunk']).T).T * 255
+
+    print("fs: {}, chunk: {}, n_overlaps: {}, bins: {}, pixels: {}".format(
+        fs, chunk_length, args.n_overlaps, args.bins, args.num_pixels))
+    print("{0:>10s}  {1:>12s}".format('pipeline', 'time [us]'))
+    for name, run in [('generators', runGenerators), ('analyser', runAnalyser)]:
+        print("{0:>10s}  {1:12.2f}".format(name, timeIt(run, args.repeat) * 1e6))
+
+
+def createParser():
+    parser = argparse.ArgumentParser(description='Benchmarks for audioled DSP')
+    subparsers = parser.add_subparsers(dest='benchmark')
+    subparsers.required = True
+
+    fft = subparsers.add_parser('fft', help='Compare FFT backends')
+    fft.add_argument('--sizes', dest='sizes', type=int, nargs='+', default=[256, 512, 1024, 2048, 4096], help='FFT sizes')
+    fft.add_argument('--workers',
+                     dest='workers',
+                     type=int,
+                     nargs='+',
+                     default=None,
+                     help='Worker counts for scipy.fft (default: 1 and number of CPUs)')
+    fft.add_argument('--repeat', dest='repeat', type=int, default=1000, help='Number of calls per measurement')
+    fft.set_defaults(func=benchmarkFFT)
+
+    spectrum = subparsers.add_parser('spectrum', help='Per frame cost of the Spectrum effect analysis')
+    spectrum.add_argument('--sample_rate', dest='sample_rate', type=int, default=44100, help='Sample rate')
+    spectrum.add_argument('--chunk_rate', dest='chunk_rate', type=int, default=60, help='Chunks per second')
+    spectrum.add_argument('--fmax', dest='fmax', type=int, default=6000, help='Highest frequency of interest')
+    spectrum.add_argument('--n_overlaps', dest='n_overlaps', type=int, default=4, help='Chunks per analysis window')
+    spectrum.add_argument('--bins', dest='bins', type=int, default=64, help='Filters per band')
+    spectrum.add_argument('--num_pixels', dest='num_pixels', type=int, default=300, help='Number of pixels')
+    spectrum.add_argument('--repeat', dest='repeat', type=int, default=1000, help='Number of frames per measurement')
+    spectrum.set_defaults(func=benchmarkSpectrum)
+    return parser
+
+
+if __name__ == '__main__':
+    args = createParser().parse_args()
+    args.func(args)
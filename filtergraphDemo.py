@@ -6,7 +6,7 @@ from timeit import default_timer as timer
 
 import jsonpickle
 
-from audioled import configs, devices, filtergraph, audio, runtimeconfiguration, serverconfiguration
+from audioled import configs, devices, dsp, filtergraph, audio, netaudio, runtimeconfiguration, serverconfiguration
 
 num_pixels = 300
 device = None
@@ -91,6 +91,7 @@ args = parser.parse_args()
 
 num_pixels = args.num_pixels
 num_rows = args.num_rows
+dsp.set_fft_backend(args.fft_backend, args.fft_workers)
 
 # Initialize device
 if args.device == deviceRasp:
@@ -101,11 +102,8 @@ elif args.device == deviceCandy:
 if args.device_panel_mapping is not None:
     mappingFile = args.device_panel_mapping
     if os.path.exists(mappingFile):
-        with open(mappingFile, "r", encoding='utf-8') as f:
-            content = f.read()
-            mapping = json.loads(content)
-            print("Panel mapping loaded")
-            device = devices.PanelWrapper(device, mapping)
+        device = devices.PanelWrapper.fromFile(device, mappingFile)
+        print("Panel mapping loaded")
     else:
         print("Fatal: Cannot find mapping file {}".format(mappingFile))
         exit(1)
@@ -120,7 +118,11 @@ config = args.config
 print("The following audio devices are available:")
 audio.print_audio_devices()
 
-if args.audio_device_index is not None:
+if args.audio_file is not None:
+    globalAudio = audio.FileAudio(args.audio_file, sample_rate=args.audio_sample_rate, realtime=not args.audio_file_fast)
+elif args.audio_udp_port is not None:
+    globalAudio = netaudio.NetworkAudio(args.audio_udp_port)
+elif args.audio_device_index is not None:
     globalAudio = audio.GlobalAudio(args.audio_device_index)
 else:
     globalAudio = audio.GlobalAudio()
@@ -225,6 +227,8 @@ while True:
         config_idx = config_idx + 1
         last_switch_time = current_time
 
+    globalAudio.step()
+    audio.GlobalAudio.analyse()
     cur_graph.update(dt)
     cur_graph.process()
     totalTiming.update(timer() - current_time)
@@ -233,6 +237,7 @@ while True:
     if count == 100:
         cur_graph.printProcessTimings()
         cur_graph.printUpdateTimings()
+        cur_graph.printCacheInfo()
         print(totalTiming.__dict__)
         count = 0
     count = count + 1
@@ -0,0 +1,72 @@
+"""Offline renderer for projects and filtergraphs
+
+Renders a project (or filtergraph) JSON with audio from a file as fast as possible, e.g.
+
+    python render.py configs/bonfire.json --audio_file song.wav -o bonfire.npy --gif bonfire.gif
+
+The frames are written as uint8 array of shape (frames, 3, num_pixels) to a memory-mapped .npy file.
+"""
+import argparse
+import math
+
+import numpy as np
+
+from audioled import audio, render
+
+
+def createParser():
+    parser = argparse.ArgumentParser(description='Render a project or filtergraph to a pixel file')
+    parser.add_argument('project', help='Project or filtergraph JSON file')
+    parser.add_argument('-o', '--output', dest='output', default='render.npy', help='Output .npy file (default: render.npy)')
+    parser.add_argument('--audio_file', dest='audio_file', default=None, help='WAV, FLAC or .npy audio file')
+    parser.add_argument('--audio_sample_rate',
+                        dest='audio_sample_rate',
+                        type=int,
+                        default=None,
+                        help='Sample rate of .npy audio files')
+    parser.add_argument('-N', '--num_pixels', dest='num_pixels', type=int, default=300, help='number of pixels (default: 300)')
+    parser.add_argument('-R', '--num_rows', dest='num_rows', type=int, default=1, help='number of rows (default: 1)')
+    parser.add_argument('--fps', dest='fps', type=int, default=60, help='Frames per second (default: 60)')
+    parser.add_argument('--duration',
+                        dest='duration',
+                        type=float,
+                        default=None,
+                        help='Seconds to render (default: length of the audio file)')
+    parser.add_argument('--scene', dest='scene', type=int, default=0, help='Scene of the project to render (default: 0)')
+    parser.add_argument('--device', dest='device', type=int, default=0, help='Device of the scene to render (default: 0)')
+    parser.add_argument('--gif', dest='gif', default=None, help='Write an animated GIF preview')
+    parser.add_argument('--gif_scale', dest='gif_scale', type=int, default=4, help='Size of a pixel in the GIF (default: 4)')
+    parser.add_argument('--gif_step', dest='gif_step', type=int, default=1, help='Use every n-th frame for GIF (default: 1)')
+    return parser
+
+
+if __name__ == '__main__':
+    args = createParser().parse_args()
+
+    audioSource = None
+    if args.audio_file is not None:
+        audioSource = audio.FileAudio(args.audio_file,
+                                      chunk_rate=args.fps,
+                                      sample_rate=args.audio_sample_rate,
+                                      realtime=False,
+                                      loop=args.duration is not None)
+    if args.duration is not None:
+        frames = int(math.ceil(args.duration * args.fps))
+    elif audioSource is not None:
+        frames = render.numFrames(audioSource)
+    else:
+        print("Fatal: Either --audio_file or --duration is needed")
+        exit(1)
+
+    fg, brightness = render.loadFiltergraph(args.project, args.scene, args.device)
+    fg.propagateNumPixels(args.num_pixels, args.num_rows)
+
+    out = np.lib.format.open_memmap(args.output, mode='w+', dtype=np.uint8, shape=(frames, 3, args.num_pixels))
+    elapsed = render.render(fg, out, 1. / args.fps, audioSource=audioSource, brightness=brightness)
+    out.flush()
+    print("Rendered {} frames in {:.2f}s: {:.1f} fps, {:.1f}x real time".format(
+        frames, elapsed, frames / elapsed, frames / args.fps / elapsed))
+
+    if args.gif is not None:
+        render.writeGif(out, args.gif, args.fps, num_rows=args.num_rows, scale=args.gif_scale, step=args.gif_step)
+        print("GIF preview written to {}".format(args.gif))
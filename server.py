@@ -24,7 +24,8 @@ from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers import interval
 from werkzeug.serving import is_running_from_reloader
 
-from audioled import audio, effects, filtergraph, serverconfiguration, runtimeconfiguration, modulation, project, version
+from audioled import audio, effects, filtergraph, serverconfiguration, runtimeconfiguration, modulation, project, version, dsp
+from audioled import netaudio, scheduler
 from audioled_controller import midi_full, grpc_server
 
 # configure logging here
@@ -98,13 +99,15 @@ proj = None  # type: project.Project
 default_values = {}
 record_timings = False
 serverconfig = None
+globalAudio = None  # type: audio.GlobalAudio
 
-POOL_TIME = 0.0  # Seconds
 
 # lock to control access to variable
 dataLock = threading.Lock()
 # thread handler
-ledThread = threading.Thread()
+ledThread = None  # type: scheduler.FrameScheduler
+frame_timing = 'audio'
+frame_rate = 60.
 midiThread = threading.Thread()
 stop_signal = False
 event_loop = None
@@ -239,10 +242,7 @@ def create_app():
 
             try:
                 app.logger.warning("Shutting down LED Thread")
-                ledThread.join(2)
-                if ledThread.is_alive():
-                    logger.warning("LED thread not joined. Terminating")
-                    ledThread.terminate()
+                stopLEDThread()
                 app.logger.warning("Shutdown LED Thread complete")
             except Exception as e:
                 app.logger.error("Error shutting down LED thread: {}".format(e))
@@ -836,7 +836,6 @@ def create_app():
 
     def processLED():
         global proj
-        global ledThread
         global stop_signal
         global event_loop
         global last_time
@@ -846,6 +845,8 @@ def create_app():
         global record_timings
         dt = 0
         if stop_signal:
+            # No more frames after the stop, end the scheduler calling us
+            ledThread.stop()
             return
         try:
             with dataLock:
@@ -856,6 +857,8 @@ def create_app():
                 if event_loop is None:
                     event_loop = asyncio.new_event_loop()
                     asyncio.set_event_loop(event_loop)
+                if globalAudio is not None:
+                    globalAudio.step()
                 proj.update(dt, event_loop)
                 proj.process()
                 # clear errors (if any have occured in the current run, we wouldn't reach this)
@@ -872,28 +875,30 @@ def create_app():
             app.logger.error("Unknown error: {}".format(e))
             traceback.print_tb(e.__traceback__)
         finally:
-            # Set the next thread to happen
             real_process_time = timer() - current_time
-            timeToWait = max(POOL_TIME, 0.01 - real_process_time)
             if count == 100:
                 if record_timings:
                     # proj.previewSlot(proj.activeSlotId).printProcessTimings() # TODO:
                     # proj.previewSlot(proj.activeSlotId).printUpdateTimings() # TODO:
                     app.logger.info("Process time: {}".format(real_process_time))
-                    app.logger.info("Waiting {}".format(timeToWait))
+                    app.logger.info("Frames: {}, dropped: {}".format(ledThread.frames, ledThread.dropped))
+                    for device, latency in proj.getLatencies().items():
+                        app.logger.info("Latency {}: {:.1f} ms".format(device, latency * 1000))
+                    for key, val in dsp.cache_info().items():
+                        app.logger.info("Cache {}: {}".format(key, val))
                 count = 0
-            if not stop_signal:
-                ledThread = threading.Timer(timeToWait, processLED, ())
-                ledThread.start()
 
     def startLEDThread():
         # Do initialisation stuff here
         global ledThread
         global last_time
         global current_time
-        # Create your thread
         current_time = timer()
-        ledThread = threading.Timer(POOL_TIME, processLED, ())
+        mode = frame_timing
+        if globalAudio is None or not globalAudio.realtime:
+            # Audio only advances with the frames
+            mode = 'clock'
+        ledThread = scheduler.FrameScheduler(processLED, rate=frame_rate, mode=mode)
         app.logger.info('starting LED thread')
         ledThread.start()
     
@@ -907,6 +912,16 @@ def create_app():
     return app
 
 
+def stopLEDThread(timeout=2):
+    """Stops the frame scheduler and waits for the frame in progress"""
+    if ledThread is None:
+        return
+    ledThread.stop()
+    ledThread.join(timeout)
+    if ledThread.is_alive():
+        logger.warning("LED thread not joined")
+
+
 def strandTest(dev, num_pixels):
     pixels = np.zeros(int(num_pixels / 2)) * np.array([[255.0], [255.0], [255.0]])
     t = 0.0
@@ -1012,9 +1027,23 @@ if __name__ == '__main__':
     if args.audio_device_index is not None:
         serverconfig.setConfigurationValue(serverconfiguration.CONFIG_AUDIO_DEVICE_INDEX, args.audio_device_index)
 
+    if args.audio_file is not None:
+        serverconfig.setConfigurationValue(serverconfiguration.CONFIG_AUDIO_FILE, args.audio_file)
+    if args.audio_file_fast is not None:
+        serverconfig.setConfigurationValue(serverconfiguration.CONFIG_AUDIO_FILE_REALTIME, not args.audio_file_fast)
+    if args.audio_udp_port is not None:
+        serverconfig.setConfigurationValue(serverconfiguration.CONFIG_AUDIO_UDP_PORT, args.audio_udp_port)
+    if args.audio_sample_rate is not None:
+        serverconfig.setConfigurationValue(serverconfiguration.CONFIG_AUDIO_FILE_SAMPLE_RATE, args.audio_sample_rate)
+
     if args.process_timing:
         record_timings = True
 
+    frame_timing = args.frame_timing
+    frame_rate = args.frame_rate
+
+    dsp.set_fft_backend(args.fft_backend, args.fft_workers)
+
     # Adjust from configuration
 
     # Audio
@@ -1022,7 +1051,19 @@ if __name__ == '__main__':
     if serverconfig.getConfiguration(serverconfiguration.CONFIG_AUDIO_MAX_CHANNELS) is not None:
         maxChannels = serverconfig.getConfiguration(serverconfiguration.CONFIG_AUDIO_MAX_CHANNELS)
 
-    if serverconfig.getConfiguration(serverconfiguration.CONFIG_AUDIO_DEVICE_INDEX) is not None:
+    if serverconfig.getConfiguration(serverconfiguration.CONFIG_AUDIO_FILE):
+        # Audio from file instead of audio device
+        globalAudio = audio.FileAudio(
+            serverconfig.getConfiguration(serverconfiguration.CONFIG_AUDIO_FILE),
+            num_channels=maxChannels,
+            sample_rate=serverconfig.getConfiguration(serverconfiguration.CONFIG_AUDIO_FILE_SAMPLE_RATE),
+            realtime=serverconfig.getConfiguration(serverconfiguration.CONFIG_AUDIO_FILE_REALTIME))
+    elif serverconfig.getConfiguration(serverconfiguration.CONFIG_AUDIO_UDP_PORT):
+        # Audio from network
+        globalAudio = netaudio.NetworkAudio(serverconfig.getConfiguration(serverconfiguration.CONFIG_AUDIO_UDP_PORT),
+                                            num_channels=maxChannels,
+                                            jitter=serverconfig.getConfiguration(serverconfiguration.CONFIG_AUDIO_UDP_JITTER))
+    elif serverconfig.getConfiguration(serverconfiguration.CONFIG_AUDIO_DEVICE_INDEX) is not None:
         logger.info("Overriding Audio device with device index {}".format(
             serverconfig.getConfiguration(serverconfiguration.CONFIG_AUDIO_DEVICE_INDEX)))
         audio.AudioInput.overrideDeviceIndex = serverconfig.getConfiguration(serverconfiguration.CONFIG_AUDIO_DEVICE_INDEX)
@@ -1039,6 +1080,12 @@ if __name__ == '__main__':
     if serverconfig.getConfiguration(serverconfiguration.CONFIG_AUDIO_AUTOADJUST_MAXGAIN) is not None:
         audio.GlobalAudio.global_autogain_maxgain = serverconfig.getConfiguration(
             serverconfiguration.CONFIG_AUDIO_AUTOADJUST_MAXGAIN)
+    if serverconfig.getConfiguration(serverconfiguration.CONFIG_LATENCY_TARGET) is not None:
+        project.Project.target_latency = serverconfig.getConfiguration(serverconfiguration.CONFIG_LATENCY_TARGET)
+    if serverconfig.getConfiguration(serverconfiguration.CONFIG_LATENCY_LOOKAHEAD) is not None:
+        audio.GlobalAudio.lookahead = serverconfig.getConfiguration(serverconfiguration.CONFIG_LATENCY_LOOKAHEAD)
+    if serverconfig.getConfiguration(serverconfiguration.CONFIG_AUDIO_ROUTING):
+        audio.GlobalAudio.set_routing(serverconfig.getConfiguration(serverconfiguration.CONFIG_AUDIO_ROUTING))
     if serverconfig.getConfiguration(serverconfiguration.CONFIG_AUDIO_AUTOADJUST_TIME) is not None:
         audio.GlobalAudio.global_autogain_time = serverconfig.getConfiguration(
             serverconfiguration.CONFIG_AUDIO_AUTOADJUST_TIME)
@@ -1111,6 +1158,7 @@ if __name__ == '__main__':
         app = create_app()
         app.run(debug=False, host="localhost", port=args.port)
     
-    proj.stopProcessing()
     stop_signal = True
+    stopLEDThread()
+    proj.stopProcessing()
     logger.info("App shut down")
@@ -0,0 +1,156 @@
+from __future__ import print_function
+from __future__ import division
+from __future__ import unicode_literals
+from __future__ import absolute_import
+import asyncio
+import os
+import shutil
+import tempfile
+import time
+import unittest
+import numpy as np
+from scipy.io import wavfile
+from audioled import audio, dsp
+
+
+def resetGlobalAudio():
+    audio.GlobalAudio.buffer = None
+    audio.GlobalAudio.ring = None
+    audio.GlobalAudio.sample_rate = None
+    audio.GlobalAudio.chunk_count = 0
+    audio.GlobalAudio.set_routing(None)
+    audio.GlobalAudio.buses = None
+    audio.GlobalAudio.bus_rms = None
+    audio.GlobalAudio.bus_peak = None
+    audio.GlobalAudio.global_autogain_enabled = False
+    audio.GlobalAudio.band_gains = None
+
+
+class Test_FileAudio(unittest.TestCase):
+    def tearDown(self):
+        resetGlobalAudio()
+
+    def test_loadAudioFile_convertsWav(self):
+        tmpDir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmpDir, 'test.wav')
+            data = np.array([[0, 16384], [-32768, 0], [16384, -16384]], dtype=np.int16)
+            wavfile.write(path, 22050, data)
+            samples, fs = audio.loadAudioFile(path)
+            self.assertEqual(fs, 22050)
+            self.assertEqual(samples.dtype, np.float32)
+            np.testing.assert_allclose(samples, [[0, -1, 0.5], [0.5, 0, -0.5]])
+        finally:
+            shutil.rmtree(tmpDir)
+
+    def test_step_publishesChunks(self):
+        fs = 600
+        samples = np.arange(2 * 25, dtype=np.float32).reshape(2, 25)
+        fileAudio = audio.FileAudio(samples, chunk_rate=60, sample_rate=fs, realtime=False, loop=False)
+        self.assertEqual(audio.GlobalAudio.sample_rate, fs)
+        self.assertTrue(fileAudio.step())
+        self.assertEqual(audio.GlobalAudio.buffer.shape, (2, 10))
+        self.assertEqual(list(audio.GlobalAudio.buffer[1]), list(range(25, 35)))
+        self.assertTrue(fileAudio.step())
+        # Last chunk is padded with zeros
+        self.assertFalse(fileAudio.step())
+        self.assertEqual(list(audio.GlobalAudio.buffer[0]), list(range(20, 25)) + [0] * 5)
+        self.assertEqual(audio.GlobalAudio.chunk_count, 3)
+
+    def test_step_loops(self):
+        samples = np.arange(15, dtype=np.float32)
+        fileAudio = audio.FileAudio(samples, chunk_rate=60, sample_rate=600, realtime=False)
+        fileAudio.step()
+        self.assertTrue(fileAudio.step())
+        self.assertEqual(list(audio.GlobalAudio.buffer[0]), list(range(10, 15)) + list(range(5)))
+        fileAudio.step()
+        self.assertEqual(list(audio.GlobalAudio.buffer[0]), list(range(5, 15)))
+
+    def test_realtime_streamsInBackground(self):
+        samples = np.ones((1, 6000), dtype=np.float32)
+        fileAudio = audio.FileAudio(samples, chunk_rate=100, sample_rate=6000, realtime=True)
+        try:
+            time.sleep(0.1)
+            # step() does not read, chunks are published by the thread
+            fileAudio.step()
+            self.assertGreater(audio.GlobalAudio.chunk_count, 1)
+            self.assertLess(audio.GlobalAudio.chunk_count, 30)
+        finally:
+            fileAudio.stop()
+
+    def test_reallocation_keepsChunkCount(self):
+        fileAudio = audio.FileAudio(np.ones((1, 30), dtype=np.float32), chunk_rate=60, sample_rate=600, realtime=False)
+        fileAudio.step()
+        fileAudio.step()
+        fileAudio.step()
+        audio.GlobalAudio.analyse()
+        # Channel change reallocates the ring
+        fileAudio._push_chunk(np.full((2, 10), 0.5, dtype=np.float32))
+        self.assertEqual(audio.GlobalAudio.chunk_count, 4)
+        self.assertEqual(audio.GlobalAudio.wait_for_chunk(3, timeout=0.01), 4)
+        np.testing.assert_allclose(audio.GlobalAudio.ring[3 % audio.GlobalAudio.ring_slots], 0.5)
+        audio.GlobalAudio.analyse()
+        np.testing.assert_allclose(audio.GlobalAudio.buses, 0.5)
+
+
+class Test_Routing(unittest.TestCase):
+    def tearDown(self):
+        resetGlobalAudio()
+
+    def test_analyse_routesBuses(self):
+        samples = np.vstack([np.full(20, 0.5), np.full(20, -0.25)]).astype(np.float32)
+        fileAudio = audio.FileAudio(samples, chunk_rate=60, sample_rate=600, realtime=False)
+        audio.GlobalAudio.set_routing([[0.5, 0.5], [0, 1], [1, 0]], gains=[1, 2, 1])
+        fileAudio.step()
+        audio.GlobalAudio.analyse()
+        self.assertEqual(audio.GlobalAudio.buses.shape, (3, 10))
+        np.testing.assert_allclose(audio.GlobalAudio.buses[:, 0], [0.125, -0.5, 0.5])
+        np.testing.assert_allclose(audio.GlobalAudio.bus_peak, [0.125, -0.5, 0.5])
+        for i in range(3):
+            self.assertAlmostEqual(audio.GlobalAudio.bus_rms[i], dsp.rms(audio.GlobalAudio.buses[i]), places=6)
+
+    def test_route_handlesChannelMismatch(self):
+        audio.GlobalAudio.set_routing([[1, 1, 1]])
+        np.testing.assert_allclose(audio.GlobalAudio.route(np.ones((2, 4))), np.full((1, 4), 2))
+        audio.GlobalAudio.set_routing([])
+        self.assertIsNone(audio.GlobalAudio.routing)
+
+    def test_audioInput_usesBusAnalysis(self):
+        samples = np.vstack([np.linspace(-1, 1, 20), np.zeros(20)]).astype(np.float32)
+        fileAudio = audio.FileAudio(samples, chunk_rate=60, sample_rate=600, realtime=False)
+        audio.GlobalAudio.set_routing([[0.5, 0.5]])
+        fileAudio.step()
+        audio.GlobalAudio.analyse()
+        audioInput = audio.AudioInput(num_channels=2)
+        audioInput._inputBuffer = []
+        audioInput._outputBuffer = [None, None]
+        asyncio.get_event_loop().run_until_complete(audioInput.update(0.01))
+        audioInput.process()
+        for buffer in audioInput._outputBuffer:
+            np.testing.assert_allclose(buffer.audio, 0.5 * samples[0, :10])
+            self.assertAlmostEqual(buffer.rms(), dsp.rms(buffer.audio), places=6)
+            self.assertAlmostEqual(buffer.peak(), np.max(buffer.audio), places=6)
+
+    def test_audioInput_appliesBandGainsContinuously(self):
+        fs = 6000
+        samples = np.random.uniform(-1, 1, (1, 400)).astype(np.float32)
+        fileAudio = audio.FileAudio(samples, chunk_rate=60, sample_rate=fs, realtime=False)
+        audio.GlobalAudio.global_autogain_enabled = True
+        audioInput = audio.AudioInput(num_channels=1)
+        audioInput._inputBuffer = []
+        audioInput._outputBuffer = [None]
+        gains = np.array([[0.5, 2., 1.]])
+        output = []
+        for i in range(4):
+            fileAudio.step()
+            audio.GlobalAudio.analyse()
+            audio.GlobalAudio.band_gains = gains
+            asyncio.get_event_loop().run_until_complete(audioInput.update(0.01))
+            audioInput.process()
+            output.append(audioInput._outputBuffer[0].audio)
+        expected = dsp.BandGains(audio.GlobalAudio.agc.edges, fs).process(samples[0], fs, gains[0])
+        np.testing.assert_allclose(np.concatenate(output), expected, atol=1e-5)
+
+
+if __name__ == '__main__':
+    unittest.main()
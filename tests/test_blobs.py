@@ -0,0 +1,48 @@
+import math
+import unittest
+
+import numpy as np
+
+from audioled import blobs
+
+
+class Test_Blobs(unittest.TestCase):
+    def test_render_cosMatchesSampledBlob(self):
+        num_pixels = 60
+        for spread, location in [(1, 10), (7, 30), (12, 2), (9, 58)]:
+            expected = np.zeros(num_pixels)
+            for i in range(-spread, spread + 1):
+                if 0 <= location + i < num_pixels:
+                    expected[location + i] = max(math.cos((math.pi / spread) * i), 0)
+            np.testing.assert_allclose(blobs.render(num_pixels, location, spread / 2), expected, atol=1e-12)
+
+    def test_render_sumsAndWraps(self):
+        positions = np.array([0.5, 9.25, 4.])
+        widths = np.array([2., 3., 1.5])
+        amplitudes = np.array([1., 0.5, -2.])
+        x = np.arange(10)
+        for shape in blobs.blob_shapes:
+            expected = np.zeros(10)
+            for p, w, a in zip(positions, widths, amplitudes):
+                for offset in [-10, 0, 10]:
+                    u = (x - p - offset) / w
+                    if shape == 'cos':
+                        expected += a * np.where(np.abs(u) < 1, np.cos(0.5 * np.pi * u), 0)
+                    elif shape == 'triangle':
+                        expected += a * np.maximum(1 - np.abs(u), 0)
+                    else:
+                        expected += a * np.where(np.abs(u) <= 3, np.exp(-0.5 * u * u), 0)
+            result = blobs.render(10, positions, widths, amplitudes, shape=shape, wrap=True)
+            np.testing.assert_allclose(result, expected, atol=1e-12)
+        self.assertEqual(blobs.render(10, [], 1.).tolist(), [0] * 10)
+        self.assertRaises(ValueError, blobs.render, 10, [1], 1., shape='unknown')
+
+    def test_shift(self):
+        rows = np.random.uniform(0, 1, (3, 12))
+        np.testing.assert_allclose(blobs.shift(rows, 5), np.roll(rows, 5, axis=1))
+        np.testing.assert_allclose(blobs.shift(rows, [-2, 0, 14])[0], np.roll(rows[0], -2))
+        np.testing.assert_allclose(blobs.shift(rows, 0.5), 0.5 * (rows + np.roll(rows, 1, axis=1)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,135 @@
+from __future__ import print_function
+from __future__ import division
+from __future__ import unicode_literals
+from __future__ import absolute_import
+import json
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+from audioled import devices
+
+
+class Test_Devices(unittest.TestCase):
+    def test_raspberryPi_writesPackedColors(self):
+        num_pixels = 50
+        device = devices.RaspberryPi(num_pixels, strip_class=devices.EmulatedPixelStrip, dither=False)
+        pixels = np.random.randint(0, 256, size=(3, num_pixels)).astype(float)
+        device.show(pixels)
+        gamma = devices._GAMMA_TABLE[pixels.astype(int)]
+        expected = (gamma[0] << 16) | (gamma[1] << 8) | gamma[2]
+        self.assertTrue((device._strip.leds == expected).all())
+        self.assertEqual(device._strip.num_shows, 1)
+
+    def test_raspberryPi_fallsBackToSetPixelColor(self):
+        num_pixels = 10
+        device = devices.RaspberryPi(num_pixels, strip_class=devices.EmulatedPixelStrip)
+        device._leds = None
+        pixels = np.zeros((3, num_pixels))
+        pixels[0, 3] = 255
+        device.show(pixels)
+        self.assertEqual(device._strip.getPixelColor(3), 255 << 16)
+        self.assertEqual(device._strip.getPixelColor(4), 0)
+
+    def test_blinkStick_sendsGRBData(self):
+        stick = MockBlinkStick()
+        device = devices.BlinkStick(3, stick=stick)
+        pixels = np.array([[255, 0, 0], [0, 255, 0], [0, 0, 255]], dtype=float)
+        device.show(pixels)
+        self.assertEqual(stick.channel, 0)
+        self.assertEqual(list(stick.data), [0, 255, 0, 255, 0, 0, 0, 0, 255])
+
+    def test_colorLUT_matchesGammaTable(self):
+        device = devices.LEDController(256, gamma=True)
+        pixels = np.tile(np.arange(256), (3, 1)).astype(float)
+        corrected = device.colorCorrect(pixels)
+        self.assertEqual(corrected.dtype, np.uint8)
+        self.assertTrue((corrected == devices._GAMMA_TABLE).all())
+
+    def test_colorLUT_appliesBrightnessAndWhiteBalance(self):
+        device = devices.LEDController(1, white_balance=[1.0, 0.5, 0.0])
+        device.setBrightness(0.5)
+        pixels = np.array([[200], [200], [200]], dtype=np.uint8)
+        self.assertEqual(list(device.colorCorrect(pixels)[:, 0]), [100, 50, 0])
+        # LUT is rebuilt when brightness changes
+        device.setBrightness(1.0)
+        self.assertEqual(list(device.colorCorrect(pixels)[:, 0]), [200, 100, 0])
+
+    def test_dither_averagesToColorCurve(self):
+        device = devices.LEDController(4, gamma=True, dither=True)
+        device.setBrightness(0.1)
+        pixels = np.array([[0, 64, 128, 255]] * 3, dtype=np.uint8)
+        num_frames = 100
+        total = np.zeros((3, 4))
+        for _ in range(num_frames):
+            corrected = device.colorCorrect(pixels)
+            self.assertEqual(corrected.dtype, np.uint8)
+            total += corrected
+        expected = device.getColorCurve()[:, [0, 64, 128, 255]]
+        np.testing.assert_allclose(total / num_frames, expected, atol=1. / num_frames)
+        # Black stays black
+        self.assertTrue((total[:, 0] == 0).all())
+
+    def test_dither_resetsOnPixelCountChange(self):
+        device = devices.LEDController(4, dither=True)
+        device.colorCorrect(np.full((3, 4), 100, dtype=np.uint8))
+        corrected = device.colorCorrect(np.full((3, 8), 100, dtype=np.uint8))
+        self.assertEqual(corrected.shape, (3, 8))
+        self.assertTrue((corrected == 100).all())
+
+    def test_panelWrapper_mapsPixels(self):
+        device = MockDevice(6)
+        wrapper = devices.PanelWrapper(device, PANEL_MAPPING)
+        self.assertEqual(wrapper.pixel_mapping.dtype, np.int32)
+        self.assertEqual(list(wrapper.pixel_mapping), [2, 1, 0, 3, 4, 5])
+        pixels = np.arange(18).reshape(3, 6)
+        wrapper.show(pixels)
+        self.assertEqual(list(device.pixels[1]), [8, 7, 6, 9, 10, 11])
+
+    def test_panelWrapper_cachesMappingFile(self):
+        tmpDir = tempfile.mkdtemp()
+        try:
+            mappingFile = os.path.join(tmpDir, 'panel.json')
+            with open(mappingFile, 'w') as f:
+                json.dump(PANEL_MAPPING, f)
+            wrapper = devices.PanelWrapper.fromFile(MockDevice(6), mappingFile)
+            cacheFile = os.path.join(tmpDir, 'panel.npy')
+            self.assertTrue(os.path.exists(cacheFile))
+            self.assertTrue((np.load(cacheFile) == wrapper.pixel_mapping).all())
+            self.assertTrue((devices.loadPixelMapping(mappingFile) == wrapper.pixel_mapping).all())
+        finally:
+            shutil.rmtree(tmpDir)
+
+
+PANEL_MAPPING = {
+    "num_rows": 2,
+    "num_cols": 3,
+    "substrips": [
+        {"start_index": 0, "row": 0, "col": 2, "dir": "L", "num_pixels": 3},
+        {"start_index": 3, "row": 1, "col": 0, "dir": "R", "num_pixels": 3},
+    ]
+}
+
+
+class MockDevice(devices.LEDController):
+    def __init__(self, num_pixels):
+        super().__init__(num_pixels)
+        self.pixels = None
+
+    def show(self, pixels):
+        self.pixels = np.array(pixels)
+
+
+class MockBlinkStick(object):
+    def __init__(self):
+        self.channel = None
+        self.data = None
+
+    def set_led_data(self, channel, data):
+        self.channel = channel
+        self.data = data
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,8 +2,12 @@ from __future__ import print_function
 from __future__ import division
 from __future__ import unicode_literals
 from __future__ import absolute_import
+import gc
+import math
+import threading
 import unittest
 import numpy as np
+from scipy.signal import sosfilt
 from audioled import dsp
 
 
@@ -113,6 +117,276 @@ class TestDSP(unittest.TestCase):
         signal = np.array(list(signal))
         self.assertTrue((signal == 0).all())
 
+    def test_design_filter_cached(self):
+        """Verifies that identical filter designs are reused"""
+        self.assertIs(dsp.design_sos_filter(100, 1000, 44100, 3), dsp.design_sos_filter(100, 1000, 44100, 3))
+        self.assertIs(dsp.design_filter(100, 1000, 44100, 3), dsp.design_filter(100, 1000, 44100, 3))
+
+    def test_bandpass_bank(self):
+        """Verifies that each band of the bank matches a single band-pass filter"""
+        fs = 44100
+        bank = dsp.BandpassBank(fs)
+        bank.addBand(20, 80, 3)
+        bank.addBand(200, 2000, 3)
+        bank.addBand(20, 80, 3)
+        self.assertEqual(bank.bands(), [(20, 80, 3), (200, 2000, 3)])
+        filters = [list(dsp.design_sos_filter(20, 80, fs, 3)), list(dsp.design_sos_filter(200, 2000, fs, 3))]
+        for _ in range(3):
+            audio = np.random.uniform(-1, 1, 735)
+            output = bank.filter(audio, fs)
+            self.assertEqual(output.shape, (2, 735))
+            for y, f in zip(output, filters):
+                expected, f[1] = sosfilt(f[0], audio, zi=f[1])
+                np.testing.assert_allclose(y, expected)
+
+    def test_bandpass_sos_matches_ba(self):
+        """Verifies that both filter representations give the same result"""
+        fs = 44100
+        sos = dsp.Bandpass(200, 2000, fs, 3, output='sos')
+        ba = dsp.Bandpass(200, 2000, fs, 3, output='ba')
+        for _ in range(3):
+            audio = np.random.uniform(-1, 1, 735)
+            np.testing.assert_allclose(sos.filter(audio, fs), ba.filter(audio, fs), atol=1e-6)
+
+    def test_bandpass_sos_stable_for_narrow_low_band(self):
+        """Verifies that a high order low band filter stays bounded"""
+        fs = 48000
+        bandpass = dsp.Bandpass(20, 80, fs, 8)
+        t = np.arange(fs) / fs
+        y = bandpass.filter(np.sin(2 * np.pi * 50 * t), fs)
+        self.assertTrue(np.isfinite(y).all())
+        self.assertLess(np.max(np.abs(y)), 1.5)
+        self.assertGreater(np.max(np.abs(y[fs // 2:])), 0.9)
+
+    def test_warped_psd_matches_dense_filter_bank(self):
+        """Verifies that the sparse filter bank gives the dense result"""
+        y = np.random.uniform(-1, 1, 1024)
+        filters, _ = dsp.filter_bank(24, 1024, 8000, 261.0, 4000, 'bark')
+        expected = filters.dot(np.abs(np.fft.rfft(y))**2 * (2 / 1024))
+        np.testing.assert_allclose(dsp.warped_psd(y, 24, 8000, [261.0, 4000], 'bark'), expected)
+
+    def test_memoize_bounded(self):
+        """Verifies that memoize evicts least recently used entries and counts hits"""
+        calls = []
+
+        @dsp.memoize(maxsize=2)
+        def square(x):
+            calls.append(x)
+            return x * x
+
+        self.assertEqual(square(2), 4)
+        self.assertEqual(square(3), 9)
+        self.assertEqual(square(2), 4)
+        self.assertEqual(square(4), 16)  # evicts 3
+        self.assertEqual(square(3), 9)
+        self.assertEqual(calls, [2, 3, 4, 3])
+        self.assertEqual(square.cache_info(), dsp.CacheInfo(hits=1, misses=4, maxsize=2, currsize=2))
+        name = '{}.{}'.format(__name__, square.__qualname__)
+        self.assertEqual(dsp.cache_info()[name], square.cache_info())
+        # Registered until the function is gone
+        del square
+        gc.collect()
+        self.assertNotIn(name, dsp.cache_info())
+
+    def test_memoize_registersSameNameSeparately(self):
+        @dsp.memoize
+        def fft_size(n):
+            return n
+
+        self.assertEqual(fft_size(3), 3)
+        self.assertEqual(dsp.fft_size(3), 4)
+        info = dsp.cache_info()
+        self.assertEqual(info['audioled.dsp.fft_size'], dsp.fft_size.cache_info())
+        self.assertEqual(info['{}.{}'.format(__name__, fft_size.__qualname__)].misses, 1)
+
+    def test_memoize_threadSafe(self):
+        """Verifies that concurrent lookups and evictions do not raise"""
+        @dsp.memoize(maxsize=4)
+        def identity(x):
+            return x
+
+        errors = []
+
+        def run(offset):
+            try:
+                for i in range(5000):
+                    self.assertEqual(identity((i + offset) % 7), (i + offset) % 7)
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=run, args=(i, )) for i in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(errors, [])
+        info = identity.cache_info()
+        self.assertEqual(info.hits + info.misses, 20000)
+        self.assertLessEqual(info.currsize, 4)
+
+    def test_ring_buffer(self):
+        """Verifies that the ring buffer view returns the latest items in order"""
+        buff = dsp.RingBuffer(5)
+        self.assertTrue((buff.view() == 0).all())
+        buff.extend(np.arange(3))
+        buff.append(3)
+        self.assertEqual(list(buff.view()), [0, 0, 1, 2, 3])
+        buff.extend(np.arange(4, 8))
+        self.assertEqual(list(buff.view()), [3, 4, 5, 6, 7])
+        buff.extend(np.arange(8, 20))
+        self.assertEqual(list(buff.view()), [15, 16, 17, 18, 19])
+        self.assertTrue(buff.view().flags['C_CONTIGUOUS'])
+
+    def test_rollwin(self):
+        """Verifies that rollwin yields the last n_overlaps chunks"""
+        chunks = (np.full(4, i, dtype=float) for i in range(6))
+        windows = [w.copy() for w in dsp.rollwin(chunks, 3)]
+        self.assertEqual(len(windows), 5)
+        self.assertEqual(list(windows[0]), [0, 0, 0, 0, 0, 0, 0, 0, 1, 1, 1, 1])
+        self.assertEqual(list(windows[-1]), [3, 3, 3, 3, 4, 4, 4, 4, 5, 5, 5, 5])
+
+    def test_fft_backends(self):
+        """Verifies that all FFT backends give the same result"""
+        x = np.random.uniform(-1, 1, 1024)
+        expected = np.fft.rfft(x)
+        try:
+            for backend in dsp.fft_backends:
+                dsp.set_fft_backend(backend)
+                np.testing.assert_allclose(dsp.rfft(x), expected, atol=1e-9)
+            self.assertRaises(ValueError, dsp.set_fft_backend, 'unknown')
+        finally:
+            dsp.set_fft_backend()
+
+    def test_hanning_cached(self):
+        self.assertIs(dsp.hanning(128), dsp.hanning(128))
+        np.testing.assert_allclose(dsp.hanning(128), np.hanning(128))
+        with self.assertRaises(ValueError):
+            dsp.hanning(128)[0] = 1.
+
+    def test_beat_tracker(self):
+        """Verifies tempo and beat phase on a click track"""
+        np.random.seed(0)
+        fs = 44100
+        chunk = 735
+        bpm = 100
+        period = 60. / bpm
+        offset = 0.2
+        signal = np.random.normal(0, 0.01, fs * 12)
+        for t in np.arange(offset, 12, period):
+            i = int(t * fs)
+            signal[i:i + 500] += np.random.normal(0, 0.8, 500) * np.exp(-np.arange(500) / 100.)
+        tracker = dsp.BeatTracker()
+        beats = []
+        for i in range(len(signal) // chunk):
+            state = tracker.process(signal[i * chunk:(i + 1) * chunk], fs)
+            if state.beat and i * chunk > 8 * fs:
+                beats.append(i * chunk / fs)
+        self.assertAlmostEqual(state.bpm, bpm, delta=2)
+        self.assertGreater(len(beats), 4)
+        for t in beats:
+            # Beats are detected within one chunk of the clicks
+            error = (t - offset + period / 2) % period - period / 2
+            self.assertLess(abs(error), 2. * chunk / fs)
+
+    def test_multiband_agc(self):
+        """Verifies that quiet bands are boosted independently of loud bands"""
+        fs = 44100
+        chunk = 735
+        agc = dsp.MultibandAGC(release=0.5, max_gain=10., target=0.25)
+        t = np.arange(chunk * 100) / fs
+        bass = 0.5 * np.sin(2 * np.pi * 60 * t)
+        melody = 0.05 * np.sin(2 * np.pi * 1000 * t)
+        audio = np.vstack([bass + melody, melody])
+        for i in range(100):
+            gains = agc.process(audio[:, i * chunk:(i + 1) * chunk], fs)
+        self.assertEqual(gains.shape, (2, 3))
+        # Bass band of channel 0 is attenuated, melody band boosted in both channels
+        self.assertLess(gains[0, 0], 1.)
+        np.testing.assert_allclose(gains[:, 1], 0.25 / (0.05 / np.sqrt(2)), rtol=0.05)
+        # Silent bands are limited to max_gain
+        self.assertEqual(gains[1, 0], 10.)
+
+    def test_bandGains_scaleBands(self):
+        """Verifies that band gains scale the corresponding frequencies"""
+        fs = 44100
+        n = 44100
+        t = np.arange(n) / fs
+        audio = np.sin(2 * np.pi * 100 * t) + np.sin(2 * np.pi * 1000 * t)
+        bandGains = dsp.BandGains(dsp.MultibandAGC.default_edges, fs)
+        y = bandGains.process(audio, fs, np.array([0., 2., 0.]))
+        # Skip the settling of the filters
+        spectrum = np.abs(np.fft.rfft(y[n // 2:])) / (n / 4)
+        self.assertLess(spectrum[50], 0.2)
+        self.assertGreater(spectrum[500], 1.8)
+        self.assertLess(spectrum[500], 2.2)
+
+    def test_bandGains_continuousAcrossChunks(self):
+        fs = 16000
+        audio = np.random.uniform(-1, 1, 1600)
+        gains = np.array([0.5, 2., 1.])
+        # The top band is limited below the nyquist frequency
+        expected = dsp.BandGains(dsp.MultibandAGC.default_edges, fs).process(audio, fs, gains)
+        bandGains = dsp.BandGains(dsp.MultibandAGC.default_edges, fs)
+        y = np.concatenate([bandGains.process(chunk, fs, gains) for chunk in np.split(audio, 10)])
+        np.testing.assert_allclose(y, expected, atol=1e-12)
+
+    def test_rms_matchesReference(self):
+        x = np.random.uniform(-1, 1, 1000)
+        self.assertAlmostEqual(dsp.rms(x), math.sqrt(sum(s**2 for s in x) / 500))
+        self.assertAlmostEqual(dsp.rms(list(x)), dsp.rms(x))
+
+    def test_envelopeFollower_matchesHoldList(self):
+        """Compares the follower with the list based hold of the effects, including size changes"""
+        follower = dsp.EnvelopeFollower()
+        hold_values = []
+        values = np.random.uniform(0, 1, 500)
+        for i, value in enumerate(values):
+            limit = 5.5 if i < 200 else (2 if i < 350 else 12)
+            while len(hold_values) > limit:
+                hold_values.pop()
+            hold_values.insert(0, value)
+            follower.setSize(dsp.hold_size(limit))
+            follower.update(value)
+            self.assertAlmostEqual(follower.rms(), dsp.rms(hold_values))
+            self.assertEqual(follower.max(), np.max(hold_values))
+
+    def test_advance_beat(self):
+        state = dsp.BeatState(onset=0.5, bpm=120., phase=0.9, beat=False)
+        advanced = dsp.advance_beat(state, 0.1, 1. / 60)
+        self.assertAlmostEqual(advanced.phase, 0.1)
+        self.assertFalse(advanced.beat)
+        # 0.06 s ahead the phase just crossed the beat
+        advanced = dsp.advance_beat(state, 0.06, 1. / 60)
+        self.assertAlmostEqual(advanced.phase, 0.02)
+        self.assertTrue(advanced.beat)
+        self.assertIs(dsp.advance_beat(state, 0., 1. / 60), state)
+        noTempo = state._replace(bpm=0.)
+        self.assertIs(dsp.advance_beat(noTempo, 0.1, 1. / 60), noTempo)
+
+    def test_spectrumAnalyser_matchesGeneratorPipeline(self):
+        """Verifies that the analyser gives the result of preprocess and warped_psd"""
+        fs, fmax, n_overlaps, bins = 44100, 6000, 4, 32
+        franges = [[32.7, 261.0], [261.0, fmax]]
+        chunks = [np.random.uniform(-1, 1, 735) for _ in range(8)]
+        audio, fs_ds = dsp.preprocess(iter(chunks), fs, fmax, n_overlaps)
+        # preprocess consumes two chunks before yielding the first window
+        expected = [[dsp.warped_psd(y, bins, fs_ds, r, 'bark') for r in franges] for y in audio]
+        analyser = dsp.SpectrumAnalyser(fs, fmax, n_overlaps, bins, franges)
+        self.assertEqual(analyser.fs_ds, fs_ds)
+        results = [analyser.process(chunk) for chunk in chunks][2:]
+        self.assertEqual(results[-1].shape, (2, bins))
+        # Same window as soon as n_overlaps chunks were processed
+        for result, psd in list(zip(results, expected))[n_overlaps - 2:]:
+            np.testing.assert_allclose(result, psd, atol=1e-12)
+        self.assertTrue(analyser.matches(fs, fmax, n_overlaps, bins))
+        self.assertFalse(analyser.matches(48000, fmax, n_overlaps, bins))
+        self.assertRaises(ValueError, dsp.SpectrumAnalyser, 8000, fmax, n_overlaps, bins, franges)
+
+    def test_smooth_upsample_matrix(self):
+        x = np.random.uniform(0, 1, 16)
+        expected = np.convolve(np.interp(np.linspace(0, 1, 50), np.linspace(0, 1, 16), x), np.hamming(8), 'same')
+        np.testing.assert_allclose(dsp.smooth_upsample_matrix(16, 50, 8).dot(x), expected)
+
 
 if __name__ == '__main__':
     unittest.main()
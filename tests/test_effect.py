@@ -3,7 +3,9 @@ from __future__ import division
 from __future__ import unicode_literals
 from __future__ import absolute_import
 import unittest
-from audioled import colors
+import numpy as np
+from audioled import audioreactive, colors, dsp
+from audioled.effect import AudioBuffer
 
 
 class Test_Effect(unittest.TestCase):
@@ -26,3 +28,56 @@ class Test_Effect(unittest.TestCase):
         testEffect.setParameterOffset('r', testEffect.getParameterDefinition(), 1)
         paramDict = testEffect.getParameter()
         self.assertEqual(paramDict['parameters']['r'][0], 100)
+
+    def test_removedParametersAreDropped(self):
+        testEffect = audioreactive.MovingLight()
+        state = testEffect.__getstate__()
+        state.update(peak_filter=2.6, peak_scale=4.0)
+        loaded = audioreactive.MovingLight.__new__(audioreactive.MovingLight)
+        loaded.__setstate__(state)
+        self.assertFalse(hasattr(loaded, 'peak_filter'))
+        self.assertFalse(hasattr(loaded, 'peak_scale'))
+        # Modulations of removed parameters are ignored
+        loaded.setParameterOffset('peak_scale', loaded.getParameterDefinition(), 1)
+        self.assertFalse(hasattr(loaded, 'peak_scale'))
+
+    def test_audioBufferMemoisesAnalysis(self):
+        buffer = AudioBuffer(44100)
+        buffer.audio = np.sin(np.linspace(0, 100, 735))
+        self.assertIs(buffer.fft(), buffer.fft())
+        self.assertIs(buffer.bandpass(100, 1000), buffer.bandpass(100, 1000))
+        self.assertAlmostEqual(buffer.rms(), dsp.rms(buffer.audio))
+        self.assertEqual(buffer.peak(), np.max(buffer.audio))
+        # New audio invalidates results
+        fft = buffer.fft()
+        buffer.audio = np.zeros(735)
+        self.assertIsNot(buffer.fft(), fft)
+        self.assertEqual(buffer.bandPeak(100, 1000), np.max(buffer.bandpass(100, 1000)))
+
+    def test_audioBufferSharesBandFilterState(self):
+        audio = np.random.uniform(-1, 1, (3, 512))
+        buffer = AudioBuffer(44100)
+        bandpass = dsp.Bandpass(100, 1000, 44100)
+        for chunk in audio:
+            buffer.audio = chunk
+            np.testing.assert_allclose(buffer.bandpass(100, 1000), bandpass.filter(chunk, 44100), atol=1e-6)
+
+    def test_audioBufferResetsBandsSkippingFrames(self):
+        audio = np.random.uniform(-1, 1, (4, 512))
+        buffer = AudioBuffer(44100)
+        buffer.audio = audio[0]
+        buffer.bandpass(100, 1000)
+        # Band not requested for two frames
+        buffer.audio = audio[1]
+        buffer.audio = audio[2]
+        buffer.audio = audio[3]
+        bandpass = dsp.Bandpass(100, 1000, 44100)
+        np.testing.assert_allclose(buffer.bandpass(100, 1000), bandpass.filter(audio[3], 44100), atol=1e-6)
+
+    def test_audioBufferDiscardsUnusedBandFilters(self):
+        buffer = AudioBuffer(44100)
+        buffer.audio = np.zeros(10)
+        buffer.bandpass(100, 1000)
+        for _ in range(AudioBuffer.band_filter_timeout + 1):
+            buffer.audio = np.zeros(10)
+        self.assertEqual(buffer._bandpassBank.bands(), [])
@@ -0,0 +1,183 @@
+from __future__ import print_function
+from __future__ import division
+from __future__ import unicode_literals
+from __future__ import absolute_import
+import asyncio
+import socket
+import time
+import unittest
+import numpy as np
+from audioled import audio, audioreactive, devices, filtergraph, netaudio
+
+
+class Test_NetAudio(unittest.TestCase):
+    def test_packet_roundtrip(self):
+        chunk = np.random.uniform(-1, 1, (2, 100)).astype(np.float32)
+        sequence, fs, decoded, delay = netaudio.decodePacket(netaudio.encodePacket(7, 44100, chunk))
+        self.assertEqual((sequence, fs, delay), (7, 44100, 0.))
+        np.testing.assert_array_equal(decoded, chunk)
+        _, _, decoded, delay = netaudio.decodePacket(netaudio.encodePacket(8, 44100, chunk, netaudio.FORMAT_INT16, 0.0125))
+        np.testing.assert_allclose(decoded, chunk, atol=1e-4)
+        self.assertAlmostEqual(delay, 0.0125)
+        with self.assertRaises(ValueError):
+            netaudio.decodePacket(netaudio.encodePacket(7, 44100, chunk)[:-1])
+
+    def test_jitterBuffer_reordersAndConceals(self):
+        jitter = netaudio.JitterBuffer(depth=2)
+        jitter.put(11, 'b')
+        self.assertIsNone(jitter.get())
+        jitter.put(10, 'a')
+        jitter.put(13, 'd')
+        self.assertEqual(jitter.get(), 'a')
+        self.assertEqual(jitter.get(), 'b')
+        # 12 was lost
+        self.assertIsNone(jitter.get())
+        self.assertEqual(jitter.lost, 1)
+        jitter.put(12, 'c')
+        self.assertEqual(jitter.late, 1)
+        self.assertEqual(jitter.get(), 'd')
+
+    def test_jitterBuffer_boundsLatency(self):
+        jitter = netaudio.JitterBuffer(depth=2, max_depth=4)
+        for s in range(0xFFFFFFFE, 0xFFFFFFFE + 10):
+            jitter.put(s & 0xFFFFFFFF, s)
+        self.assertEqual(len(jitter), 4)
+        self.assertEqual(jitter.skipped, 6)
+        self.assertEqual(jitter.get(), 0xFFFFFFFE + 6)
+
+    def test_loopback(self):
+        receiver = RecordingNetworkAudio(port=0, host='127.0.0.1', jitter=1)
+        sender = netaudio.NetworkAudioSender('127.0.0.1', receiver.port)
+        try:
+            chunk = np.full((2, 100), 0.5, dtype=np.float32)
+            for i in range(5):
+                # Captured 50 ms before sending
+                sender.send(chunk, 10000, time.monotonic() - 0.05)
+                time.sleep(0.01)
+            time.sleep(0.05)
+            self.assertEqual(audio.GlobalAudio.sample_rate, 10000)
+            self.assertEqual(audio.GlobalAudio.chunk_rate, 100)
+            self.assertGreater(audio.GlobalAudio.chunk_count, 0)
+            self.assertEqual(receiver.maxima.count(0.5), 5)
+            # Chunks are dated back to their capture, playout is delayed further by the jitter buffer
+            for maximum, delay in zip(receiver.maxima, receiver.delays):
+                if maximum == 0.5:
+                    self.assertGreaterEqual(delay, 0.05)
+                    self.assertLess(delay, 0.1)
+        finally:
+            sender.close()
+            receiver.stop()
+            audio.GlobalAudio.buffer = None
+            audio.GlobalAudio.ring = None
+            audio.GlobalAudio.sample_rate = None
+
+    def test_bandEffect_startedBeforeFirstPacket(self):
+        receiver = netaudio.NetworkAudio(port=0, host='127.0.0.1', jitter=1)
+        sender = netaudio.NetworkAudioSender('127.0.0.1', receiver.port)
+        event_loop = asyncio.get_event_loop()
+        try:
+            fg = filtergraph.FilterGraph()
+            audioInput = audio.AudioInput(num_channels=1)
+            vuMeter = audioreactive.VUMeterPeak(lowcut_hz=100., highcut_hz=1000.)
+            led = devices.LEDOutput()
+            fg.addEffectNode(audioInput)
+            fg.addEffectNode(vuMeter)
+            fg.addEffectNode(led)
+            fg.addConnection(audioInput, 0, vuMeter, 0)
+            fg.addConnection(vuMeter, 0, led, 0)
+            fg.propagateNumPixels(10)
+            # Audio buffers are created before the sample rate is known
+            fg.update(0.01, event_loop)
+            self.assertIsNone(audio.GlobalAudio.sample_rate)
+            t = np.arange(100) / 10000
+            for i in range(3):
+                sender.send(np.sin(2 * np.pi * 500 * t)[np.newaxis].astype(np.float32), 10000)
+                time.sleep(0.01)
+            time.sleep(0.05)
+            self.assertEqual(audio.GlobalAudio.sample_rate, 10000)
+            fg.update(0.01, event_loop)
+            fg.process()
+            self.assertEqual(audioInput._outputBuffer[0].sample_rate, 10000)
+            self.assertEqual(vuMeter._outputBuffer[0].shape, (3, 10))
+        finally:
+            sender.close()
+            receiver.stop()
+            audio.GlobalAudio.buffer = None
+            audio.GlobalAudio.ring = None
+            audio.GlobalAudio.sample_rate = None
+
+    def test_run_survivesExpiredDeadlines(self):
+        receiver = FlakyNetworkAudio(port=0, host='127.0.0.1', jitter=1)
+        sender = netaudio.NetworkAudioSender('127.0.0.1', receiver.port)
+        try:
+            # First packet raises a transient error
+            sender.send(np.zeros((1, 1), dtype=np.float32), 100000)
+            time.sleep(0.05)
+            self.assertTrue(receiver.failed)
+            # A chunk of 10 us, every playout deadline has passed when the socket is read
+            sender.send(np.zeros((1, 1), dtype=np.float32), 100000)
+            time.sleep(0.1)
+            self.assertTrue(receiver._thread.is_alive())
+            self.assertIsNotNone(receiver._format)
+            count = audio.GlobalAudio.chunk_count
+            time.sleep(0.05)
+            self.assertTrue(receiver._thread.is_alive())
+            self.assertGreater(audio.GlobalAudio.chunk_count, count)
+            # The socket never switches to non-blocking mode
+            self.assertGreater(receiver._socket.gettimeout(), 0)
+        finally:
+            sender.close()
+            receiver.stop()
+            audio.GlobalAudio.buffer = None
+            audio.GlobalAudio.ring = None
+            audio.GlobalAudio.sample_rate = None
+        self.assertFalse(receiver._thread.is_alive())
+
+    def test_deviceSender_sendsChunks(self):
+        receiver = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        receiver.bind(('127.0.0.1', 0))
+        receiver.settimeout(1)
+        sender = netaudio.NetworkAudioSender('127.0.0.1', receiver.getsockname()[1])
+        try:
+            # Device disabled, chunks are pushed like the audio callback does
+            deviceSender = netaudio.DeviceSender(sender, device_index=-1)
+            audio.GlobalAudio.sample_rate = 8000
+            chunk = np.full((2, 80), 0.25, dtype=np.float32)
+            count = audio.GlobalAudio.chunk_count
+            deviceSender._push_chunk(chunk, time.monotonic() - 0.01)
+            sequence, fs, decoded, delay = netaudio.decodePacket(receiver.recv(netaudio.MAX_PACKET_SIZE))
+            self.assertEqual((sequence, fs), (0, 8000))
+            np.testing.assert_array_equal(decoded, chunk)
+            self.assertGreaterEqual(delay, 0.01)
+            # Chunks are sent, not published
+            self.assertEqual(audio.GlobalAudio.chunk_count, count)
+        finally:
+            sender.close()
+            receiver.close()
+            audio.GlobalAudio.sample_rate = None
+
+
+class FlakyNetworkAudio(netaudio.NetworkAudio):
+    failed = False
+
+    def _receive(self, data):
+        if not self.failed:
+            self.failed = True
+            raise ConnectionRefusedError("transient")
+        super()._receive(data)
+
+
+class RecordingNetworkAudio(netaudio.NetworkAudio):
+    def __init__(self, *args, **kwargs):
+        self.maxima = []
+        self.delays = []
+        super().__init__(*args, **kwargs)
+
+    def _push_chunk(self, chunk, timestamp=None):
+        self.maxima.append(np.max(chunk))
+        self.delays.append(time.monotonic() - timestamp if timestamp is not None else 0.)
+        super()._push_chunk(chunk, timestamp)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,39 @@
+import math
+import unittest
+
+import numpy as np
+
+from audioled.particles import Particles
+
+
+class Test_Particles(unittest.TestCase):
+    def test_spawn_replacesOldest(self):
+        particles = Particles(3)
+        particles.spawn(0., [1, 2])
+        particles.spawn(1., [3, 4], peak=0.5)
+        self.assertEqual(len(particles), 3)
+        self.assertEqual(sorted(particles.position), [2, 3, 4])
+        self.assertEqual(sorted(particles.t0), [0., 1., 1.])
+        particles.spawn(2., [])
+        self.assertEqual(len(particles), 3)
+        particles.clear()
+        self.assertEqual(len(particles), 0)
+        np.testing.assert_array_equal(particles.render(5, particles.decay(0., 100)), np.zeros(5))
+
+    def test_render_matchesPerStarLoop(self):
+        num_pixels, thickness, dim_speed, t = 50, 3, 80, 2.
+        positions = np.random.randint(0, num_pixels, 40)
+        t0 = np.random.uniform(0, t, 40)
+        particles = Particles(100)
+        for p, start in zip(positions, t0):
+            particles.spawn(start, [p])
+        expected = np.zeros(num_pixels)
+        for p, start in zip(positions, t0):
+            for j in range(thickness):
+                if p + j < num_pixels:
+                    expected[p + j] += math.exp(-(100 / dim_speed) * (t - start))
+        np.testing.assert_allclose(particles.render(num_pixels, particles.decay(t, dim_speed), thickness), expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
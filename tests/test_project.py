@@ -0,0 +1,126 @@
+from __future__ import print_function
+from __future__ import division
+from __future__ import unicode_literals
+from __future__ import absolute_import
+import asyncio
+import ctypes
+import multiprocessing as mp
+import threading
+import time
+import unittest
+import numpy as np
+from audioled import audio, devices, filtergraph, project
+
+
+class Test_Project(unittest.TestCase):
+    def test_output_delaysAndMeasuresLatency(self):
+        device = MockDevice(2)
+        device.setLatency(0.01)
+        array = mp.Array(ctypes.c_uint8, 6)
+        virtualDevice = devices.VirtualOutput(device, 2, array, None)
+        latency = mp.Value(ctypes.c_double, 0.)
+        q = mp.JoinableQueue()
+        now = time.monotonic()
+        q.put(project.ShowMessage(captureTime=now - 0.05, showTime=now + 0.1))
+        q.put(None)
+        project.output(q, device, virtualDevice, latency)
+        # Shown at showTime minus device latency
+        self.assertGreaterEqual(device.shownAt, now + 0.09)
+        self.assertLess(device.shownAt, now + 0.15)
+        self.assertGreaterEqual(latency.value, 0.15)
+        self.assertLess(latency.value, 0.21)
+
+    def test_output_showsImmediatelyWithoutShowTime(self):
+        device = MockDevice(2)
+        virtualDevice = devices.VirtualOutput(device, 2, mp.Array(ctypes.c_uint8, 6), None)
+        q = mp.JoinableQueue()
+        now = time.monotonic()
+        q.put(project.ShowMessage())
+        q.put(None)
+        project.output(q, device, virtualDevice)
+        self.assertLess(device.shownAt, now + 0.05)
+
+    def test_output_delaysCopiedFramePerDevice(self):
+        for deviceLatency in [0.01, 0.1]:
+            now = time.monotonic()
+            showTime = now + 0.2
+            device = MockDevice(2)
+            device.setLatency(deviceLatency)
+            array = mp.Array(ctypes.c_uint8, 6)
+            virtualDevice = devices.VirtualOutput(device, 2, array, None)
+            latency = mp.Value(ctypes.c_double, 0.)
+            q = mp.JoinableQueue()
+            array[:] = [1, 1, 1, 1, 1, 1]
+            q.put(project.ShowMessage(captureTime=now, showTime=showTime))
+            joinedAt = []
+
+            def nextUpdate():
+                # The next update must not wait for the delayed frame and overwrites the shared array
+                q.join()
+                joinedAt.append(time.monotonic())
+                array[:] = [2, 2, 2, 2, 2, 2]
+                q.put(None)
+
+            thread = threading.Thread(target=nextUpdate)
+            thread.start()
+            project.output(q, device, virtualDevice, latency)
+            thread.join()
+            self.assertLess(joinedAt[0], showTime - 0.1)
+            np.testing.assert_array_equal(device.pixels, np.ones((3, 2)))
+            self.assertGreaterEqual(device.shownAt, showTime - deviceLatency)
+            self.assertLess(device.shownAt, showTime - deviceLatency + 0.05)
+            self.assertGreaterEqual(latency.value, 0.2)
+            self.assertLess(latency.value, 0.26)
+
+    def test_updateMessage_setsSampleRateInWorker(self):
+        event_loop = asyncio.get_event_loop()
+        try:
+            message = project.UpdateMessage(0.01, np.zeros((1, 10)), 60, False, 1., 30., sampleRate=22050)
+            project.worker_process_updateMessage(filtergraph.FilterGraph(), MockDevice(2), 0, event_loop, message)
+            self.assertEqual(audio.GlobalAudio.sample_rate, 22050)
+        finally:
+            audio.GlobalAudio.buffer = None
+            audio.GlobalAudio.sample_rate = None
+
+    def test_sendUpdateCommand_sendsAudioOnce(self):
+        proj = project.Project.__new__(project.Project)
+        proj._publishQueue = MockPublishQueue()
+        try:
+            fileAudio = audio.FileAudio(np.ones((2, 20), dtype=np.float32), chunk_rate=60, sample_rate=600, realtime=False)
+            audio.GlobalAudio.set_routing([[0.5, 0.5]])
+            fileAudio.step()
+            proj._sendUpdateCommand(0.01)
+            message = proj._publishQueue.messages[-1]
+            self.assertIsNone(message.audioBuffer)
+            np.testing.assert_allclose(message.buses, np.ones((1, 10)))
+            self.assertEqual(message.sampleRate, 600)
+        finally:
+            audio.GlobalAudio.set_routing(None)
+            audio.GlobalAudio.buffer = None
+            audio.GlobalAudio.ring = None
+            audio.GlobalAudio.buses = None
+            audio.GlobalAudio.bus_rms = None
+            audio.GlobalAudio.bus_peak = None
+            audio.GlobalAudio.sample_rate = None
+
+
+class MockDevice(devices.LEDController):
+    def __init__(self, num_pixels):
+        super().__init__(num_pixels)
+        self.shownAt = None
+
+    def show(self, pixels):
+        self.shownAt = time.monotonic()
+        self.pixels = np.array(pixels)
+
+
+class MockPublishQueue(object):
+    def __init__(self):
+        self.messages = []
+
+    def publish(self, message):
+        self.messages.append(message)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+from __future__ import print_function
+from __future__ import division
+from __future__ import unicode_literals
+from __future__ import absolute_import
+import os
+import shutil
+import tempfile
+import unittest
+import jsonpickle
+import numpy as np
+from audioled import audio, configs, project, render
+
+
+class Test_Render(unittest.TestCase):
+    def setUp(self):
+        self.tmpDir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpDir)
+        audio.GlobalAudio.buffer = None
+        audio.GlobalAudio.ring = None
+        audio.GlobalAudio.sample_rate = None
+        audio.GlobalAudio.buses = None
+
+    def test_render_writesFramesForAudio(self):
+        fs = 6000
+        t = np.arange(fs) / fs
+        samples = np.vstack([np.sin(2 * np.pi * 100 * t)] * 2)
+        audioSource = audio.FileAudio(samples, chunk_rate=60, sample_rate=fs, realtime=False, loop=False)
+        fg = configs.createMovingLightGraph()
+        fg.propagateNumPixels(50)
+        frames = render.numFrames(audioSource)
+        self.assertEqual(frames, 60)
+        out = np.lib.format.open_memmap(os.path.join(self.tmpDir, 'out.npy'), mode='w+', dtype=np.uint8, shape=(frames, 3, 50))
+        render.render(fg, out, 1. / 60, audioSource=audioSource)
+        out.flush()
+        # Whole audio file was used
+        self.assertFalse(audioSource.step())
+        self.assertGreater(np.max(np.load(os.path.join(self.tmpDir, 'out.npy'))), 0)
+
+    def test_loadFiltergraph_fromProject(self):
+        proj = project.Project()
+        proj.sceneMetadata = {"0": {"name": "", "output": {"0": {"refSlot": 3}}, "brightness": 0.5}}
+        proj.slots[3] = configs.createSpectrumGraph()
+        path = os.path.join(self.tmpDir, 'project.json')
+        with open(path, 'w') as f:
+            f.write(jsonpickle.encode(proj))
+        fg, brightness = render.loadFiltergraph(path)
+        self.assertEqual(brightness, 0.5)
+        self.assertEqual(len(fg.getNodes()), len(proj.slots[3].getNodes()))
+        self.assertEqual(fg.getContentRoot(), self.tmpDir)
+
+    def test_writeGif(self):
+        frames = np.zeros((4, 3, 6), dtype=np.uint8)
+        frames[:, 0] = 255
+        frames[:, 1] = np.arange(4)[:, np.newaxis] * 50
+        path = os.path.join(self.tmpDir, 'preview.gif')
+        render.writeGif(frames, path, 30, num_rows=2, scale=2)
+        from PIL import Image
+        with Image.open(path) as image:
+            self.assertEqual(image.size, (6, 4))
+            self.assertEqual(image.n_frames, 4)
+            self.assertEqual(image.convert('RGB').getpixel((0, 0)), (255, 0, 0))
+            image.seek(3)
+            self.assertEqual(image.convert('RGB').getpixel((0, 0)), (255, 150, 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+from __future__ import print_function
+from __future__ import division
+from __future__ import unicode_literals
+from __future__ import absolute_import
+import threading
+import time
+import unittest
+import numpy as np
+from audioled import audio, scheduler
+
+
+class Test_FrameScheduler(unittest.TestCase):
+    def tearDown(self):
+        audio.GlobalAudio.buffer = None
+        audio.GlobalAudio.ring = None
+        audio.GlobalAudio.sample_rate = None
+
+    def test_clock_keepsRate(self):
+        frameScheduler = scheduler.FrameScheduler(lambda: time.sleep(0.002), rate=100., mode='clock')
+        frameScheduler.start()
+        time.sleep(0.5)
+        frameScheduler.stop()
+        frameScheduler.join(1)
+        self.assertFalse(frameScheduler.is_alive())
+        self.assertGreaterEqual(frameScheduler.frames, 40)
+        self.assertLessEqual(frameScheduler.frames, 52)
+
+    def test_clock_dropsFramesWhenTooSlow(self):
+        frameScheduler = scheduler.FrameScheduler(lambda: time.sleep(0.03), rate=100., mode='clock')
+        frameScheduler.start()
+        time.sleep(0.3)
+        frameScheduler.stop()
+        frameScheduler.join(1)
+        self.assertGreater(frameScheduler.dropped, 0)
+
+    def test_stopFromFrame_endsScheduler(self):
+        stopSignal = threading.Event()
+
+        def frame():
+            if stopSignal.is_set():
+                frameScheduler.stop()
+                return
+            if frameScheduler.frames == 2:
+                stopSignal.set()
+
+        frameScheduler = scheduler.FrameScheduler(frame, rate=100., mode='clock')
+        frameScheduler.start()
+        frameScheduler.join(1)
+        self.assertFalse(frameScheduler.is_alive())
+        self.assertEqual(frameScheduler.frames, 4)
+
+    def test_audio_rendersOncePerChunk(self):
+        fileAudio = audio.FileAudio(np.zeros((1, 600)), chunk_rate=60, sample_rate=600, realtime=False)
+        first = audio.GlobalAudio.chunk_count
+        chunks = []
+        rendered = threading.Event()
+
+        def frame():
+            chunks.append(audio.GlobalAudio.chunk_count)
+            rendered.set()
+
+        frameScheduler = scheduler.FrameScheduler(frame, rate=1., mode='audio')
+        frameScheduler.start()
+        try:
+            for i in range(5):
+                rendered.clear()
+                fileAudio.step()
+                self.assertTrue(rendered.wait(1))
+            fileAudio.step()
+            fileAudio.step()
+            time.sleep(0.1)
+        finally:
+            frameScheduler.stop()
+            frameScheduler.join(1)
+        self.assertEqual(chunks[:5], [first + i for i in range(1, 6)])
+        self.assertEqual(frameScheduler.frames, len(chunks))
+
+    def test_waitForChunk_timesOut(self):
+        count = audio.GlobalAudio.chunk_count
+        self.assertEqual(audio.GlobalAudio.wait_for_chunk(count, timeout=0.01), count)
+
+
+if __name__ == '__main__':
+    unittest.main()